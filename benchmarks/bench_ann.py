@@ -0,0 +1,72 @@
+"""Recall@k and latency of the IVF vector index vs exact search.
+
+Run from the repository root:
+
+    python benchmarks/bench_ann.py
+    python benchmarks/bench_ann.py --vectors 200000 --n-probe 1,4,8,16,32
+
+Vectors are synthetic clustered 768-dim embeddings (see bench_quantization),
+so recall figures are indicative rather than a property of any particular
+embedding model. Also times incremental add/delete and a save/load round trip.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_quantization import make_matrix, mean_ms  # noqa: E402
+from rag_utils.ann import IVFIndex  # noqa: E402
+from rag_utils.exact import batch_exact_search, exact_search  # noqa: E402
+from rag_utils.quantization import recall_at_k  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--n-probe", default="1,4,8,16")
+    args = parser.parse_args()
+
+    matrix = make_matrix(args.vectors)
+    picks = np.random.default_rng(1).choice(len(matrix), args.queries, replace=False)
+    # Perturbed stored vectors, so a query is not trivially its own nearest neighbour
+    queries = matrix.vectors[picks] + 0.3 * np.random.default_rng(2).normal(size=(args.queries, matrix.dim)).astype(np.float32)
+    exact, _ = batch_exact_search(matrix, queries, args.k)
+
+    start = time.perf_counter()
+    index = IVFIndex.build(matrix)
+    build_s = time.perf_counter() - start
+    print(f"built {index.n_lists} lists over {len(index):,} vectors in {build_s:.1f} s")
+
+    exact_ms = mean_ms(lambda q: exact_search(matrix, q, args.k), queries)
+    print(f"{'search':>8} {'n_probe':>8} {'ms/query':>9} {'recall@k':>9}")
+    print(f"{'exact':>8} {'-':>8} {exact_ms:>9.2f} {1.0:>9.3f}")
+    for n_probe in [int(p) for p in args.n_probe.split(",")]:
+        ms = mean_ms(lambda q: index.search(q, args.k, n_probe=n_probe), queries)
+        recall = np.mean([recall_at_k(index.search(q, args.k, n_probe=n_probe)[0], e) for q, e in zip(queries, exact)])
+        print(f"{'ivf':>8} {n_probe:>8} {ms:>9.2f} {recall:>9.3f}")
+
+    batch = matrix[:1000]
+    start = time.perf_counter()
+    index.delete(batch.ids)
+    index.add(batch.ids, batch.vectors)
+    print(f"delete + re-add 1,000 vectors: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    with tempfile.TemporaryDirectory() as root:
+        path = os.path.join(root, "bench.ivf")
+        start = time.perf_counter()
+        index.save(path)
+        saved = time.perf_counter()
+        IVFIndex.load(path)
+        print(f"save {(saved - start) * 1000:.0f} ms, load (mmap) {(time.perf_counter() - saved) * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""BM25 index build time, size and query throughput, plus hybrid fusion cost.
+
+Run from the repository root:
+
+    python benchmarks/bench_bm25.py
+    python benchmarks/bench_bm25.py --docs 200000 --queries 1000
+
+The corpus is synthetic review text: Zipf-distributed words with a product
+SKU ("SKU-12345") planted in every tenth chunk, so SKU queries have exactly
+one or a few matches while word queries hit long posting lists.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag_utils.bm25 import BM25Index  # noqa: E402
+from rag_utils.retrieval import reciprocal_rank_fusion  # noqa: E402
+
+
+def make_corpus(n_docs, vocabulary=20000, seed=42):
+    rng = np.random.default_rng(seed)
+    words = np.array([f"w{i}" for i in range(vocabulary)])
+    lengths = rng.integers(30, 120, n_docs)
+    draws = np.minimum(rng.zipf(1.3, lengths.sum()), vocabulary) - 1
+    texts, skus = [], []
+    start = 0
+    for i, length in enumerate(lengths):
+        text = " ".join(words[draws[start:start + length]])
+        start += length
+        if i % 10 == 0:
+            sku = f"SKU-{rng.integers(10000, 99999)}"
+            skus.append(sku)
+            text = f"{text} ordered {sku}"
+        texts.append(text)
+    return texts, skus, words
+
+
+def per_query_ms(fn, queries):
+    start = time.perf_counter()
+    for q in queries:
+        fn(q)
+    return (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=50000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    texts, skus, words = make_corpus(args.docs)
+    start = time.perf_counter()
+    index = BM25Index.build(np.arange(len(texts)), texts)
+    build_s = time.perf_counter() - start
+    print(f"built {len(index):,} docs, {len(index.vocabulary):,} terms, {len(index.rows):,} postings "
+          f"({index.nbytes / 1e6:.1f} MB) in {build_s:.1f} s ({len(texts) / build_s:,.0f} docs/s)")
+
+    rng = np.random.default_rng(1)
+    sku_queries = [skus[i] for i in rng.integers(0, len(skus), args.queries)]
+    rare_queries = [" ".join(words[rng.integers(1000, len(words), 3)]) for _ in range(args.queries)]
+    common_queries = [" ".join(words[rng.integers(0, 50, 3)]) for _ in range(args.queries)]
+
+    print(f"{'query type':>14} {'ms/query':>9} {'queries/s':>10}")
+    for label, queries in (("SKU", sku_queries), ("rare words", rare_queries), ("common words", common_queries)):
+        ms = per_query_ms(lambda q: index.search(q, args.k), queries)
+        print(f"{label:>14} {ms:>9.3f} {1000 / ms:>10,.0f}")
+
+    rankings = [(rng.permutation(args.docs)[:args.k * 4], rng.permutation(args.docs)[:args.k * 4])
+                for _ in range(args.queries)]
+    ms = per_query_ms(lambda pair: reciprocal_rank_fusion(pair, args.k), rankings)
+    print(f"{'RRF fusion':>14} {ms:>9.3f} {1000 / ms:>10,.0f}")
+
+
+if __name__ == "__main__":
+    main()
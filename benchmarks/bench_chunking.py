@@ -0,0 +1,104 @@
+"""Chunking throughput: legacy iterrows loop vs the columnar engine.
+
+Run from the repository root:
+
+    python benchmarks/bench_chunking.py
+    python benchmarks/bench_chunking.py --sizes 10000,100000 --legacy-max 10000
+
+Documents are drawn from a small pool of synthetic reviews (mostly ~150
+words, 10% long ones) so a 1M-document corpus fits comfortably in memory.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag_utils.chunking import chunk_documents  # noqa: E402
+
+VOCAB = ("gloves warm thermal jacket helmet skis boots durable zipper shipping "
+         "fast slow quality price return comfortable fit size snow winter great "
+         "terrible ordered arrived package customer service recommend").split()
+
+
+def make_corpus(n_docs, pool_size=2000, seed=42):
+    """Return ``(df, total_words)`` for ``n_docs`` synthetic reviews."""
+    rng = random.Random(seed)
+    pool = []
+    pool_words = []
+    for i in range(pool_size):
+        n_words = rng.randint(400, 900) if i % 10 == 0 else rng.randint(80, 220)
+        pool.append(" ".join(rng.choices(VOCAB, k=n_words)))
+        pool_words.append(n_words)
+    picks = [rng.randrange(pool_size) for _ in range(n_docs)]
+    # Object columns share the pooled strings instead of copying them
+    df = pd.DataFrame({
+        "DOC_ID": range(1, n_docs + 1),
+        "FILE_NAME": pd.Series([f"review-{i:07d}.txt" for i in range(1, n_docs + 1)], dtype=object),
+        "EXTRACTED_TEXT": pd.Series([pool[p] for p in picks], dtype=object),
+    })
+    return df, sum(pool_words[p] for p in picks)
+
+
+def legacy_chunk(df, chunk_size, overlap):
+    """The original Day 17 loop, kept here as the baseline."""
+    chunks = []
+    chunk_id = 1
+    for idx, row in df.iterrows():
+        text = row['EXTRACTED_TEXT']
+        words = text.split()
+        if len(words) <= chunk_size:
+            chunks.append({'doc_id': row['DOC_ID'], 'file_name': row['FILE_NAME'], 'chunk_id': chunk_id,
+                           'chunk_text': text, 'chunk_size': len(words), 'chunk_type': 'full_review'})
+            chunk_id += 1
+        else:
+            for i in range(0, len(words), chunk_size - overlap):
+                chunk_words = words[i:i + chunk_size]
+                chunks.append({'doc_id': row['DOC_ID'], 'file_name': row['FILE_NAME'], 'chunk_id': chunk_id,
+                               'chunk_text': ' '.join(chunk_words), 'chunk_size': len(chunk_words),
+                               'chunk_type': 'chunked_review'})
+                chunk_id += 1
+    return pd.DataFrame(chunks)
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--chunk-size", type=int, default=200)
+    parser.add_argument("--overlap", type=int, default=50)
+    parser.add_argument("--legacy-max", type=int, default=100000,
+                        help="skip the legacy loop above this many documents")
+    args = parser.parse_args()
+
+    print(f"{'docs':>10} {'words':>12} {'chunks':>10} {'legacy w/s':>14} {'columnar w/s':>14} {'speedup':>8}")
+    for n_docs in [int(s) for s in args.sizes.split(",")]:
+        df, n_words = make_corpus(n_docs)
+
+        chunks, columnar_s = timed(chunk_documents, df, args.chunk_size, args.overlap)
+        columnar_wps = n_words / columnar_s
+
+        if n_docs <= args.legacy_max:
+            _, legacy_s = timed(legacy_chunk, df, args.chunk_size, args.overlap)
+            legacy_wps = n_words / legacy_s
+            legacy_col = f"{legacy_wps:>14,.0f}"
+            speedup = f"{legacy_s / columnar_s:>7.1f}x"
+        else:
+            legacy_col = f"{'skipped':>14}"
+            speedup = f"{'-':>8}"
+
+        print(f"{n_docs:>10,} {n_words:>12,} {len(chunks):>10,} {legacy_col} {columnar_wps:>14,.0f} {speedup}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""Client-side embedding throughput vs. number of in-flight requests.
+
+Run from the repository root:
+
+    python benchmarks/bench_embedding_concurrency.py
+    python benchmarks/bench_embedding_concurrency.py --texts 512 --latency-ms 120
+
+Each embedding call is simulated by sleeping for a latency drawn around
+``--latency-ms`` (a remote EMBED_TEXT_768 round trip is I/O-bound), so the
+curve shows how ``embed_concurrently`` overlaps requests.
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag_utils.embedding import EMBED_DIM, embed_concurrently  # noqa: E402
+
+
+def make_embed_fn(latency_ms, jitter, seed=42):
+    rng = random.Random(seed)
+    delays = [max(0.0, rng.gauss(latency_ms, latency_ms * jitter)) / 1000 for _ in range(100000)]
+
+    def embed(text):
+        time.sleep(delays[zlib.crc32(text.encode()) % len(delays)])
+        return [0.0] * EMBED_DIM
+
+    return embed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--texts", type=int, default=256)
+    parser.add_argument("--latency-ms", type=float, default=80.0)
+    parser.add_argument("--jitter", type=float, default=0.25, help="latency standard deviation as a fraction")
+    parser.add_argument("--concurrency", default="1,2,4,8,16,32")
+    args = parser.parse_args()
+
+    texts = [f"review chunk {i}" for i in range(args.texts)]
+    embed = make_embed_fn(args.latency_ms, args.jitter)
+
+    print(f"{'in-flight':>10} {'seconds':>9} {'emb/s':>9} {'speedup':>8}")
+    baseline = None
+    for limit in [int(c) for c in args.concurrency.split(",")]:
+        start = time.perf_counter()
+        results = embed_concurrently(texts, embed, max_in_flight=limit)
+        elapsed = time.perf_counter() - start
+        assert len(results) == len(texts)
+        rate = len(texts) / elapsed
+        baseline = baseline or rate
+        print(f"{limit:>10} {elapsed:>9.2f} {rate:>9.1f} {rate / baseline:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+"""Batched vs one-at-a-time exact search, in memory and memory-mapped.
+
+Run from the repository root:
+
+    python benchmarks/bench_exact.py
+    python benchmarks/bench_exact.py --vectors 500000 --batches 1,16,64,256
+
+Reports milliseconds per query for a loop of single-query searches and for
+one ``batch_exact_search`` call over the whole batch, then repeats the
+batched search against a memory-mapped copy of the matrix (the path used
+for matrices larger than RAM).
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_quantization import make_matrix  # noqa: E402
+from rag_utils.exact import ExactIndex, batch_exact_search  # noqa: E402
+from rag_utils.vectors import EmbeddingMatrix  # noqa: E402
+
+
+def timed_ms(fn):
+    start = time.perf_counter()
+    fn()
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--batches", default="1,8,32,128")
+    parser.add_argument("--block-rows", type=int, default=65536)
+    args = parser.parse_args()
+
+    matrix = make_matrix(args.vectors)
+    index = ExactIndex(matrix, block_rows=args.block_rows)
+    rng = np.random.default_rng(1)
+
+    with tempfile.TemporaryDirectory() as root:
+        np.save(os.path.join(root, "vectors.npy"), matrix.vectors)
+        mapped = EmbeddingMatrix.wrap(matrix.ids, np.load(os.path.join(root, "vectors.npy"), mmap_mode="r"))
+
+        print(f"{'queries':>8} {'loop ms/q':>10} {'batch ms/q':>11} {'mmap ms/q':>10} {'speedup':>8}")
+        for n in [int(b) for b in args.batches.split(",")]:
+            queries = matrix.vectors[rng.choice(len(matrix), n, replace=False)]
+            loop = timed_ms(lambda: [index.search(q, args.k) for q in queries]) / n
+            batch = timed_ms(lambda: index.search_batch(queries, args.k)) / n
+            mmap = timed_ms(lambda: batch_exact_search(mapped, queries, args.k, args.block_rows, index.norms)) / n
+            print(f"{n:>8} {loop:>10.2f} {batch:>11.2f} {mmap:>10.2f} {loop / batch:>7.1f}x")
+        del mapped
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""Memory, latency and recall@k of quantized search vs exact float32 search.
+
+Run from the repository root:
+
+    python benchmarks/bench_quantization.py
+    python benchmarks/bench_quantization.py --vectors 200000 --oversample 4,10,20
+
+Vectors are synthetic clustered 768-dim embeddings (cluster centres plus
+noise), so recall figures are indicative rather than a property of any
+particular embedding model.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag_utils.embedding import EMBED_DIM  # noqa: E402
+from rag_utils.exact import exact_search  # noqa: E402
+from rag_utils.quantization import QUANTIZATION_MODES, QuantizedStore, evaluate_recall  # noqa: E402
+from rag_utils.vectors import EmbeddingMatrix  # noqa: E402
+
+
+def make_matrix(n_vectors, n_clusters=500, noise=0.6, seed=42):
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(n_clusters, EMBED_DIM)).astype(np.float32)
+    matrix = EmbeddingMatrix()
+    for start in range(0, n_vectors, 50000):
+        size = min(50000, n_vectors - start)
+        block = centers[rng.integers(0, n_clusters, size)] + noise * rng.normal(size=(size, EMBED_DIM)).astype(np.float32)
+        matrix.append(np.arange(start, start + size), block)
+    return matrix.trim()
+
+
+def mean_ms(fn, queries):
+    start = time.perf_counter()
+    for q in queries:
+        fn(q)
+    return (time.perf_counter() - start) * 1000 / len(queries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--vectors", type=int, default=100000)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=30)
+    parser.add_argument("--oversample", default="4,10")
+    args = parser.parse_args()
+
+    matrix = make_matrix(args.vectors)
+    queries = matrix.vectors[np.random.default_rng(1).choice(len(matrix), args.queries, replace=False)]
+
+    exact_ms = mean_ms(lambda q: exact_search(matrix, q, args.k), queries)
+    print(f"{'mode':>8} {'oversample':>10} {'RAM MB':>9} {'ms/query':>9} {'recall@k':>9}")
+    print(f"{'float32':>8} {'-':>10} {matrix.nbytes / 1e6:>9.1f} {exact_ms:>9.2f} {1.0:>9.3f}")
+    for mode in QUANTIZATION_MODES:
+        for oversample in [int(o) for o in args.oversample.split(",")]:
+            store = QuantizedStore(matrix, mode=mode, oversample=oversample)
+            ms = mean_ms(lambda q: store.search(q, args.k), queries)
+            recall = evaluate_recall(store, k=args.k, n_queries=args.queries)
+            print(f"{mode:>8} {oversample:>10} {store.nbytes / 1e6:>9.1f} {ms:>9.2f} {recall:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
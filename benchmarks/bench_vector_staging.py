@@ -0,0 +1,55 @@
+"""Cost of formatting embeddings for staging: per-float ``str`` vs ``vector_json``.
+
+Run from the repository root:
+
+    python benchmarks/bench_vector_staging.py
+    python benchmarks/bench_vector_staging.py --rows 20000 --max-us-per-row 500
+
+Reports microseconds per 768-dim row for the original per-float
+``str(float(x))`` loop and for ``vector_json``, which the staging tables
+upload. With ``--max-us-per-row`` the run fails if ``vector_json`` is over
+that bound or slower than the loop it replaced.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from rag_utils.embedding import EMBED_DIM, vector_json  # noqa: E402
+
+
+def per_float_json(matrix):
+    """The original row-by-row formatting, kept here as the baseline."""
+    return ["[" + ",".join(str(float(x)) for x in row) + "]" for row in matrix]
+
+
+def us_per_row(fn, matrix):
+    start = time.perf_counter()
+    fn(matrix)
+    return (time.perf_counter() - start) * 1e6 / len(matrix)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--max-us-per-row", type=float, default=None)
+    args = parser.parse_args()
+
+    matrix = np.random.default_rng(0).standard_normal((args.rows, EMBED_DIM)).astype(np.float32)
+    baseline = us_per_row(per_float_json, matrix)
+    staged = us_per_row(vector_json, matrix)
+    print(f"{'method':>16} {'us/row':>9} {'s per 100k':>11}")
+    print(f"{'str(float(x))':>16} {baseline:>9.0f} {baseline / 10:>11.1f}")
+    print(f"{'vector_json':>16} {staged:>9.0f} {staged / 10:>11.1f}   ({baseline / staged:.1f}x)")
+
+    if args.max_us_per_row is not None and (staged > args.max_us_per_row or staged > baseline):
+        sys.exit(f"vector_json took {staged:.0f} us/row (bound {args.max_us_per_row:.0f}, baseline {baseline:.0f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,6 @@
 import streamlit as st
-from pypdf import PdfReader
-import io
 import pandas as pd
+from rag_utils.parsing import SnowflakeParseBackend, detect_file_type, extract_text, run_parse, wait_for_job
 
 st.set_page_config(page_title="Day 16 - Batch Document Text Extractor", page_icon="1️⃣6️⃣", layout="wide")
 
@@ -231,11 +230,47 @@ try:
         else:
             st.info(f":material/add: **Append Mode** - New documents will be added to `{st.session_state.table_name}`.")
 
+        st.divider()
+
+        # Extraction mode
+        st.subheader(":material/memory: Extraction Mode")
+        extraction_mode = st.radio(
+            "Where should documents be parsed?",
+            ["Client-side (pypdf in this app)", "Server-side (Cortex PARSE_DOCUMENT)"],
+            index=0,
+            help="Server-side mode uploads raw files to a stage once and parses them inside Snowflake in a single set-based statement"
+        )
+        server_side = extraction_mode.startswith("Server-side")
+
+        if server_side:
+            if 'stage_name' not in st.session_state:
+                st.session_state.stage_name = "DOCUMENT_STAGE"
+            col1, col2 = st.columns([2, 1])
+            with col1:
+                st.session_state.stage_name = st.text_input("Stage Name", value=st.session_state.stage_name, key="stage_input")
+            with col2:
+                parse_mode = st.selectbox("Parse Mode", ["OCR", "LAYOUT"], index=0,
+                                          help="OCR returns plain text; LAYOUT keeps tables and headings as Markdown")
+            st.caption(f":material/cloud_upload: Files are staged in `@{st.session_state.database}.{st.session_state.schema}.{st.session_state.stage_name}` and parsed by warehouse compute in parallel")
+
     # Get values from session state for use in the rest of the code
     database = st.session_state.database
     schema = st.session_state.schema
     table_name = st.session_state.table_name
 
+    create_table_sql = f"""
+    CREATE TABLE IF NOT EXISTS {database}.{schema}.{table_name} (
+        DOC_ID NUMBER AUTOINCREMENT,
+        FILE_NAME VARCHAR,
+        FILE_TYPE VARCHAR,
+        FILE_SIZE NUMBER,
+        EXTRACTED_TEXT VARCHAR,
+        UPLOAD_TIMESTAMP TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+        WORD_COUNT NUMBER,
+        CHAR_COUNT NUMBER
+    )
+    """
+
     # Display upload info
     if uploaded_files:
         with st.container(border=True):
@@ -248,10 +283,7 @@ try:
                     {
                         "File Name": f.name,
                         "Size": f"{f.size:,} bytes",
-                        "Type": "TXT" if f.name.lower().endswith('.txt') 
-                               else "Markdown" if f.name.lower().endswith('.md')
-                               else "PDF" if f.name.lower().endswith('.pdf')
-                               else "Unknown"
+                        "Type": detect_file_type(f.name)
                     }
                     for f in uploaded_files
                 ])
@@ -264,7 +296,73 @@ try:
                 use_container_width=True
             )
         
-        if process_button:
+        if process_button and server_side:
+            # Server-side mode: stage raw files once, parse them in one statement
+            full_stage_name = f"{database}.{schema}.{st.session_state.stage_name}"
+            with st.status("Parsing documents in Snowflake...", expanded=True) as status:
+                try:
+                    st.write(":material/looks_one: Setting up database structure...")
+                    session.sql(f"CREATE DATABASE IF NOT EXISTS {database}").collect()
+                    session.sql(f"CREATE SCHEMA IF NOT EXISTS {database}.{schema}").collect()
+                    session.sql(create_table_sql).collect()
+
+                    if replace_mode:
+                        st.write(":material/sync: Replace mode: Clearing existing data...")
+                        session.sql(f"TRUNCATE TABLE {database}.{schema}.{table_name}").collect()
+
+                    st.write(f":material/looks_two: Uploading {len(uploaded_files)} file(s) to `@{full_stage_name}`...")
+                    progress_bar = st.progress(0, text="Uploading...")
+
+                    def show_upload(idx, file_name):
+                        progress_bar.progress(idx / len(uploaded_files), text=f"Uploaded {idx}/{len(uploaded_files)}: {file_name}")
+
+                    files = []
+                    for uploaded_file in uploaded_files:
+                        uploaded_file.seek(0)
+                        files.append((uploaded_file.name, uploaded_file.read()))
+
+                    backend = SnowflakeParseBackend(session, full_stage_name, mode=parse_mode)
+                    job = run_parse(backend, files, f"{database}.{schema}.{table_name}", on_upload=show_upload)
+
+                    # The UI only polls; parsing runs on warehouse compute
+                    st.write(":material/looks_3: Parsing with `SNOWFLAKE.CORTEX.PARSE_DOCUMENT`...")
+
+                    def show_poll(job):
+                        progress_bar.progress(job.progress(), text=f"Parsing {job.total} file(s) in the warehouse... {job.elapsed():.0f}s")
+
+                    parse_result = wait_for_job(job, on_poll=show_poll)
+                    progress_bar.empty()
+
+                    status.update(label=":material/check_circle: All documents parsed!", state="complete", expanded=False)
+                except Exception as e:
+                    parse_result = None
+                    status.update(label="Error", state="error")
+                    st.error(f"Error parsing in Snowflake: {str(e)}")
+                    st.info(":material/lightbulb: Make sure Cortex PARSE_DOCUMENT is available in your region and you can create stages in this schema.")
+
+            if parse_result:
+                with st.container(border=True):
+                    st.subheader(":material/analytics: Documents Written to a Database Table")
+
+                    col1, col2, col3 = st.columns(3)
+                    with col1:
+                        st.metric(":material/check_circle: Successful", parse_result['parsed'])
+                    with col2:
+                        st.metric(":material/cancel: Failed", parse_result['failed'])
+                    with col3:
+                        st.metric(":material/timer: Parse Time", f"{job.elapsed():.1f}s")
+
+                    mode_msg = "replaced in" if replace_mode else "saved to"
+                    st.success(f":material/check_circle: Successfully {mode_msg} `{database}.{schema}.{table_name}`\n\n:material/description: {parse_result['parsed']} document(s) parsed server-side")
+
+                    # Store references in session state for downstream apps
+                    st.session_state.rag_source_table = f"{database}.{schema}.{table_name}"
+                    st.session_state.rag_source_database = database
+                    st.session_state.rag_source_schema = schema
+
+                    st.balloons()
+
+        elif process_button:
             # Initialize progress tracking
             success_count = 0
             error_count = 0
@@ -279,34 +377,13 @@ try:
                 
                 try:
                     # Determine file type from extension
-                    if uploaded_file.name.lower().endswith('.txt'):
-                        file_type = "TXT"
-                    elif uploaded_file.name.lower().endswith('.md'):
-                        file_type = "Markdown"
-                    elif uploaded_file.name.lower().endswith('.pdf'):
-                        file_type = "PDF"
-                    else:
-                        file_type = "Unknown"
+                    file_type = detect_file_type(uploaded_file.name)
                     
                     # Reset file pointer
                     uploaded_file.seek(0)
                     
-                    # Extract text based on file type
-                    extracted_text = ""
-                    
-                    if uploaded_file.name.lower().endswith(('.txt', '.md')):
-                        # Handle TXT and Markdown files
-                        extracted_text = uploaded_file.read().decode("utf-8")
-                    
-                    elif uploaded_file.name.lower().endswith('.pdf'):
-                        # Handle PDF files
-                        pdf_reader = PdfReader(io.BytesIO(uploaded_file.read()))
-                        
-                        # Extract text from all pages
-                        for page in pdf_reader.pages:
-                            page_text = page.extract_text()
-                            if page_text:
-                                extracted_text += page_text + "\n\n"
+                    # Extract text based on file type (TXT, Markdown, PDF pages)
+                    extracted_text = extract_text(uploaded_file.name, uploaded_file.read())
                     
                     # Check if extraction was successful
                     if extracted_text and extracted_text.strip():
@@ -377,18 +454,6 @@ try:
                             
                             # Create table if it doesn't exist
                             st.write(":material/looks_two: Creating table if needed...")
-                            create_table_sql = f"""
-                            CREATE TABLE IF NOT EXISTS {database}.{schema}.{table_name} (
-                                DOC_ID NUMBER AUTOINCREMENT,
-                                FILE_NAME VARCHAR,
-                                FILE_TYPE VARCHAR,
-                                FILE_SIZE NUMBER,
-                                EXTRACTED_TEXT VARCHAR,
-                                UPLOAD_TIMESTAMP TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
-                                WORD_COUNT NUMBER,
-                                CHAR_COUNT NUMBER
-                            )
-                            """
                             session.sql(create_table_sql).collect()
                             
                             # Replace mode: clear existing data
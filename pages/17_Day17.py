@@ -1,9 +1,22 @@
 import streamlit as st
-import pandas as pd
 import re
+from rag_utils.chunking import EMBED_SAFETY_MARGIN, EMBED_TOKEN_LIMIT, TokenCounter, assign_stable_ids, make_chunker, token_stats
+from rag_utils.loading import fetch_one, fetch_preview, iter_batches
+from rag_utils.pushdown import pushdown_chunk_sql, register_chunking_udtf
+from rag_utils.watermark import (WATERMARK_TABLE, clear_document_range, doc_range_filter, ensure_watermark_table,
+                                 pending_documents, read_watermark, save_watermark)
 
 st.set_page_config(page_title="Day 17 - Prepare and Chunk Data for RAG", page_icon="1️⃣7️⃣", layout="wide")
 
+# Rows per streamed batch and rows kept as a preview in session state
+BATCH_ROWS = 5000
+PREVIEW_ROWS = 100
+
+@st.cache_resource
+def get_token_counter():
+    # Counts against the embedding model's WordPiece tokenizer when it can be loaded
+    return TokenCounter(wordpiece=True)
+
 st.title(":material/sync: Day 17: Prepare and Chunk Data for RAG")
 st.caption("30 Days of AI")
 st.markdown("---")
@@ -146,7 +159,7 @@ try:
         
         # Check for existing loaded data
         if 'loaded_data' in st.session_state:
-            st.success(f":material/check_circle: **{len(st.session_state.loaded_data)} document(s)** already loaded")
+            st.success(f":material/check_circle: **{st.session_state.loaded_stats['DOCS']:,} document(s)** ready to process")
 
         # Load documents button
         if st.button(":material/folder_open: Load Reviews", type="primary", use_container_width=True):
@@ -154,7 +167,18 @@ try:
                 with st.status("Loading reviews from Snowflake...", expanded=True) as status:
                     st.write(":material/wifi: Querying database...")
                     
-                    query = f"""
+                    source_table = f"{st.session_state.day17_database}.{st.session_state.day17_schema}.{st.session_state.day17_table_name}"
+                    
+                    # Only summary statistics and a small preview sample are kept in session state;
+                    # the full corpus is streamed in batches when chunks are saved
+                    stats = fetch_one(session, f"""
+                    SELECT 
+                        COUNT(*) AS DOCS,
+                        COALESCE(SUM(WORD_COUNT), 0) AS WORDS,
+                        COALESCE(AVG(WORD_COUNT), 0) AS AVG_WORDS
+                    FROM {source_table}
+                    """)
+                    df = fetch_preview(session, f"""
                     SELECT 
                         DOC_ID,
                         FILE_NAME,
@@ -163,17 +187,17 @@ try:
                         UPLOAD_TIMESTAMP,
                         WORD_COUNT,
                         CHAR_COUNT
-                    FROM {st.session_state.day17_database}.{st.session_state.day17_schema}.{st.session_state.day17_table_name}
+                    FROM {source_table}
                     ORDER BY FILE_NAME
-                    """
-                    df = session.sql(query).to_pandas()
+                    """, limit=PREVIEW_ROWS)
                     
-                    st.write(f":material/check_circle: Loaded {len(df)} review(s)")
+                    st.write(f":material/check_circle: Found {stats['DOCS']:,} review(s), previewing {len(df)}")
                     status.update(label="Reviews loaded successfully!", state="complete", expanded=False)
                     
                     # Store in session state
                     st.session_state.loaded_data = df
-                    st.session_state.source_table = f"{st.session_state.day17_database}.{st.session_state.day17_schema}.{st.session_state.day17_table_name}"
+                    st.session_state.loaded_stats = stats
+                    st.session_state.source_table = source_table
                     st.rerun()
                     
             except Exception as e:
@@ -186,16 +210,18 @@ try:
             st.subheader(":material/looks_one: Review Summary")
             
             df = st.session_state.loaded_data
+            loaded_stats = st.session_state.loaded_stats
                     
             # Show statistics
             col1, col2, col3 = st.columns(3)
             with col1:
-                st.metric("Total Reviews", len(df))
+                st.metric("Total Reviews", f"{loaded_stats['DOCS']:,}")
             with col2:
-                st.metric("Total Words", f"{df['WORD_COUNT'].sum():,}")
+                st.metric("Total Words", f"{int(loaded_stats['WORDS']):,}")
             with col3:
-                st.metric("Avg Words/Review", f"{df['WORD_COUNT'].mean():.0f}")
+                st.metric("Avg Words/Review", f"{float(loaded_stats['AVG_WORDS']):.0f}")
                 
+            st.caption(f":material/preview: Showing the first {len(df)} review(s); the full table is streamed in batches of {BATCH_ROWS:,} rows when chunks are saved")
             # Display review summary
             st.dataframe(df[['DOC_ID', 'FILE_NAME', 'FILE_TYPE', 'UPLOAD_TIMESTAMP', 'WORD_COUNT']], 
                         use_container_width=True)
@@ -207,18 +233,36 @@ try:
             st.info("""
             **Customer Review Processing Options:**
             
-            Since customer reviews are typically short (~150 words each), you have two options:
+            Since customer reviews are typically short (~150 words each), you have several options:
             - **Option 1**: Use each review as-is (Recommended for reviews)
-            - **Option 2**: Chunk longer reviews (For reviews >200 words)
+            - **Option 2**: Chunk longer reviews by word count (For reviews >200 words)
+            - **Option 3**: Pack whole sentences up to a token target (never splits mid-sentence)
+            - **Option 4**: Split recursively on paragraphs, lines, sentences, then words up to a token target
+            
+            Token targets are measured with a real tokenizer, so chunks fit the embedding model's 
+            512-token limit and the RAG prompt budget. Reviews that already fit are kept whole.
             """)
             
             processing_option = st.radio(
                 "Select processing strategy:",
                 ["Keep each review as a single chunk (Recommended)", 
-                 "Chunk reviews longer than threshold"],
+                 "Chunk reviews longer than threshold",
+                 "Sentence-aware chunks (token target)",
+                 "Recursive separators (token target)"],
                 index=0
             )
             
+            token_counter = get_token_counter()
+            embed_budget = token_counter.embed_budget()
+            if token_counter.approximate:
+                st.warning(f":material/warning: No tokenizer available offline; token counts are a words + punctuation "
+                           f"approximation, so chunks are kept under {embed_budget} of the model's {EMBED_TOKEN_LIMIT} tokens "
+                           f"({EMBED_SAFETY_MARGIN:.0%} safety margin)")
+            elif not token_counter.exact:
+                st.caption(f":material/info: Counting with `{token_counter.name}` as a stand-in for the embedding model's "
+                           f"WordPiece tokenizer; chunk limits keep a {EMBED_SAFETY_MARGIN:.0%} safety margin "
+                           f"({embed_budget} of {EMBED_TOKEN_LIMIT} tokens)")
+            
             # Add chunk size controls (only show if chunking option is selected)
             if "Chunk reviews" in processing_option:
                 col1, col2 = st.columns(2)
@@ -241,76 +285,48 @@ try:
                         help="Number of overlapping words between chunks"
                     )
                 st.caption(f"Reviews with >{chunk_size} words will be split into chunks of {chunk_size} words with {overlap} word overlap")
+                chunker = make_chunker("words", chunk_size=chunk_size, overlap=overlap, counter=token_counter)
+            elif "token target" in processing_option:
+                col1, col2 = st.columns(2)
+                with col1:
+                    max_tokens = st.slider(
+                        "Max Tokens per Chunk:",
+                        min_value=64,
+                        max_value=embed_budget,
+                        value=min(256, embed_budget),
+                        step=32,
+                        help=f"snowflake-arctic-embed-m truncates input beyond {EMBED_TOKEN_LIMIT} WordPiece tokens; "
+                             f"{embed_budget} is the most that fits as `{token_counter.name}` counts"
+                    )
+                with col2:
+                    overlap_tokens = st.slider(
+                        "Overlap (tokens):",
+                        min_value=0,
+                        max_value=128,
+                        value=32,
+                        step=16,
+                        help="Trailing sentences/pieces up to this many tokens are repeated in the next chunk"
+                    )
+                strategy = "sentences" if "Sentence-aware" in processing_option else "recursive"
+                chunker = make_chunker(strategy, max_tokens=max_tokens, overlap_tokens=overlap_tokens, counter=token_counter)
+                st.caption(f"Reviews with >{max_tokens} tokens will be split; tokenizer: `{token_counter.name}`")
             else:
-                # Default values if not chunking
-                chunk_size = 200
-                overlap = 50
+                chunker = make_chunker("whole", counter=token_counter)
             
             if st.button(":material/flash_on: Process Reviews", type="primary", use_container_width=True):
-                chunks = []
-                
                 with st.status("Processing reviews...", expanded=True) as status:
-                    if "Keep each review" in processing_option:
-                        # Option 1: One review = one chunk
-                        st.write(":material/edit_note: Creating one chunk per review...")
-                        
-                        for idx, row in df.iterrows():
-                            chunks.append({
-                                'doc_id': row['DOC_ID'],
-                                'file_name': row['FILE_NAME'],
-                                'chunk_id': idx + 1,
-                                'chunk_text': row['EXTRACTED_TEXT'],
-                                'chunk_size': row['WORD_COUNT'],
-                                'chunk_type': 'full_review'
-                            })
-                        
-                        st.write(f":material/check_circle: Created {len(chunks)} chunks (1 per review)")
-                        
-                    else:
-                        # Option 2: Chunk longer reviews
-                        st.write(f":material/edit_note: Chunking reviews longer than {chunk_size} words...")
-                        chunk_id = 1
-                        
-                        for idx, row in df.iterrows():
-                            text = row['EXTRACTED_TEXT']
-                            words = text.split()
-                            
-                            if len(words) <= chunk_size:
-                                # Keep short reviews as-is
-                                chunks.append({
-                                    'doc_id': row['DOC_ID'],
-                                    'file_name': row['FILE_NAME'],
-                                    'chunk_id': chunk_id,
-                                    'chunk_text': text,
-                                    'chunk_size': len(words),
-                                    'chunk_type': 'full_review'
-                                })
-                                chunk_id += 1
-                            else:
-                                # Split longer reviews
-                                for i in range(0, len(words), chunk_size - overlap):
-                                    chunk_words = words[i:i + chunk_size]
-                                    chunk_text = ' '.join(chunk_words)
-                                    
-                                    chunks.append({
-                                        'doc_id': row['DOC_ID'],
-                                        'file_name': row['FILE_NAME'],
-                                        'chunk_id': chunk_id,
-                                        'chunk_text': chunk_text,
-                                        'chunk_size': len(chunk_words),
-                                        'chunk_type': 'chunked_review'
-                                    })
-                                    chunk_id += 1
-                        
-                        st.write(f":material/check_circle: Created {len(chunks)} chunks from {len(df)} reviews")
+                    st.write(f":material/edit_note: Chunking the preview sample with the `{chunker.name}` strategy...")
+                    chunks = assign_stable_ids(chunker.chunk_frame(df))
+                    st.write(f":material/check_circle: Created {len(chunks)} chunks from {len(df)} previewed reviews")
                     
                     status.update(label="Processing complete!", state="complete", expanded=False)
                         
-                # Store chunks in session state
+                # Store the preview chunks and the chosen strategy; the full corpus is chunked while saving
                 st.session_state.review_chunks = chunks
+                st.session_state.day17_chunker = chunker
                 st.session_state.processing_option = processing_option
                 
-                st.success(f":material/check_circle: Processed {len(df)} reviews into {len(chunks)} searchable chunks!")
+                st.success(f":material/check_circle: Processed {len(df)} preview reviews into {len(chunks)} searchable chunks!")
         
         # Display chunks if they exist
         if 'review_chunks' in st.session_state:
@@ -318,28 +334,46 @@ try:
                 st.subheader(":material/looks_3: Processed Review Chunks")
                 
                 chunks = st.session_state.review_chunks
+                st.caption(f":material/preview: Preview from the first {len(st.session_state.loaded_data)} review(s); all {st.session_state.loaded_stats['DOCS']:,} are chunked batch-by-batch in Step 4")
                 
                 col1, col2, col3 = st.columns(3)
                 with col1:
                     st.metric("Total Chunks", len(chunks))
                 with col2:
-                    full_reviews = len([c for c in chunks if c['chunk_type'] == 'full_review'])
+                    full_reviews = int((chunks['CHUNK_TYPE'] == 'full_review').sum())
                     st.metric("Full Reviews", full_reviews)
                 with col3:
-                    split_reviews = len([c for c in chunks if c['chunk_type'] == 'chunked_review'])
+                    split_reviews = int((chunks['CHUNK_TYPE'] == 'chunked_review').sum())
                     st.metric("Split Reviews", split_reviews)
                 
+                # Token statistics for tuning chunk size against retrieval latency and prompt size
+                embed_budget = get_token_counter().embed_budget()
+                stats = token_stats(chunks, limit=embed_budget)
+                col1, col2, col3, col4 = st.columns(4)
+                with col1:
+                    st.metric("Avg Tokens/Chunk", f"{stats['mean']:.0f}")
+                with col2:
+                    st.metric("P95 Tokens", f"{stats['p95']:.0f}")
+                with col3:
+                    st.metric("Max Tokens", stats['max'])
+                with col4:
+                    st.metric(f"Over {embed_budget} Tokens", stats['over_limit'],
+                              help="Chunks the embedding model may truncate (the limit keeps the safety margin "
+                                   "unless the model's own tokenizer is in use)")
+                st.caption(f":material/token: {stats['total']:,} tokens in total, counted with `{get_token_counter().name}`")
+                
                 # Display chunks
                 with st.expander(":material/description: View Chunks"):
-                    chunks_df = pd.DataFrame(chunks)
-                    st.dataframe(chunks_df[['chunk_id', 'file_name', 'chunk_size', 'chunk_type', 'chunk_text']], 
+                    st.bar_chart(chunks['CHUNK_TOKENS'].value_counts(bins=20, sort=False).rename(lambda b: int(b.right)),
+                                 x_label="Tokens per chunk", y_label="Chunks")
+                    st.dataframe(chunks[['CHUNK_ID', 'FILE_NAME', 'CHUNK_SIZE', 'CHUNK_TOKENS', 'CHUNK_TYPE', 'CHUNK_TEXT']], 
                                 use_container_width=True)
             
             # Step 4: Save chunks to Snowflake
             with st.container(border=True):
                 st.subheader(":material/looks_4: Save Chunks to Snowflake")
                 
-                chunks = st.session_state.review_chunks
+                chunker = st.session_state.day17_chunker
                 
                 # Chunk table name
                 col1, col2 = st.columns([2, 1])
@@ -394,7 +428,39 @@ try:
                 if replace_mode:
                     st.warning("**Replace Mode Active**: Existing chunks will be deleted before saving new ones.")
                 else:
-                    st.success("**Append Mode Active**: New chunks will be added to existing data.")
+                    st.info("**Append Mode Active**: Chunks of other documents are kept. Existing chunks for the "
+                            "documents in this run (its DOC_ID range) are deleted and rewritten, so re-running never "
+                            "duplicates them.")
+                
+                # Incremental mode: only chunk documents uploaded since the last run into this table
+                watermark_table = f"{st.session_state.day17_database}.{st.session_state.day17_schema}.{WATERMARK_TABLE}"
+                try:
+                    last_doc_id = read_watermark(session, watermark_table, st.session_state.source_table, full_chunk_table)
+                except Exception:
+                    last_doc_id = 0
+                incremental = st.checkbox(
+                    ":material/update: Incremental Mode (only new documents)",
+                    value=last_doc_id > 0 and not replace_mode,
+                    disabled=replace_mode,
+                    help="Chunks only documents with a DOC_ID above the last processed watermark for this source and chunk table"
+                )
+                incremental = incremental and not replace_mode
+                if incremental:
+                    st.caption(f":material/bookmark: Watermark: DOC_ID {last_doc_id:,} — documents above it will be chunked and appended, replacing any chunks already saved for them")
+                
+                # Where the chunking runs
+                chunk_location = st.radio(
+                    "Chunking Location:",
+                    ["Stream batches through the app (write_pandas)",
+                     "In-warehouse pushdown (Python UDTF + INSERT ... SELECT)"],
+                    index=0,
+                    help="Pushdown runs the same strategy inside Snowflake, so reviews never leave the warehouse"
+                )
+                pushdown = chunk_location.startswith("In-warehouse")
+                if pushdown:
+                    st.caption(":material/cloud: Throughput scales with the warehouse size. The warehouse counts tokens with "
+                               "tiktoken or the words + punctuation approximation, so token targets are capped at "
+                               f"that counter's safe budget ({EMBED_SAFETY_MARGIN:.0%} margin)")
                 
                 # Save chunks to table
                 if st.button(":material/save: Save Chunks to Snowflake", type="primary", use_container_width=True):
@@ -410,10 +476,13 @@ try:
                                 CHUNK_TEXT VARCHAR,
                                 CHUNK_SIZE NUMBER,
                                 CHUNK_TYPE VARCHAR,
-                                CREATED_TIMESTAMP TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
+                                CREATED_TIMESTAMP TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP(),
+                                CHUNK_TOKENS NUMBER
                             )
                             """
                             session.sql(create_table_sql).collect()
+                            # Tables created before token counts were tracked get the new column
+                            session.sql(f"ALTER TABLE {full_chunk_table} ADD COLUMN IF NOT EXISTS CHUNK_TOKENS NUMBER").collect()
                             
                             # Step 2: Replace mode - clear existing chunks
                             if replace_mode:
@@ -424,35 +493,66 @@ try:
                                 except Exception as e:
                                     st.write(f"   :material/warning: No existing chunks to clear")
                             
-                            # Step 3: Insert chunks
-                            st.write(f":material/looks_3: Inserting {len(chunks)} chunk(s)...")
-                            chunks_df = pd.DataFrame(chunks)
+                            # Pin the document range for this run; the watermark only moves after a successful write
+                            ensure_watermark_table(session, watermark_table)
+                            after_doc_id = last_doc_id if incremental else 0
+                            pending = pending_documents(session, st.session_state.source_table, after_doc_id)
+                            pending_docs = pending['DOCS']
+                            high_doc_id = pending['HIGH_DOC_ID'] or after_doc_id
+                            doc_filter = doc_range_filter(after_doc_id, high_doc_id)
+                            if incremental:
+                                st.write(f":material/update: Incremental mode: {pending_docs:,} new document(s) since DOC_ID {after_doc_id:,}")
                             
-                            # Rename columns to uppercase to match Snowflake table
-                            chunks_df_upper = chunks_df[['chunk_id', 'doc_id', 'file_name', 'chunk_text', 
-                                                           'chunk_size', 'chunk_type']].copy()
-                            chunks_df_upper.columns = ['CHUNK_ID', 'DOC_ID', 'FILE_NAME', 'CHUNK_TEXT', 
-                                                       'CHUNK_SIZE', 'CHUNK_TYPE']
+                            # Chunks left by a failed earlier run (or an earlier append) for this range are rewritten, not duplicated
+                            if not replace_mode:
+                                cleared = clear_document_range(session, full_chunk_table, after_doc_id, high_doc_id)
+                                if cleared:
+                                    st.write(f"   :material/cleaning_services: Removed {cleared:,} existing chunk(s) for these documents before rewriting them")
                             
-                            if replace_mode:
-                                # Use overwrite for replace mode (though we already truncated)
-                                session.write_pandas(chunks_df_upper,
-                                                   table_name=st.session_state.day17_chunk_table,
-                                                   database=st.session_state.day17_database,
-                                                   schema=st.session_state.day17_schema,
-                                                   overwrite=True)
+                            # Step 3 (pushdown): chunk inside Snowflake with a UDTF, no client data transfer
+                            if pushdown:
+                                st.write(f":material/looks_3: Registering the `{chunker.name}` chunking UDTF...")
+                                udtf_name = register_chunking_udtf(session, chunker)
+                                st.write(f":material/cloud: Chunking {pending_docs:,} review(s) in the warehouse...")
+                                insert_result = session.sql(pushdown_chunk_sql(st.session_state.source_table, full_chunk_table, udtf_name,
+                                                                               where=doc_filter)).collect()
+                                total_chunks = insert_result[0][0] if insert_result else 0
+                                st.write(f"   :material/check_circle: Inserted {total_chunks:,} chunks")
+                            
+                            # Step 3: Stream reviews in bounded batches: load -> chunk -> write
                             else:
-                                # Append mode
-                                session.write_pandas(chunks_df_upper,
-                                                   table_name=st.session_state.day17_chunk_table,
-                                                   database=st.session_state.day17_database,
-                                                   schema=st.session_state.day17_schema,
-                                                   overwrite=False)
+                                st.write(f":material/looks_3: Chunking and inserting {pending_docs:,} review(s) in batches of {BATCH_ROWS:,}...")
+                                source_query = f"""
+                                SELECT DOC_ID, FILE_NAME, EXTRACTED_TEXT
+                                FROM {st.session_state.source_table}
+                                WHERE {doc_filter}
+                                ORDER BY FILE_NAME
+                                """
+                                progress_bar = st.progress(0.0)
+                                docs_done = 0
+                                total_chunks = 0
+                            
+                                for batch in iter_batches(session, source_query, batch_rows=BATCH_ROWS):
+                                    batch_chunks = assign_stable_ids(chunker.chunk_frame(batch))
+                                    # Already columnar with uppercase names matching the table
+                                    session.write_pandas(batch_chunks,
+                                                       table_name=st.session_state.day17_chunk_table,
+                                                       database=st.session_state.day17_database,
+                                                       schema=st.session_state.day17_schema,
+                                                       overwrite=False)
+                                    docs_done += len(batch)
+                                    total_chunks += len(batch_chunks)
+                                    progress_bar.progress(min(docs_done / max(pending_docs, 1), 1.0),
+                                                          text=f"{docs_done:,} reviews → {total_chunks:,} chunks")
+                            
+                            if pending['HIGH_DOC_ID'] is not None:
+                                save_watermark(session, watermark_table, st.session_state.source_table, full_chunk_table,
+                                               pending['HIGH_DOC_ID'], pending['LAST_UPLOAD_TIMESTAMP'])
                             
                             status.update(label=":material/check_circle: Chunks saved!", state="complete", expanded=False)
                         
                         mode_msg = "replaced in" if replace_mode else "saved to"
-                        st.success(f":material/check_circle: Successfully {mode_msg} `{full_chunk_table}`\n\n:material/description: {len(chunks)} chunk(s) now in table")
+                        st.success(f":material/check_circle: Successfully {mode_msg} `{full_chunk_table}`\n\n:material/description: {total_chunks:,} chunk(s) written")
                         
                         # Store for Day 18
                         st.session_state.chunks_table = full_chunk_table
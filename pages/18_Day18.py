@@ -2,9 +2,32 @@ import streamlit as st
 from snowflake.cortex import embed_text_768
 import pandas as pd
 import numpy as np
+import time
+from rag_utils.embedding import (EMBED_MODEL, EmbeddingBatchError, embed_concurrently, embed_in_warehouse_sql,
+                                 missing_chunks_filter, prepare_embeddings_table, save_embeddings, text_hash)
+from rag_utils.embedding_cache import (CACHE_TABLE, CacheStats, EmbeddingCache, cache_table_sql,
+                                       embed_from_cache_sql, embed_with_cache, fill_cache_sql)
+from rag_utils.exact import exact_search
+from rag_utils.loading import fetch_one, fetch_preview, iter_batches
+from rag_utils.quantization import QUANTIZATION_MODES, QuantizedStore, build_codes, evaluate_recall, recall_at_k
+from rag_utils.snapshot import load_snapshot
+from rag_utils.vectors import EmbeddingMatrix
 
 st.set_page_config(page_title="Day 18 - Embeddings Generator", page_icon="1️⃣8️⃣", layout="wide")
 
+# Rows kept as a preview in session state
+PREVIEW_ROWS = 100
+
+@st.cache_resource
+def get_embedding_cache(database, schema):
+    # Process-wide local tier, shared across reruns and sessions; persisted tier in Snowflake
+    return EmbeddingCache(table=CACHE_TABLE, database=database, schema=schema)
+
+@st.cache_resource(max_entries=4)
+def get_quantized_codes(table, mode, version, _vectors):
+    # Only the compact codes are cached; the float32 rows stay in the memory-mapped snapshot
+    return build_codes(_vectors, mode)
+
 st.title(":material/calculate: Day 18: Embeddings Generator for Customer Reviews")
 st.caption("30 Days of AI")
 st.markdown("---")
@@ -171,7 +194,7 @@ try:
         
         # Check for existing loaded data
         if 'chunks_data' in st.session_state:
-            st.success(f":material/check_circle: **{len(st.session_state.chunks_data)} chunk(s)** already loaded")
+            st.success(f":material/check_circle: **{st.session_state.chunks_stats['CHUNKS']:,} chunk(s)** ready to embed")
         
         # Load chunks button
         if st.button(":material/folder_open: Load Chunks", type="primary", use_container_width=True):
@@ -179,7 +202,20 @@ try:
                 with st.status("Loading chunks...", expanded=True) as status:
                     st.write(":material/wifi: Querying database...")
                     
-                    query = f"""
+                    chunk_table = f"{st.session_state.day18_database}.{st.session_state.day18_schema}.{st.session_state.day18_chunk_table}"
+                    
+                    # Only summary statistics and a small preview sample are kept in session state;
+                    # chunks are streamed in batches when embeddings are generated
+                    stats = fetch_one(session, f"""
+                    SELECT 
+                        COUNT(*) AS CHUNKS,
+                        COUNT(DISTINCT FILE_NAME) AS FILES,
+                        COALESCE(AVG(CHUNK_SIZE), 0) AS AVG_SIZE,
+                        COUNT_IF(CHUNK_TYPE = 'full_review') AS FULL_REVIEWS,
+                        COUNT_IF(CHUNK_TYPE = 'chunked_review') AS SPLIT_REVIEWS
+                    FROM {chunk_table}
+                    """)
+                    df = fetch_preview(session, f"""
                     SELECT 
                         CHUNK_ID,
                         DOC_ID,
@@ -187,16 +223,17 @@ try:
                         CHUNK_TEXT,
                         CHUNK_SIZE,
                         CHUNK_TYPE
-                    FROM {st.session_state.day18_database}.{st.session_state.day18_schema}.{st.session_state.day18_chunk_table}
+                    FROM {chunk_table}
                     ORDER BY CHUNK_ID
-                    """
-                    df = session.sql(query).to_pandas()
+                    """, limit=PREVIEW_ROWS)
                     
-                    st.write(f":material/check_circle: Loaded {len(df)} chunks")
+                    st.write(f":material/check_circle: Found {stats['CHUNKS']:,} chunks, previewing {len(df)}")
                     status.update(label="Chunks loaded successfully!", state="complete", expanded=False)
                     
                     # Store in session state
                     st.session_state.chunks_data = df
+                    st.session_state.chunks_stats = stats
+                    st.session_state.day18_source_chunk_table = chunk_table
                     st.rerun()
                     
             except Exception as e:
@@ -209,26 +246,26 @@ try:
             st.subheader(":material/looks_one: Chunk Summary")
             
             df = st.session_state.chunks_data
+            chunks_stats = st.session_state.chunks_stats
             
             col1, col2, col3 = st.columns(3)
             with col1:
-                st.metric("Total Chunks", len(df))
+                st.metric("Total Chunks", f"{chunks_stats['CHUNKS']:,}")
             with col2:
-                st.metric("Unique Reviews", df['FILE_NAME'].nunique())
+                st.metric("Unique Reviews", f"{chunks_stats['FILES']:,}")
             with col3:
-                st.metric("Avg Chunk Size", f"{df['CHUNK_SIZE'].mean():.0f} words")
+                st.metric("Avg Chunk Size", f"{float(chunks_stats['AVG_SIZE']):.0f} words")
             
             # Show chunk type distribution
-            if 'CHUNK_TYPE' in df.columns:
-                st.write("**Chunk Type Distribution:**")
-                chunk_type_counts = df['CHUNK_TYPE'].value_counts()
-                col1, col2 = st.columns(2)
-                with col1:
-                    st.metric("Full Reviews", chunk_type_counts.get('full_review', 0))
-                with col2:
-                    st.metric("Split Reviews", chunk_type_counts.get('chunked_review', 0))
+            st.write("**Chunk Type Distribution:**")
+            col1, col2 = st.columns(2)
+            with col1:
+                st.metric("Full Reviews", chunks_stats['FULL_REVIEWS'])
+            with col2:
+                st.metric("Split Reviews", chunks_stats['SPLIT_REVIEWS'])
             
             with st.expander(":material/description: Preview Chunks"):
+                st.caption(f"First {min(len(df), 10)} of {chunks_stats['CHUNKS']:,} chunks")
                 st.dataframe(df.head(10), use_container_width=True)
         
         # Generate embeddings
@@ -247,185 +284,213 @@ try:
             - Group similar feedback together semantically
             """)
             
-            # Batch size selection
-            batch_size = st.selectbox("Batch Size", [10, 25, 50, 100], index=1,
-                                      help="Number of chunks to process at once")
-
-            if st.button(":material/calculate: Generate Embeddings", type="primary", use_container_width=True):
-                try:
-                    with st.status("Generating embeddings...", expanded=True) as status:
-                        embeddings = []
-                        total_chunks = len(df)
-                        progress_bar = st.progress(0)
-                        
-                        for i in range(0, total_chunks, batch_size):
-                            batch_end = min(i + batch_size, total_chunks)
-                            st.write(f"Processing chunks {i+1} to {batch_end} of {total_chunks}...")
+            st.session_state.day18_embedding_table = st.text_input(
+                "Embeddings Table Name",
+                value=st.session_state.day18_embedding_table,
+                help="Table name for storing embeddings",
+                key="day18_embedding_table_input"
+            )
+            embedding_table = f"{st.session_state.day18_database}.{st.session_state.day18_schema}.{st.session_state.day18_embedding_table}"
+            
+            use_cache = st.checkbox(
+                ":material/cached: Use embedding cache",
+                value=True,
+                help=f"Reuse embeddings of identical chunk text (same model) from `{CACHE_TABLE}`; only cache misses are sent to the model"
+            )
+            only_missing = st.checkbox(
+                ":material/filter_alt: Only embed chunks missing from the embeddings table",
+                value=True,
+                help="When unticked, the embeddings table is replaced and every chunk is re-embedded"
+            )
+            
+            embed_mode = st.radio(
+                "Embedding Mode:",
+                ["In-warehouse (single INSERT ... SELECT)", "Client-side (embed chunks from the app)"],
+                index=0,
+                help="In-warehouse mode embeds the whole chunk table in one statement; no vectors pass through the app"
+            )
+            st.caption(f"Writes directly to `{embedding_table}`")
+            
+            if embed_mode.startswith("In-warehouse"):
+                if st.button(":material/calculate: Generate Embeddings", type="primary", use_container_width=True):
+                    try:
+                        with st.status("Generating embeddings in Snowflake...", expanded=True) as status:
+                            st.write(":material/looks_one: Preparing table...")
+                            chunk_table = st.session_state.day18_source_chunk_table
+                            stale = prepare_embeddings_table(session, embedding_table, chunk_table, replace=not only_missing)
+                            if stale:
+                                st.write(f":material/delete_sweep: Removed {stale:,} embedding(s) whose chunk text changed or no longer exists")
                             
-                            for idx, row in df.iloc[i:batch_end].iterrows():
-                                # Generate embedding using the correct function signature
-                                emb = embed_text_768(model='snowflake-arctic-embed-m', text=row['CHUNK_TEXT'])
-                                embeddings.append({
-                                    'chunk_id': row['CHUNK_ID'],
-                                    'embedding': emb
-                                })
+                            st.write(f":material/cloud: Embedding {'missing' if only_missing else 'all'} chunks with `{EMBED_MODEL}`...")
+                            if use_cache:
+                                # Embed each distinct uncached text once, then write chunk embeddings from the cache
+                                cache_table = f"{st.session_state.day18_database}.{st.session_state.day18_schema}.{CACHE_TABLE}"
+                                session.sql(cache_table_sql(cache_table)).collect()
+                                chunk_filter = missing_chunks_filter(embedding_table) if only_missing else None
+                                considered = fetch_one(session, f"""
+                                SELECT COUNT(*) AS N FROM {chunk_table} c
+                                {f"WHERE {chunk_filter}" if chunk_filter else ""}
+                                """)['N']
+                                filled = session.sql(fill_cache_sql(chunk_table, cache_table, chunk_filter=chunk_filter)).collect()
+                                computed = filled[0][0] if filled else 0
+                                result = session.sql(embed_from_cache_sql(chunk_table, embedding_table, cache_table,
+                                                                          chunk_filter=chunk_filter)).collect()
+                                inserted = result[0][0] if result else 0
+                                hit_rate = 1 - computed / considered if considered else 0.0
+                                st.write(f":material/cached: {computed:,} new embedding(s) computed for {considered:,} chunk(s) — cache hit rate {hit_rate:.0%}")
+                            else:
+                                result = session.sql(embed_in_warehouse_sql(chunk_table, embedding_table,
+                                                                            only_missing=only_missing)).collect()
+                                inserted = result[0][0] if result else 0
                             
-                            # Update progress
-                            progress = batch_end / total_chunks
-                            progress_bar.progress(progress)
+                            status.update(label="Embeddings generated!", state="complete", expanded=False)
                         
-                        status.update(label="Embeddings generated!", state="complete", expanded=False)
+                        st.success(f":material/check_circle: Embedded and saved {inserted:,} chunk(s) to `{embedding_table}`")
                         
-                        # Store in session state
-                        st.session_state.embeddings_data = embeddings
-                
-                        st.success(f":material/check_circle: Generated {len(embeddings)} embeddings for {len(df)} review chunks!")
+                        # Store for Day 19
+                        st.session_state.embeddings_table = embedding_table
+                        st.session_state.embeddings_database = st.session_state.day18_database
+                        st.session_state.embeddings_schema = st.session_state.day18_schema
                         
-                except Exception as e:
-                    st.error(f"Error generating embeddings: {str(e)}")
-        
-        # View embeddings
-        if 'embeddings_data' in st.session_state:
-            with st.container(border=True):
-                st.subheader(":material/looks_3: View Embeddings")
-                
-                embeddings = st.session_state.embeddings_data
-                
+                    except Exception as e:
+                        st.error(f"Error generating embeddings: {str(e)}")
+            
+            else:
                 col1, col2 = st.columns(2)
                 with col1:
-                    st.metric("Embeddings Generated", len(embeddings))
+                    # Batch size selection
+                    batch_size = st.selectbox("Batch Size", [10, 25, 50, 100, 250, 500], index=3,
+                                              help="Chunks embedded and written to the table per batch")
                 with col2:
-                    st.metric("Dimensions per Embedding", 768)
-                
-                # Show sample embedding
-                with st.expander(":material/search: View Sample Embedding"):
-                    sample_emb = embeddings[0]['embedding']
-                    st.write("**First 10 values:**")
-                    st.write(sample_emb[:10])
-            
-            # Save embeddings to Snowflake
-            with st.container(border=True):
-                st.subheader(":material/looks_4: Save Embeddings to Snowflake")
-                
-                embeddings = st.session_state.embeddings_data
-                
-                # Embedding table name
-                col1, col2 = st.columns([2, 1])
-                with col1:
-                    st.session_state.day18_embedding_table = st.text_input(
-                        "Embeddings Table Name",
-                        value=st.session_state.day18_embedding_table,
-                        help="Table name for storing embeddings",
-                        key="day18_embedding_table_input"
-                    )
-                
-                full_embedding_table = f"{st.session_state.day18_database}.{st.session_state.day18_schema}.{st.session_state.day18_embedding_table}"
-                st.code(full_embedding_table, language="sql")
-                    
-                # Check if embeddings table exists and show status
-                try:
-                    check_query = f"""
-                    SELECT COUNT(*) as count 
-                    FROM {full_embedding_table}
-                    """
-                    result = session.sql(check_query).collect()
-                    current_count = result[0]['COUNT']
-                    
-                    if current_count > 0:
-                        st.warning(f":material/warning: **{current_count:,} embedding(s)** currently in table `{full_embedding_table}`")
-                        embedding_table_exists = True
-                    else:
-                        st.info(":material/inbox: **Embedding table is empty** - No embeddings saved yet.")
-                        embedding_table_exists = False
-                except:
-                    st.info(":material/inbox: **Embedding table doesn't exist yet** - Will be created when you save embeddings.")
-                    embedding_table_exists = False
-                
-                # Initialize or update checkbox state based on table status
-                if 'day18_replace_mode' not in st.session_state:
-                    st.session_state.day18_replace_mode = embedding_table_exists
-                else:
-                    if 'day18_last_embedding_table' not in st.session_state or st.session_state.day18_last_embedding_table != full_embedding_table:
-                        st.session_state.day18_replace_mode = embedding_table_exists
-                        st.session_state.day18_last_embedding_table = full_embedding_table
-                
-                # Replace mode checkbox
-                replace_mode = st.checkbox(
-                    f":material/sync: Replace Table Mode for `{st.session_state.day18_embedding_table}`",
-                    help=f"When enabled, replaces all existing embeddings in {full_embedding_table}",
-                    key="day18_replace_mode"
-                )
-                
-                if replace_mode:
-                    st.warning("**Replace Mode Active**: Existing embeddings will be deleted before saving new ones.")
-                else:
-                    st.success("**Append Mode Active**: New embeddings will be added to existing data.")
-                
-                if st.button(":material/save: Save Embeddings to Snowflake", type="primary", use_container_width=True):
+                    concurrency = st.slider("Concurrent Requests", min_value=1, max_value=32, value=8,
+                                            help="Maximum embedding calls in flight at once")
+
+                if st.button(":material/calculate: Generate Embeddings", type="primary", use_container_width=True):
+                    # Each batch is written to the table as soon as it is embedded; only a preview stays in memory
+                    preview = EmbeddingMatrix()
+                    saved = 0
                     try:
-                        with st.status("Saving embeddings...", expanded=True) as status:
-                            # Step 1: Create or truncate embeddings table
-                            st.write(":material/looks_one: Preparing table...")
+                        with st.status("Generating embeddings...", expanded=True) as status:
+                            chunk_table = st.session_state.day18_source_chunk_table
+                            stale = prepare_embeddings_table(session, embedding_table, chunk_table, replace=not only_missing)
+                            if stale:
+                                st.write(f":material/delete_sweep: Removed {stale:,} embedding(s) whose chunk text changed or no longer exists")
+                            chunk_filter = missing_chunks_filter(embedding_table) if only_missing else None
+                            total_chunks = fetch_one(session, f"""
+                            SELECT COUNT(*) AS N FROM {chunk_table} c
+                            {f"WHERE {chunk_filter}" if chunk_filter else ""}
+                            """)['N']
+                            cache = get_embedding_cache(st.session_state.day18_database, st.session_state.day18_schema)
+                            # The cache is shared by every session; count this run's lookups separately
+                            stats = CacheStats()
+                            if use_cache:
+                                session.sql(cache_table_sql(cache.full_table)).collect()
+                            progress_bar = st.progress(0, text=f"Embedding {total_chunks:,} chunk(s)...")
+                            done = 0
                             
-                            if replace_mode:
-                                # Replace existing data
-                                create_table_sql = f"""
-                                CREATE OR REPLACE TABLE {full_embedding_table} (
-                                    CHUNK_ID NUMBER,
-                                    EMBEDDING VECTOR(FLOAT, 768),
-                                    CREATED_TIMESTAMP TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
-                                )
-                                """
-                                session.sql(create_table_sql).collect()
-                                st.write(":material/check_circle: Replaced existing table")
-                            else:
-                                # Create if doesn't exist
-                                create_table_sql = f"""
-                                CREATE TABLE IF NOT EXISTS {full_embedding_table} (
-                                    CHUNK_ID NUMBER,
-                                    EMBEDDING VECTOR(FLOAT, 768),
-                                    CREATED_TIMESTAMP TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
+                            def embed_one(text):
+                                return embed_text_768(model=EMBED_MODEL, text=text, session=session)
+                            
+                            def embed_many(texts):
+                                # Progress follows completed calls, not loop position
+                                return embed_concurrently(
+                                    texts, embed_one, max_in_flight=concurrency,
+                                    on_complete=lambda n, total: progress_bar.progress(
+                                        min((done + n * batch_len / total) / max(total_chunks, 1), 1.0),
+                                        text=f"Embedded {done + n * batch_len // total:,} of {total_chunks:,} chunk(s)"))
+                            
+                            def persist(chunk_ids, texts, vectors):
+                                # The text hash lets a later "only missing" run spot reused chunk IDs
+                                inserted = save_embeddings(
+                                    session, chunk_ids, vectors,
+                                    table=st.session_state.day18_embedding_table,
+                                    database=st.session_state.day18_database,
+                                    schema=st.session_state.day18_schema,
+                                    text_hashes=[text_hash(t) for t in texts],
                                 )
-                                """
-                                session.sql(create_table_sql).collect()
-                                st.write(":material/check_circle: Table ready")
+                                if len(preview) < PREVIEW_ROWS:
+                                    keep = PREVIEW_ROWS - len(preview)
+                                    preview.append(chunk_ids[:keep], vectors[:keep])
+                                return inserted
                             
-                            # Step 2: Insert embeddings
-                            st.write(f":material/looks_two: Inserting {len(embeddings)} embeddings...")
+                            # Stream chunks in bounded batches straight into the embedding model and the table
+                            chunk_query = f"""
+                            SELECT c.CHUNK_ID, c.CHUNK_TEXT
+                            FROM {chunk_table} c
+                            {f"WHERE {chunk_filter}" if chunk_filter else ""}
+                            ORDER BY c.CHUNK_ID
+                            """
+                            for batch in iter_batches(session, chunk_query, batch_rows=batch_size):
+                                batch_len = len(batch)
+                                chunk_ids = batch['CHUNK_ID'].tolist()
                             
-                            for i, emb_data in enumerate(embeddings):
-                                # Get embedding list
-                                if isinstance(emb_data['embedding'], list):
-                                    emb_list = emb_data['embedding']
-                                else:
-                                    emb_list = list(emb_data['embedding'])
-                                
-                                # Convert to proper array format for Snowflake
-                                emb_array = "[" + ",".join([str(float(x)) for x in emb_list]) + "]"
-                                
-                                insert_sql = f"""
-                                INSERT INTO {full_embedding_table} (CHUNK_ID, EMBEDDING)
-                                SELECT {emb_data['chunk_id']}, {emb_array}::VECTOR(FLOAT, 768)
-                                """
-                                session.sql(insert_sql).collect()
-                                
-                                if (i + 1) % 10 == 0:
-                                    st.write(f"Saved {i + 1} of {len(embeddings)} embeddings...")
+                                # Look up the batch in the cache; only misses are sent to the model
+                                texts = batch['CHUNK_TEXT'].fillna('').tolist()
+                                try:
+                                    if use_cache:
+                                        vectors = embed_with_cache(session, cache, texts, embed_many, stats=stats)
+                                    else:
+                                        vectors = embed_many(texts)
+                                except EmbeddingBatchError as e:
+                                    # Keep every embedding finished before the failure
+                                    finished = [(chunk_id, text, emb) for chunk_id, text, emb in zip(chunk_ids, texts, e.results)
+                                                if emb is not None]
+                                    if finished:
+                                        saved += persist([c for c, _, _ in finished], [t for _, t, _ in finished],
+                                                         [v for _, _, v in finished])
+                                    raise
+                                saved += persist(chunk_ids, texts, vectors)
                             
-                            status.update(label="Embeddings saved!", state="complete", expanded=False)
+                                done += batch_len
+                                progress_bar.progress(min(done / max(total_chunks, 1), 1.0),
+                                                      text=f"Embedded and saved {saved:,} of {total_chunks:,} chunk(s)")
+                            
+                            if use_cache:
+                                st.write(f":material/cached: Cache hit rate {stats.hit_rate:.0%} ({stats.hits:,} hits, {stats.misses:,} misses)")
+                        
+                            status.update(label="Embeddings generated!", state="complete", expanded=False)
                         
-                        mode_msg = "replaced in" if replace_mode else "saved to"
-                        st.success(f":material/check_circle: Successfully {mode_msg} `{full_embedding_table}`\n\n:material/calculate: {len(embeddings)} embedding(s) now in table")
+                        st.success(f":material/check_circle: Embedded and saved {saved:,} chunk(s) to `{embedding_table}`")
+                    
+                    except EmbeddingBatchError as e:
+                        st.error(f"Error generating embeddings: {str(e)}")
+                        if saved:
+                            st.warning(f":material/save: {saved:,} embedding(s) finished before the failure are already saved; "
+                                       "re-run with **Only embed chunks missing** ticked to continue from there")
                         
+                    except Exception as e:
+                        st.error(f"Error generating embeddings: {str(e)}")
+                    
+                    if len(preview):
+                        st.session_state.embeddings_data = preview.trim()
+                        st.session_state.embeddings_saved = saved
+                    if saved:
                         # Store for Day 19
-                        st.session_state.embeddings_table = full_embedding_table
+                        st.session_state.embeddings_table = embedding_table
                         st.session_state.embeddings_database = st.session_state.day18_database
                         st.session_state.embeddings_schema = st.session_state.day18_schema
-                        
-                        st.balloons()
-                        
-                    except Exception as e:
-                        st.error(f"Error saving embeddings: {str(e)}")
+        
+        # View embeddings
+        if 'embeddings_data' in st.session_state:
+            with st.container(border=True):
+                st.subheader(":material/looks_3: View Embeddings")
+                
+                embeddings = st.session_state.embeddings_data
+                
+                col1, col2, col3 = st.columns(3)
+                with col1:
+                    st.metric("Embeddings Saved", f"{st.session_state.get('embeddings_saved', len(embeddings)):,}")
+                with col2:
+                    st.metric("Dimensions per Embedding", embeddings.dim)
+                with col3:
+                    st.metric("Preview in Memory (float32)", f"{embeddings.nbytes / 1e6:.2f} MB",
+                              help=f"Only the first {PREVIEW_ROWS} vectors are kept in the app; the rest are in the table")
+                
+                # Show sample embedding
+                with st.expander(":material/search: View Sample Embedding"):
+                    sample_emb = embeddings.vectors[0]
+                    st.write(f"**First 10 values** (chunk {embeddings.ids[0]}):")
+                    st.write(sample_emb[:10].tolist())
                 
     # View Saved Embeddings Section
     with st.container(border=True):
@@ -545,6 +610,62 @@ try:
                             
                             # Display the full embedding vector as code
                             st.code(emb_vector, language="python")
+                
+                # Local search over a quantized copy of the table
+                with st.expander(":material/compress: Local Quantized Search"):
+                    st.write("Search the embeddings in app memory using compact int8 or binary codes, "
+                             "then rescore the best candidates with full float32 precision.")
+                    
+                    col1, col2, col3 = st.columns(3)
+                    with col1:
+                        quant_mode = st.selectbox("Quantization", QUANTIZATION_MODES, key="day18_quant_mode")
+                    with col2:
+                        quant_k = st.slider("Top K", min_value=1, max_value=20, value=5, key="day18_quant_k")
+                    with col3:
+                        oversample = st.slider("Rescore Oversampling", min_value=1, max_value=20, value=4,
+                                               key="day18_quant_oversample",
+                                               help="Candidates rescored in float32 = Top K x oversampling")
+                    quant_query = st.text_input("Search query:", value="warm gloves for winter", key="day18_quant_query")
+                    measure_recall = st.checkbox("Measure sampled recall", value=False, key="day18_quant_recall",
+                                                 help="Runs 50 extra searches plus exact ground truth over the whole table")
+                    
+                    if st.button(":material/search: Run Quantized Search", key="day18_quant_search"):
+                        try:
+                            with st.spinner("Searching..."):
+                                # Memory-mapped snapshot shared by every session on this host; re-exported when the table changes
+                                local_matrix, snapshot_manifest, _, refreshed = load_snapshot(session, full_embedding_table)
+                                
+                                codes = get_quantized_codes(full_embedding_table, quant_mode, snapshot_manifest['version'],
+                                                            local_matrix.vectors)
+                                store = QuantizedStore(local_matrix, mode=quant_mode, oversample=oversample, codes=codes)
+                                query_vector = np.asarray(embed_text_768(model=EMBED_MODEL, text=quant_query), dtype=np.float32)
+                                
+                                start = time.perf_counter()
+                                result_ids, result_scores = store.search(query_vector, k=quant_k)
+                                search_ms = (time.perf_counter() - start) * 1000
+                                exact_ids, _ = exact_search(local_matrix, query_vector, k=quant_k)
+                                query_recall = recall_at_k(result_ids, exact_ids)
+                                sample_recall = evaluate_recall(store, k=quant_k) if measure_recall else None
+                            
+                            col1, col2, col3, col4 = st.columns(4)
+                            with col1:
+                                st.metric("Code Memory", f"{store.nbytes / 1e6:.2f} MB",
+                                          delta=f"vs {local_matrix.vectors.nbytes / 1e6:.2f} MB float32", delta_color="off")
+                            with col2:
+                                st.metric("Search Time", f"{search_ms:.1f} ms")
+                            with col3:
+                                st.metric(f"Recall@{quant_k} (this query)", f"{query_recall:.0%}")
+                            with col4:
+                                st.metric(f"Recall@{quant_k} (sampled)",
+                                          f"{sample_recall:.0%}" if sample_recall is not None else "—",
+                                          help="Mean over stored vectors used as queries, vs exact float32 search")
+                            
+                            st.dataframe(pd.DataFrame({'CHUNK_ID': result_ids, 'COSINE_SIMILARITY': result_scores}),
+                                         use_container_width=True)
+                            st.caption(f":material/save: {'Refreshed' if refreshed else 'Reused'} on-disk snapshot of "
+                                       f"{snapshot_manifest['rows']:,} vectors exported at {snapshot_manifest['exported_at']}")
+                        except Exception as e:
+                            st.error(f"Error running quantized search: {str(e)}")
             else:
                 st.info(":material/inbox: No embeddings found in table.")
         else:
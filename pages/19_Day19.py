@@ -1,6 +1,8 @@
 import streamlit as st
 from snowflake.core import Root
 import pandas as pd
+from rag_utils.retrieval import SERVICE_REGISTRY
+from rag_utils.search_cache import shared_search_cache
 
 st.set_page_config(page_title="Day 19 - Cortex Search for Customer Reviews", page_icon="1️⃣9️⃣", layout="wide")
 
@@ -222,6 +224,11 @@ AS (
                     """
                     session.sql(create_service_sql).collect()
 
+                    # Results and handles cached for the replaced service (Days 20-23) no longer apply
+                    service_path = f"{st.session_state.day19_database}.{st.session_state.day19_schema}.CUSTOMER_REVIEW_SEARCH"
+                    shared_search_cache().invalidate(service_path)
+                    SERVICE_REGISTRY.invalidate(service_path)
+
                     st.write(":material/looks_two: Waiting for indexing to complete...")
                     st.caption("This may take a few minutes for 100 reviews...")
                     
@@ -1,5 +1,6 @@
 import streamlit as st
-from snowflake.core import Root
+from rag_utils.retrieval import cortex_search
+from rag_utils.search_cache import cached_search, shared_search_cache
 
 st.set_page_config(page_title="Day 20 - Querying Cortex Search", page_icon="2️⃣0️⃣", layout="wide")
 
@@ -147,6 +148,12 @@ try:
         )
 
         num_results = st.slider("Number of results:", 1, 20, 5)
+
+        use_cache = st.checkbox(
+            "Reuse cached results",
+            value=True,
+            help="Repeated searches within the service's TARGET_LAG are answered from memory"
+        )
         
         search_clicked = st.button(":material/search: Search", type="primary", use_container_width=True)
 
@@ -157,28 +164,29 @@ try:
         if search_clicked:
             if query and search_service:
                 try:
-                    root = Root(session)
-                    parts = search_service.split(".")
-                    
-                    if len(parts) != 3:
+                    if len(search_service.split(".")) != 3:
                         st.error("Service path must be in format: database.schema.service_name")
                     else:
-                        svc = (root
-                            .databases[parts[0]]
-                            .schemas[parts[1]]
-                            .cortex_search_services[parts[2]])
+                        search_cache = shared_search_cache()
+                        columns = ["CHUNK_TEXT", "FILE_NAME", "CHUNK_TYPE", "CHUNK_ID"]
                         
                         with st.spinner("Searching..."):
-                            results = svc.search(
-                                query=query,
-                                columns=["CHUNK_TEXT", "FILE_NAME", "CHUNK_TYPE", "CHUNK_ID"],
-                                limit=num_results
-                            )
+                            if use_cache:
+                                results, cache_hit = cached_search(search_cache, session, search_service,
+                                                                   query, columns, num_results)
+                            else:
+                                results, cache_hit = cortex_search(session, search_service, query,
+                                                                   columns, num_results), False
                         
-                        st.success(f":material/check_circle: Found {len(results.results)} result(s)!")
+                        st.success(f":material/check_circle: Found {len(results)} result(s)!")
+                        st.caption(
+                            f":material/cached: {'Served from cache' if cache_hit else 'Fetched from service'} · "
+                            f"cache hit rate {search_cache.hit_rate:.0%} "
+                            f"({search_cache.hits} hits / {search_cache.misses} misses, {len(search_cache)} entries)"
+                        )
                         
                         # Display results
-                        for i, item in enumerate(results.results, 1):
+                        for i, item in enumerate(results, 1):
                             with st.container(border=True):
                                 col1, col2, col3 = st.columns([2, 1, 1])
                                 with col1:
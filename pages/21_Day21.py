@@ -1,8 +1,32 @@
+import json
 import streamlit as st
 from snowflake.snowpark.context import get_active_session
+from rag_utils.context import CONTEXT_SEPARATOR, context_budget, count_tokens, pack_context
+from rag_utils.embedding import text_hash
+from rag_utils.embedding_cache import EmbeddingCache
+from rag_utils.generation import stream_complete
+from rag_utils.precompute import RAG_PROMPT, rag_answer, shared_answer_store
+from rag_utils.retrieval import (DEFAULT_CHUNK_TABLE, DEFAULT_EMBEDDING_TABLE, LOCAL_RETRIEVERS, RETRIEVERS,
+                                 concurrent_search, connection_scope, decompose_question, fuse_results,
+                                 load_local_retriever)
+from rag_utils.rerank import RERANK_OVERFETCH, rerank
+from rag_utils.search_cache import cached_search, shared_search_cache
+from rag_utils.tracing import Trace, append_trace, load_traces, stage_percentiles, to_otlp, trace_log
 
 st.set_page_config(page_title="Day 21 - RAG with Cortex Search", page_icon="2️⃣1️⃣", layout="wide")
 
+@st.cache_resource
+def get_query_cache():
+    # Question embeddings, shared across reruns and sessions
+    return EmbeddingCache(max_entries=10000)
+
+@st.cache_resource(ttl=300, max_entries=16, show_spinner="Loading local vector index...")
+def get_local_retriever(_session, scope, embedding_table, chunk_table, kind="ivf"):
+    # Keyed on connection_scope(session): the retriever embeds queries with _session, so
+    # it is only shared between sessions with the same account, user and role.
+    # Re-checked against the table every 5 minutes; the vector index itself is persisted on disk
+    return load_local_retriever(_session, embedding_table, chunk_table, query_cache=get_query_cache(), kind=kind)
+
 st.title(":material/link: Day 21: RAG with Cortex Search")
 st.caption("30 Days of AI")
 st.write("Combine search results with LLM generation for grounded answers.")
@@ -276,8 +300,21 @@ try:
                 help="Full path to your Cortex Search service"
             )
 
-        num_chunks = st.slider("Context chunks:", 1, 10, 3,
-                               help="Number of relevant chunks to retrieve")
+        num_chunks = st.slider("Chunks sent to COMPLETE:", 1, 10, 3,
+                               help="Chunks packed into the prompt; fewer chunks make COMPLETE faster")
+        use_rerank = st.checkbox("Rerank candidates", value=True,
+                                 help="Retrieve a deeper candidate pool and keep the best chunks after a local rerank")
+        rerank_depth = st.slider("Candidates retrieved for reranking:", 5, 40, 3 * RERANK_OVERFETCH,
+                                 disabled=not use_rerank,
+                                 help="Search results the reranker chooses from; only the best "
+                                      "'Chunks sent to COMPLETE' of them reach the prompt")
+
+        retriever = st.radio("Retriever:", RETRIEVERS, index=0,
+                             help="Local options search the embeddings snapshot in-process")
+        if retriever != RETRIEVERS[0]:
+            embedding_table = st.text_input("Embeddings table:",
+                                            value=st.session_state.get("embeddings_table", DEFAULT_EMBEDDING_TABLE))
+            chunk_table = st.text_input("Chunks table:", value=DEFAULT_CHUNK_TABLE)
 
         model = st.selectbox(
             "LLM Model:",
@@ -286,6 +323,20 @@ try:
         )
 
         show_context = st.checkbox("Show retrieved context", value=True)
+        multi_query = st.checkbox("Split compound questions", value=True,
+                                  help="Search each part of a multi-part question in parallel and fuse the results")
+        pack_chunks = st.checkbox("Pack context to token budget", value=True,
+                                  help="Drop near-duplicate chunks, keep the sentences around the question's "
+                                       "terms and stop at the model's context budget")
+
+        with st.expander(":material/bolt: Precomputed answers"):
+            use_precomputed = st.checkbox("Serve precomputed answers", value=True,
+                                          help="Answer canonical questions instantly from answers computed ahead of time "
+                                               "with the default pipeline (Cortex Search retriever only)")
+            canonical_questions = [q.strip() for q in st.text_area(
+                "Canonical questions (one per line):",
+                value="Are the thermal gloves warm enough for winter?\nWhich products have durability issues?"
+            ).splitlines() if q.strip()]
 
     st.subheader(":material/help: Ask a Question")
 
@@ -295,81 +346,134 @@ try:
         placeholder="e.g., Which products have durability issues?"
     )
 
+    precomputed = None
+    if use_precomputed and retriever == RETRIEVERS[0] and search_service:
+        answer_store = shared_answer_store()
+        try:
+            precompute_search = lambda query, limit: cached_search(shared_search_cache(), session, search_service, query,
+                                                                   ["CHUNK_TEXT", "FILE_NAME"], limit)[0]
+            # Starts a background refresh for canonical questions that are missing or older than the data
+            data_version, stale = answer_store.ensure_fresh(
+                session, "day21", search_service, model, canonical_questions,
+                lambda q: rag_answer(session, precompute_search, q, model), services=[search_service])
+            precomputed = answer_store.lookup(session, "day21", search_service, model, question)
+            if answer_store.is_refreshing(session, "day21", search_service, model):
+                st.caption(f":material/sync: Precomputing {len(stale)} canonical answer(s) in the background")
+            refresh_error = answer_store.error(session, "day21", search_service, model)
+            if refresh_error:
+                st.caption(f":material/warning: Last background precompute failed: {refresh_error}")
+        except Exception as e:
+            st.caption(f":material/warning: Precomputed answers unavailable: {e}")
+
+    if precomputed:
+        with st.container(border=True):
+            st.markdown("**:material/bolt: Precomputed answer**")
+            st.markdown(precomputed["answer"])
+            freshness = ("up to date with the search service" if precomputed["version"] == data_version
+                         else "search service has refreshed, refreshing in the background")
+            st.caption(f"Computed {precomputed['computed_at']} · {freshness}")
+            if show_context:
+                for i, source in enumerate(precomputed["details"].get("sources", []), 1):
+                    with st.expander(f":material/description: Chunk {i} - {source['source']}"):
+                        st.write(source["text"])
+        st.caption("Search & Answer runs the full pipeline with the sidebar settings.")
+
     if st.button(":material/search: Search & Answer", type="primary"):
         if question and search_service:
-            with st.status("Processing...", expanded=True) as status:
+            status = st.status("Processing...", expanded=True)
+            # Filled from inside the status steps: sources once retrieval is done, then the streamed answer
+            answer_area = st.container()
+            context_area = st.container()
+            with status:
                 st.write(":material/search: **Step 1:** Searching documents...")
 
+                # The question itself is not logged; its hash still groups repeats
+                trace = Trace("rag_answer", page="Day 21", question_hash=text_hash(question)[:16],
+                              retriever=retriever, model=model)
                 try:
-                    from snowflake.core import Root
-
-                    root = Root(session)
-                    parts = search_service.split(".")
-
-                    if len(parts) != 3:
-                        st.error("Service path must be in format: database.schema.service_name")
-                        st.stop()
-
-                    svc = (
-                        root
-                        .databases[parts[0]]
-                        .schemas[parts[1]]
-                        .cortex_search_services[parts[2]]
-                    )
-
-                    search_results = svc.search(
-                        query=question,
-                        columns=["CHUNK_TEXT", "FILE_NAME"],
-                        limit=num_chunks
-                    )
-
-                    context_chunks = []
-                    sources = []
-                    for item in search_results.results:
-                        context_chunks.append(item.get("CHUNK_TEXT", ""))
-                        sources.append(item.get("FILE_NAME", "Unknown"))
+                    fetch = max(rerank_depth, num_chunks) if use_rerank else num_chunks
+                    queries = decompose_question(question) if multi_query else [question]
+                    if len(queries) > 1:
+                        st.write(f"   :material/call_split: Searching {len(queries)} sub-queries in parallel: "
+                                 + "; ".join(f"*{q}*" for q in queries[1:]))
+                    span = trace.start("retrieve", queries=len(queries), fetch=fetch)
+                    if retriever != RETRIEVERS[0]:
+                        local_retriever = get_local_retriever(session, connection_scope(session),
+                                                              embedding_table, chunk_table, kind=LOCAL_RETRIEVERS[retriever])
+                        result_lists = local_retriever.search_many(queries, limit=fetch)
+                        timings = local_retriever.last_timings
+                        st.write(f"   :material/bolt: Local index ({local_retriever.status}, {len(local_retriever):,} vectors): "
+                                 f"embed {timings['embed_ms']:.0f} ms, search {timings['search_ms'] + timings['keyword_ms']:.1f} ms")
+                        span.set(embed_ms=timings["embed_ms"], search_ms=timings["search_ms"] + timings["keyword_ms"])
+                    else:
+                        search_cache = shared_search_cache()
+                        hits_before = search_cache.hits
+                        result_lists = concurrent_search(
+                            lambda query, limit: cached_search(search_cache, session, search_service, query,
+                                                               ["CHUNK_TEXT", "FILE_NAME"], limit)[0],
+                            queries, fetch)
+                        span.set(cache_hits=search_cache.hits - hits_before)
+                        if search_cache.hits > hits_before:
+                            st.write(f"   :material/cached: {search_cache.hits - hits_before} of {len(queries)} "
+                                     f"searches served from cache (hit rate {search_cache.hit_rate:.0%})")
+                    search_results = fuse_results(result_lists, fetch)
+                    span.set(chunks=len(search_results))
+                    span.end()
+                    st.write(f"   :material/check_circle: Found {len(search_results)} relevant chunks")
+
+                    if use_rerank:
+                        span = trace.start("rerank", candidates=len(search_results))
+                        search_results = rerank(question, search_results, num_chunks)
+                        span.set(chunks=len(search_results))
+                        span.end()
+                        st.write(f"   :material/sort: Reranked to the top {len(search_results)}")
+
+                    chunks = [{"text": item.get("CHUNK_TEXT", ""), "source": item.get("FILE_NAME", "Unknown"),
+                               "score": item.get("RERANK_SCORE", item.get("SCORE"))} for item in search_results]
+
+                    with trace.span("pack", chunks=len(chunks), packed=pack_chunks) as span:
+                        if pack_chunks:
+                            packed = pack_context(question, chunks, context_budget(model))
+                            chunks = packed.passages
+                            span.set(budget=packed.budget, input_tokens=packed.input_tokens,
+                                     duplicates=packed.duplicates)
+                            st.write(f"   :material/compress: Packed {packed.summary()}")
+
+                        context_chunks = [c["text"] for c in chunks]
+                        sources = [c["source"] for c in chunks]
+                        context = CONTEXT_SEPARATOR.join(context_chunks)
+                        span.set(passages=len(context_chunks), tokens=count_tokens(context))
 
-                    context = "\n\n---\n\n".join(context_chunks)
+                    if show_context:
+                        with context_area:
+                            st.subheader(":material/library_books: Retrieved Context")
+                            st.caption(f"Used {len(context_chunks)} chunks from customer reviews")
+                            for i, (chunk, source) in enumerate(zip(context_chunks, sources), 1):
+                                with st.expander(f":material/description: Chunk {i} - {source}"):
+                                    st.write(chunk)
 
-                    st.write(f"   :material/check_circle: Found {len(context_chunks)} relevant chunks")
                     st.write(":material/smart_toy: **Step 2:** Generating answer...")
 
-                    rag_prompt = f"""You are a helpful assistant. Answer the user's question based ONLY on the provided context.
-If the context doesn't contain enough information to answer, say "I don't have enough information to answer that based on the available documents."
-
-CONTEXT FROM DOCUMENTS:
-{context}
-
-USER QUESTION: {question}
-
-Provide a clear, accurate answer based on the context. If you use information from the context, mention it naturally."""
-
-                    response_sql = f"""
-                    SELECT SNOWFLAKE.CORTEX.COMPLETE(
-                        '{model}',
-                        '{rag_prompt.replace("'", "''")}'
-                    ) as response
-                    """
-
-                    response = session.sql(response_sql).collect()[0][0]
-
-                    st.write("   :material/check_circle: Answer generated")
+                    rag_prompt = RAG_PROMPT.format(context=context, question=question)
+
+                    span = trace.start("generate", prompt_tokens=count_tokens(rag_prompt))
+                    with answer_area:
+                        st.divider()
+                        st.subheader(":material/lightbulb: Answer")
+                        with st.container(border=True):
+                            stream = stream_complete(session, model, rag_prompt)
+                            response = st.write_stream(stream)
+                    span.set(first_token_ms=stream.first_token_ms, answer_tokens=count_tokens(str(response)))
+                    span.end()
+                    append_trace(trace, trace_log(connection_scope(session)))
+
+                    st.write(f"   :material/check_circle: Answer generated ({stream.summary()})")
+                    st.write(f"   :material/timer: {trace.summary()}")
                     status.update(label="Complete!", state="complete", expanded=True)
 
-                    st.divider()
-
-                    st.subheader(":material/lightbulb: Answer")
-                    with st.container(border=True):
-                        st.markdown(response)
-
-                    if show_context:
-                        st.subheader(":material/library_books: Retrieved Context")
-                        st.caption(f"Used {len(context_chunks)} chunks from customer reviews")
-                        for i, (chunk, source) in enumerate(zip(context_chunks, sources), 1):
-                            with st.expander(f":material/description: Chunk {i} - {source}"):
-                                st.write(chunk)
-
                 except Exception as e:
+                    trace.attributes["error"] = str(e)
+                    append_trace(trace, trace_log(connection_scope(session)))
                     status.update(label="Error", state="error")
                     st.error(f"Error: {str(e)}")
                     st.info(":material/lightbulb: **Troubleshooting:**\n- Make sure the search service exists (check Day 19)\n- Verify the service has finished indexing\n- Check your permissions")
@@ -377,6 +481,29 @@ Provide a clear, accurate answer based on the context. If you use information fr
             st.warning(":material/warning: Please enter a question and configure a search service.")
             st.info(":material/lightbulb: **Need a search service?**\n- Complete Day 19 to create `CUSTOMER_REVIEW_SEARCH`\n- The service will automatically appear in the dropdown above")
 
+    with st.expander(":material/monitoring: Pipeline traces"):
+        # Only traces recorded under this connection's account, user and role
+        trace_path = trace_log(connection_scope(session))
+        traces = load_traces(trace_path, limit=500)
+        if traces:
+            st.caption(f"Last {len(traces)} questions on this connection, logged to `{trace_path}`")
+            st.dataframe([{"stage": stage, **stats} for stage, stats in stage_percentiles(traces).items()],
+                         use_container_width=True)
+            st.markdown("**Latest trace**")
+            st.dataframe([{"stage": span["name"], "ms": span["duration_ms"], **span["attributes"]}
+                          for span in traces[-1]["spans"]], use_container_width=True)
+            col1, col2 = st.columns(2)
+            with col1:
+                st.download_button(":material/download: Traces (JSONL)",
+                                   "".join(json.dumps(t) + "\n" for t in traces),
+                                   file_name="rag_traces.jsonl", mime="application/jsonl")
+            with col2:
+                st.download_button(":material/download: Traces (OTLP JSON)",
+                                   "".join(json.dumps(to_otlp(t)) + "\n" for t in traces),
+                                   file_name="rag_traces.otlp.jsonl", mime="application/jsonl")
+        else:
+            st.caption("No traces yet - ask a question to record one.")
+
     st.markdown("---")
 
     with st.expander(":material/info: See the explanation"):
@@ -537,9 +664,22 @@ if "custom_session" in st.session_state:
                 key="custom_service_input"
             )
 
-        num_chunks = st.slider("Context chunks:", 1, 10, 3,
-                               help="Number of relevant chunks to retrieve",
+        num_chunks = st.slider("Chunks sent to COMPLETE:", 1, 10, 3,
+                               help="Chunks packed into the prompt; fewer chunks make COMPLETE faster",
                                key="custom_num_chunks")
+        use_rerank = st.checkbox("Rerank candidates", value=True, key="custom_rerank",
+                                 help="Retrieve a deeper candidate pool and keep the best chunks after a local rerank")
+        rerank_depth = st.slider("Candidates retrieved for reranking:", 5, 40, 3 * RERANK_OVERFETCH,
+                                 disabled=not use_rerank, key="custom_rerank_depth",
+                                 help="Search results the reranker chooses from; only the best "
+                                      "'Chunks sent to COMPLETE' of them reach the prompt")
+
+        retriever = st.radio("Retriever:", RETRIEVERS, index=0, key="custom_retriever",
+                             help="Local options search the embeddings snapshot in-process")
+        if retriever != RETRIEVERS[0]:
+            embedding_table = st.text_input("Embeddings table:",
+                                            value=st.session_state.get("embeddings_table", DEFAULT_EMBEDDING_TABLE), key="custom_embedding_table")
+            chunk_table = st.text_input("Chunks table:", value=DEFAULT_CHUNK_TABLE, key="custom_chunk_table")
 
         model = st.selectbox(
             "LLM Model:",
@@ -549,6 +689,21 @@ if "custom_session" in st.session_state:
         )
 
         show_context = st.checkbox("Show retrieved context", value=True, key="custom_show_context")
+        multi_query = st.checkbox("Split compound questions", value=True, key="custom_multi_query",
+                                  help="Search each part of a multi-part question in parallel and fuse the results")
+        pack_chunks = st.checkbox("Pack context to token budget", value=True, key="custom_pack_chunks",
+                                  help="Drop near-duplicate chunks, keep the sentences around the question's "
+                                       "terms and stop at the model's context budget")
+
+        with st.expander(":material/bolt: Precomputed answers"):
+            use_precomputed = st.checkbox("Serve precomputed answers", value=True, key="custom_use_precomputed",
+                                          help="Answer canonical questions instantly from answers computed ahead of time "
+                                               "with the default pipeline (Cortex Search retriever only)")
+            canonical_questions = [q.strip() for q in st.text_area(
+                "Canonical questions (one per line):",
+                value="Are the thermal gloves warm enough for winter?\nWhich products have durability issues?",
+                key="custom_canonical_questions"
+            ).splitlines() if q.strip()]
 
     st.subheader(":material/help: Ask a Question")
 
@@ -559,81 +714,136 @@ if "custom_session" in st.session_state:
         key="custom_question"
     )
 
+    precomputed = None
+    if use_precomputed and retriever == RETRIEVERS[0] and search_service:
+        answer_store = shared_answer_store()
+        try:
+            precompute_search = lambda query, limit: cached_search(shared_search_cache(), session, search_service, query,
+                                                                   ["CHUNK_TEXT", "FILE_NAME"], limit,
+                                                                   scope=connection_scope(session, custom=True))[0]
+            # Starts a background refresh for canonical questions that are missing or older than the data
+            data_version, stale = answer_store.ensure_fresh(
+                session, "day21", search_service, model, canonical_questions,
+                lambda q: rag_answer(session, precompute_search, q, model), services=[search_service])
+            precomputed = answer_store.lookup(session, "day21", search_service, model, question)
+            if answer_store.is_refreshing(session, "day21", search_service, model):
+                st.caption(f":material/sync: Precomputing {len(stale)} canonical answer(s) in the background")
+            refresh_error = answer_store.error(session, "day21", search_service, model)
+            if refresh_error:
+                st.caption(f":material/warning: Last background precompute failed: {refresh_error}")
+        except Exception as e:
+            st.caption(f":material/warning: Precomputed answers unavailable: {e}")
+
+    if precomputed:
+        with st.container(border=True):
+            st.markdown("**:material/bolt: Precomputed answer**")
+            st.markdown(precomputed["answer"])
+            freshness = ("up to date with the search service" if precomputed["version"] == data_version
+                         else "search service has refreshed, refreshing in the background")
+            st.caption(f"Computed {precomputed['computed_at']} · {freshness}")
+            if show_context:
+                for i, source in enumerate(precomputed["details"].get("sources", []), 1):
+                    with st.expander(f":material/description: Chunk {i} - {source['source']}"):
+                        st.write(source["text"])
+        st.caption("Search & Answer runs the full pipeline with the sidebar settings.")
+
     if st.button(":material/search: Search & Answer", type="primary", key="custom_search"):
         if question and search_service:
-            with st.status("Processing...", expanded=True) as status:
+            status = st.status("Processing...", expanded=True)
+            # Filled from inside the status steps: sources once retrieval is done, then the streamed answer
+            answer_area = st.container()
+            context_area = st.container()
+            with status:
                 st.write(":material/search: **Step 1:** Searching documents...")
 
+                # The question itself is not logged; its hash still groups repeats
+                trace = Trace("rag_answer", page="Day 21", question_hash=text_hash(question)[:16],
+                              retriever=retriever, model=model)
                 try:
-                    from snowflake.core import Root
-
-                    root = Root(session)
-                    parts = search_service.split(".")
+                    fetch = max(rerank_depth, num_chunks) if use_rerank else num_chunks
+                    queries = decompose_question(question) if multi_query else [question]
+                    if len(queries) > 1:
+                        st.write(f"   :material/call_split: Searching {len(queries)} sub-queries in parallel: "
+                                 + "; ".join(f"*{q}*" for q in queries[1:]))
+                    span = trace.start("retrieve", queries=len(queries), fetch=fetch)
+                    if retriever != RETRIEVERS[0]:
+                        local_retriever = get_local_retriever(session, connection_scope(session, custom=True),
+                                                              embedding_table, chunk_table, kind=LOCAL_RETRIEVERS[retriever])
+                        result_lists = local_retriever.search_many(queries, limit=fetch)
+                        timings = local_retriever.last_timings
+                        st.write(f"   :material/bolt: Local index ({local_retriever.status}, {len(local_retriever):,} vectors): "
+                                 f"embed {timings['embed_ms']:.0f} ms, search {timings['search_ms'] + timings['keyword_ms']:.1f} ms")
+                        span.set(embed_ms=timings["embed_ms"], search_ms=timings["search_ms"] + timings["keyword_ms"])
+                    else:
+                        search_cache = shared_search_cache()
+                        hits_before = search_cache.hits
+                        result_lists = concurrent_search(
+                            lambda query, limit: cached_search(search_cache, session, search_service, query,
+                                                               ["CHUNK_TEXT", "FILE_NAME"], limit,
+                                                               scope=connection_scope(session, custom=True))[0],
+                            queries, fetch)
+                        span.set(cache_hits=search_cache.hits - hits_before)
+                        if search_cache.hits > hits_before:
+                            st.write(f"   :material/cached: {search_cache.hits - hits_before} of {len(queries)} "
+                                     f"searches served from cache (hit rate {search_cache.hit_rate:.0%})")
+                    search_results = fuse_results(result_lists, fetch)
+                    span.set(chunks=len(search_results))
+                    span.end()
+                    st.write(f"   :material/check_circle: Found {len(search_results)} relevant chunks")
+
+                    if use_rerank:
+                        span = trace.start("rerank", candidates=len(search_results))
+                        search_results = rerank(question, search_results, num_chunks)
+                        span.set(chunks=len(search_results))
+                        span.end()
+                        st.write(f"   :material/sort: Reranked to the top {len(search_results)}")
+
+                    chunks = [{"text": item.get("CHUNK_TEXT", ""), "source": item.get("FILE_NAME", "Unknown"),
+                               "score": item.get("RERANK_SCORE", item.get("SCORE"))} for item in search_results]
+
+                    with trace.span("pack", chunks=len(chunks), packed=pack_chunks) as span:
+                        if pack_chunks:
+                            packed = pack_context(question, chunks, context_budget(model))
+                            chunks = packed.passages
+                            span.set(budget=packed.budget, input_tokens=packed.input_tokens,
+                                     duplicates=packed.duplicates)
+                            st.write(f"   :material/compress: Packed {packed.summary()}")
+
+                        context_chunks = [c["text"] for c in chunks]
+                        sources = [c["source"] for c in chunks]
+                        context = CONTEXT_SEPARATOR.join(context_chunks)
+                        span.set(passages=len(context_chunks), tokens=count_tokens(context))
 
-                    if len(parts) != 3:
-                        st.error("Service path must be in format: database.schema.service_name")
-                        st.stop()
-
-                    svc = (
-                        root
-                        .databases[parts[0]]
-                        .schemas[parts[1]]
-                        .cortex_search_services[parts[2]]
-                    )
-
-                    search_results = svc.search(
-                        query=question,
-                        columns=["CHUNK_TEXT", "FILE_NAME"],
-                        limit=num_chunks
-                    )
-
-                    context_chunks = []
-                    sources = []
-                    for item in search_results.results:
-                        context_chunks.append(item.get("CHUNK_TEXT", ""))
-                        sources.append(item.get("FILE_NAME", "Unknown"))
-
-                    context = "\n\n---\n\n".join(context_chunks)
+                    if show_context:
+                        with context_area:
+                            st.subheader(":material/library_books: Retrieved Context")
+                            st.caption(f"Used {len(context_chunks)} chunks from customer reviews")
+                            for i, (chunk, source) in enumerate(zip(context_chunks, sources), 1):
+                                with st.expander(f":material/description: Chunk {i} - {source}"):
+                                    st.write(chunk)
 
-                    st.write(f"   :material/check_circle: Found {len(context_chunks)} relevant chunks")
                     st.write(":material/smart_toy: **Step 2:** Generating answer...")
 
-                    rag_prompt = f"""You are a helpful assistant. Answer the user's question based ONLY on the provided context.
-If the context doesn't contain enough information to answer, say "I don't have enough information to answer that based on the available documents."
-
-CONTEXT FROM DOCUMENTS:
-{context}
-
-USER QUESTION: {question}
-
-Provide a clear, accurate answer based on the context. If you use information from the context, mention it naturally."""
-
-                    response_sql = f"""
-                    SELECT SNOWFLAKE.CORTEX.COMPLETE(
-                        '{model}',
-                        '{rag_prompt.replace("'", "''")}'
-                    ) as response
-                    """
-
-                    response = session.sql(response_sql).collect()[0][0]
-
-                    st.write("   :material/check_circle: Answer generated")
+                    rag_prompt = RAG_PROMPT.format(context=context, question=question)
+
+                    span = trace.start("generate", prompt_tokens=count_tokens(rag_prompt))
+                    with answer_area:
+                        st.divider()
+                        st.subheader(":material/lightbulb: Answer")
+                        with st.container(border=True):
+                            stream = stream_complete(session, model, rag_prompt)
+                            response = st.write_stream(stream)
+                    span.set(first_token_ms=stream.first_token_ms, answer_tokens=count_tokens(str(response)))
+                    span.end()
+                    append_trace(trace, trace_log(connection_scope(session, custom=True)))
+
+                    st.write(f"   :material/check_circle: Answer generated ({stream.summary()})")
+                    st.write(f"   :material/timer: {trace.summary()}")
                     status.update(label="Complete!", state="complete", expanded=True)
 
-                    st.divider()
-
-                    st.subheader(":material/lightbulb: Answer")
-                    with st.container(border=True):
-                        st.markdown(response)
-
-                    if show_context:
-                        st.subheader(":material/library_books: Retrieved Context")
-                        st.caption(f"Used {len(context_chunks)} chunks from customer reviews")
-                        for i, (chunk, source) in enumerate(zip(context_chunks, sources), 1):
-                            with st.expander(f":material/description: Chunk {i} - {source}"):
-                                st.write(chunk)
-
                 except Exception as e:
+                    trace.attributes["error"] = str(e)
+                    append_trace(trace, trace_log(connection_scope(session, custom=True)))
                     status.update(label="Error", state="error")
                     st.error(f"Error: {str(e)}")
                     st.info(":material/lightbulb: **Troubleshooting:**\n- Make sure the search service exists (check Day 19)\n- Verify the service has finished indexing\n- Check your permissions")
@@ -641,6 +851,29 @@ Provide a clear, accurate answer based on the context. If you use information fr
             st.warning(":material/warning: Please enter a question and configure a search service.")
             st.info(":material/lightbulb: **Need a search service?**\n- Complete Day 19 to create `CUSTOMER_REVIEW_SEARCH`\n- The service will automatically appear in the dropdown above")
 
+    with st.expander(":material/monitoring: Pipeline traces"):
+        # Only traces recorded under this connection's account, user and role
+        trace_path = trace_log(connection_scope(session, custom=True))
+        traces = load_traces(trace_path, limit=500)
+        if traces:
+            st.caption(f"Last {len(traces)} questions on this connection, logged to `{trace_path}`")
+            st.dataframe([{"stage": stage, **stats} for stage, stats in stage_percentiles(traces).items()],
+                         use_container_width=True)
+            st.markdown("**Latest trace**")
+            st.dataframe([{"stage": span["name"], "ms": span["duration_ms"], **span["attributes"]}
+                          for span in traces[-1]["spans"]], use_container_width=True)
+            col1, col2 = st.columns(2)
+            with col1:
+                st.download_button(":material/download: Traces (JSONL)",
+                                   "".join(json.dumps(t) + "\n" for t in traces),
+                                   file_name="rag_traces.jsonl", mime="application/jsonl", key="custom_traces_jsonl")
+            with col2:
+                st.download_button(":material/download: Traces (OTLP JSON)",
+                                   "".join(json.dumps(to_otlp(t)) + "\n" for t in traces),
+                                   file_name="rag_traces.otlp.jsonl", mime="application/jsonl", key="custom_traces_otlp")
+        else:
+            st.caption("No traces yet - ask a question to record one.")
+
 # Footer
 st.divider()
 st.caption("Day 21: RAG with Cortex Search | 30 Days of AI")
@@ -1,8 +1,28 @@
 import streamlit as st
 from snowflake.snowpark.context import get_active_session
+from rag_utils.context import context_budget, pack_context
+from rag_utils.conversation import ConversationMemory, query_embedder
+from rag_utils.embedding_cache import EmbeddingCache
+from rag_utils.generation import stream_complete
+from rag_utils.retrieval import (DEFAULT_CHUNK_TABLE, DEFAULT_EMBEDDING_TABLE, LOCAL_RETRIEVERS, RETRIEVERS,
+                                 concurrent_search, connection_scope, decompose_question, fuse_results,
+                                 load_local_retriever)
+from rag_utils.search_cache import cached_search, shared_search_cache
 
 st.set_page_config(page_title="Day 22 - Chat with Your Documents", page_icon="2️⃣2️⃣", layout="wide")
 
+@st.cache_resource
+def get_query_cache():
+    # Question embeddings, shared across reruns and sessions
+    return EmbeddingCache(max_entries=10000)
+
+@st.cache_resource(ttl=300, max_entries=16, show_spinner="Loading local vector index...")
+def get_local_retriever(_session, scope, embedding_table, chunk_table, kind="ivf"):
+    # Keyed on connection_scope(session): the retriever embeds queries with _session, so
+    # it is only shared between sessions with the same account, user and role.
+    # Re-checked against the table every 5 minutes; the vector index itself is persisted on disk
+    return load_local_retriever(_session, embedding_table, chunk_table, query_cache=get_query_cache(), kind=kind)
+
 st.title(":material/chat: Day 22: Chat with Your Documents")
 st.caption("30 Days of AI")
 st.write("A conversational RAG chatbot powered by Cortex Search.")
@@ -158,6 +178,9 @@ try:
 
     if "doc_messages" not in st.session_state:
         st.session_state.doc_messages = []
+    if "doc_memory" not in st.session_state:
+        st.session_state.doc_memory = ConversationMemory()
+    memory = st.session_state.doc_memory
 
     with st.sidebar:
         st.header(":material/settings: Settings")
@@ -207,27 +230,60 @@ try:
 
         num_chunks = st.slider("Context chunks:", 1, 5, 3,
                                help="Number of relevant chunks to retrieve per question")
+        multi_query = st.checkbox("Split compound questions", value=True,
+                                  help="Search each part of a multi-part question in parallel and fuse the results")
+        reuse_evidence = st.checkbox("Reuse evidence for follow-ups", value=True,
+                                     help="Answer follow-ups from chunks retrieved earlier in the chat when they "
+                                          "already cover the question; otherwise search with the earlier subject. "
+                                          "Comparing questions embeds each new one (cached): free with a local "
+                                          "retriever, one extra EMBED_TEXT_768 call per turn with Cortex Search")
+
+        retriever = st.radio("Retriever:", RETRIEVERS, index=0,
+                             help="Local options search the embeddings snapshot in-process")
+        if retriever != RETRIEVERS[0]:
+            embedding_table = st.text_input("Embeddings table:",
+                                            value=st.session_state.get("embeddings_table", DEFAULT_EMBEDDING_TABLE))
+            chunk_table = st.text_input("Chunks table:", value=DEFAULT_CHUNK_TABLE)
+
+        # Evidence from another service or retriever can't answer follow-ups here
+        evidence_source = (search_service, retriever,
+                           *((embedding_table, chunk_table) if retriever != RETRIEVERS[0] else ()))
+        if memory.bind(evidence_source):
+            st.caption(":material/restart_alt: Search source changed, earlier evidence cleared")
 
         st.divider()
 
         if st.button(":material/delete: Clear Chat", use_container_width=True):
             st.session_state.doc_messages = []
+            memory.clear()
             st.rerun()
 
+        search_cache = shared_search_cache()
+        st.caption(f":material/cached: Search cache: {search_cache.hits} hits / {search_cache.misses} misses "
+                   f"({search_cache.hit_rate:.0%})")
+        st.caption(f":material/history: This chat: {memory.searches} searches, "
+                   f"{memory.reuses} answers from earlier evidence")
+
     def search_documents(query, service_path, limit):
-        from snowflake.core import Root
-        root = Root(session)
-        parts = service_path.split(".")
-        if len(parts) != 3:
-            raise ValueError("Service path must be in format: database.schema.service_name")
-        svc = root.databases[parts[0]].schemas[parts[1]].cortex_search_services[parts[2]]
-        results = svc.search(query=query, columns=["CHUNK_TEXT", "FILE_NAME"], limit=limit)
+        # Each part of a compound question is searched in parallel, then fused
+        queries = decompose_question(query) if multi_query else [query]
+        if retriever != RETRIEVERS[0]:
+            local_retriever = get_local_retriever(session, connection_scope(session),
+                                                  embedding_table, chunk_table, kind=LOCAL_RETRIEVERS[retriever])
+            result_lists = local_retriever.search_many(queries, limit=limit)
+        else:
+            result_lists = concurrent_search(
+                lambda q, n: cached_search(shared_search_cache(), session, service_path, q,
+                                           ["CHUNK_TEXT", "FILE_NAME"], n)[0],
+                queries, limit)
+        results = fuse_results(result_lists, limit)
 
         chunks_data = []
-        for item in results.results:
+        for item in results:
             chunks_data.append({
                 "text": item.get("CHUNK_TEXT", ""),
-                "source": item.get("FILE_NAME", "Unknown")
+                "source": item.get("FILE_NAME", "Unknown"),
+                "score": item.get("SCORE")
             })
         return chunks_data
 
@@ -247,11 +303,29 @@ try:
 
             with st.chat_message("assistant"):
                 try:
-                    with st.spinner("Searching and thinking..."):
-                        chunks_data = search_documents(prompt, search_service, num_chunks)
-                        context = "\n\n---\n\n".join([c["text"] for c in chunks_data])
+                    with st.spinner("Searching reviews..."):
+                        if reuse_evidence:
+                            chunks_data, decision = memory.retrieve(
+                                prompt, lambda query, limit: search_documents(query, search_service, limit), num_chunks,
+                                embed=query_embedder(session, get_query_cache()))
+                        else:
+                            chunks_data, decision = search_documents(prompt, search_service, num_chunks), None
+                        packed = pack_context(prompt, chunks_data, context_budget("claude-3-5-sonnet"))
+                        chunks_data = packed.passages
+                        context = packed.text
+
+                    # Sources are shown before generation starts
+                    with st.expander(f":material/library_books: Sources ({len(chunks_data)} reviews used)"):
+                        st.caption(f":material/compress: Context packed: {packed.summary()}")
+                        if decision and decision["action"] == "reuse":
+                            st.caption(":material/history: Answered from earlier turns' evidence, no new search")
+                        elif decision and decision["action"] == "rewrite":
+                            st.caption(f":material/edit: Follow-up searched as: {decision['query']}")
+                        for i, chunk_info in enumerate(chunks_data, 1):
+                            st.caption(f"**[{i}] {chunk_info['source']}**")
+                            st.write(chunk_info["text"][:200] + "..." if len(chunk_info["text"]) > 200 else chunk_info["text"])
 
-                        rag_prompt = f"""You are a customer review analysis assistant. Your role is to ONLY answer questions about customer reviews and feedback.
+                    rag_prompt = f"""You are a customer review analysis assistant. Your role is to ONLY answer questions about customer reviews and feedback.
 
 STRICT GUIDELINES:
 1. ONLY use information from the provided customer review context below
@@ -267,15 +341,9 @@ USER QUESTION: {prompt}
 
 Provide a clear, helpful answer based ONLY on the customer reviews above. If you cite information, mention it naturally."""
 
-                        sql = f"SELECT SNOWFLAKE.CORTEX.COMPLETE('claude-3-5-sonnet', '{rag_prompt.replace("'", "''")}')"
-                        response = session.sql(sql).collect()[0][0]
-
-                    st.markdown(response)
-
-                    with st.expander(f":material/library_books: Sources ({len(chunks_data)} reviews used)"):
-                        for i, chunk_info in enumerate(chunks_data, 1):
-                            st.caption(f"**[{i}] {chunk_info['source']}**")
-                            st.write(chunk_info["text"][:200] + "..." if len(chunk_info["text"]) > 200 else chunk_info["text"])
+                    stream = stream_complete(session, "claude-3-5-sonnet", rag_prompt)
+                    response = st.write_stream(stream)
+                    st.caption(f":material/timer: {stream.summary()}")
 
                     st.session_state.doc_messages.append({"role": "assistant", "content": response})
 
@@ -384,6 +452,9 @@ if "custom_session" in st.session_state:
 
     if "custom_doc_messages" not in st.session_state:
         st.session_state.custom_doc_messages = []
+    if "custom_doc_memory" not in st.session_state:
+        st.session_state.custom_doc_memory = ConversationMemory()
+    memory = st.session_state.custom_doc_memory
 
     with st.sidebar:
         st.header(":material/settings: Custom Settings")
@@ -434,27 +505,61 @@ if "custom_session" in st.session_state:
         num_chunks = st.slider("Context chunks:", 1, 5, 3,
                                help="Number of relevant chunks to retrieve per question",
                                key="custom_num_chunks")
+        multi_query = st.checkbox("Split compound questions", value=True, key="custom_multi_query",
+                                  help="Search each part of a multi-part question in parallel and fuse the results")
+        reuse_evidence = st.checkbox("Reuse evidence for follow-ups", value=True, key="custom_reuse_evidence",
+                                     help="Answer follow-ups from chunks retrieved earlier in the chat when they "
+                                          "already cover the question; otherwise search with the earlier subject. "
+                                          "Comparing questions embeds each new one (cached): free with a local "
+                                          "retriever, one extra EMBED_TEXT_768 call per turn with Cortex Search")
+
+        retriever = st.radio("Retriever:", RETRIEVERS, index=0, key="custom_retriever",
+                             help="Local options search the embeddings snapshot in-process")
+        if retriever != RETRIEVERS[0]:
+            embedding_table = st.text_input("Embeddings table:",
+                                            value=st.session_state.get("embeddings_table", DEFAULT_EMBEDDING_TABLE), key="custom_embedding_table")
+            chunk_table = st.text_input("Chunks table:", value=DEFAULT_CHUNK_TABLE, key="custom_chunk_table")
+
+        # Evidence from another service or retriever can't answer follow-ups here
+        evidence_source = (search_service, retriever,
+                           *((embedding_table, chunk_table) if retriever != RETRIEVERS[0] else ()))
+        if memory.bind(evidence_source):
+            st.caption(":material/restart_alt: Search source changed, earlier evidence cleared")
 
         st.divider()
 
         if st.button(":material/delete: Clear Chat", use_container_width=True, key="custom_clear"):
             st.session_state.custom_doc_messages = []
+            memory.clear()
             st.rerun()
 
+        search_cache = shared_search_cache()
+        st.caption(f":material/cached: Search cache: {search_cache.hits} hits / {search_cache.misses} misses "
+                   f"({search_cache.hit_rate:.0%})")
+        st.caption(f":material/history: This chat: {memory.searches} searches, "
+                   f"{memory.reuses} answers from earlier evidence")
+
     def search_documents_custom(query, service_path, limit):
-        from snowflake.core import Root
-        root = Root(session)
-        parts = service_path.split(".")
-        if len(parts) != 3:
-            raise ValueError("Service path must be in format: database.schema.service_name")
-        svc = root.databases[parts[0]].schemas[parts[1]].cortex_search_services[parts[2]]
-        results = svc.search(query=query, columns=["CHUNK_TEXT", "FILE_NAME"], limit=limit)
+        # Each part of a compound question is searched in parallel, then fused
+        queries = decompose_question(query) if multi_query else [query]
+        if retriever != RETRIEVERS[0]:
+            local_retriever = get_local_retriever(session, connection_scope(session, custom=True),
+                                                  embedding_table, chunk_table, kind=LOCAL_RETRIEVERS[retriever])
+            result_lists = local_retriever.search_many(queries, limit=limit)
+        else:
+            result_lists = concurrent_search(
+                lambda q, n: cached_search(shared_search_cache(), session, service_path, q,
+                                           ["CHUNK_TEXT", "FILE_NAME"], n,
+                                           scope=connection_scope(session, custom=True))[0],
+                queries, limit)
+        results = fuse_results(result_lists, limit)
 
         chunks_data = []
-        for item in results.results:
+        for item in results:
             chunks_data.append({
                 "text": item.get("CHUNK_TEXT", ""),
-                "source": item.get("FILE_NAME", "Unknown")
+                "source": item.get("FILE_NAME", "Unknown"),
+                "score": item.get("SCORE")
             })
         return chunks_data
 
@@ -473,11 +578,29 @@ if "custom_session" in st.session_state:
 
             with st.chat_message("assistant"):
                 try:
-                    with st.spinner("Searching and thinking..."):
-                        chunks_data = search_documents_custom(prompt, search_service, num_chunks)
-                        context = "\n\n---\n\n".join([c["text"] for c in chunks_data])
+                    with st.spinner("Searching reviews..."):
+                        if reuse_evidence:
+                            chunks_data, decision = memory.retrieve(
+                                prompt, lambda query, limit: search_documents_custom(query, search_service, limit), num_chunks,
+                                embed=query_embedder(session, get_query_cache()))
+                        else:
+                            chunks_data, decision = search_documents_custom(prompt, search_service, num_chunks), None
+                        packed = pack_context(prompt, chunks_data, context_budget("claude-3-5-sonnet"))
+                        chunks_data = packed.passages
+                        context = packed.text
+
+                    # Sources are shown before generation starts
+                    with st.expander(f":material/library_books: Sources ({len(chunks_data)} reviews used)"):
+                        st.caption(f":material/compress: Context packed: {packed.summary()}")
+                        if decision and decision["action"] == "reuse":
+                            st.caption(":material/history: Answered from earlier turns' evidence, no new search")
+                        elif decision and decision["action"] == "rewrite":
+                            st.caption(f":material/edit: Follow-up searched as: {decision['query']}")
+                        for i, chunk_info in enumerate(chunks_data, 1):
+                            st.caption(f"**[{i}] {chunk_info['source']}**")
+                            st.write(chunk_info["text"][:200] + "..." if len(chunk_info["text"]) > 200 else chunk_info["text"])
 
-                        rag_prompt = f"""You are a customer review analysis assistant. Your role is to ONLY answer questions about customer reviews and feedback.
+                    rag_prompt = f"""You are a customer review analysis assistant. Your role is to ONLY answer questions about customer reviews and feedback.
 
 STRICT GUIDELINES:
 1. ONLY use information from the provided customer review context below
@@ -493,15 +616,9 @@ USER QUESTION: {prompt}
 
 Provide a clear, helpful answer based ONLY on the customer reviews above. If you cite information, mention it naturally."""
 
-                        sql = f"SELECT SNOWFLAKE.CORTEX.COMPLETE('claude-3-5-sonnet', '{rag_prompt.replace("'", "''")}')"
-                        response = session.sql(sql).collect()[0][0]
-
-                    st.markdown(response)
-
-                    with st.expander(f":material/library_books: Sources ({len(chunks_data)} reviews used)"):
-                        for i, chunk_info in enumerate(chunks_data, 1):
-                            st.caption(f"**[{i}] {chunk_info['source']}**")
-                            st.write(chunk_info["text"][:200] + "..." if len(chunk_info["text"]) > 200 else chunk_info["text"])
+                    stream = stream_complete(session, "claude-3-5-sonnet", rag_prompt)
+                    response = st.write_stream(stream)
+                    st.caption(f":material/timer: {stream.summary()}")
 
                     st.session_state.custom_doc_messages.append({"role": "assistant", "content": response})
 
@@ -1,8 +1,24 @@
 import streamlit as st
 from snowflake.snowpark.context import get_active_session
+from rag_utils.embedding_cache import EmbeddingCache
+from rag_utils.precompute import shared_answer_store
+from rag_utils.retrieval import (DEFAULT_CHUNK_TABLE, DEFAULT_EMBEDDING_TABLE, LOCAL_RETRIEVERS, RETRIEVERS,
+                                 connection_scope, cortex_search, load_local_retriever)
 
 st.set_page_config(page_title="Day 23 - LLM Evaluation & AI Observability", page_icon="2️⃣3️⃣", layout="wide")
 
+@st.cache_resource
+def get_query_cache():
+    # Question embeddings, shared across reruns and sessions
+    return EmbeddingCache(max_entries=10000)
+
+@st.cache_resource(ttl=300, max_entries=16, show_spinner="Loading local vector index...")
+def get_local_retriever(_session, scope, embedding_table, chunk_table, kind="ivf"):
+    # Keyed on connection_scope(session): the retriever embeds queries with _session, so
+    # it is only shared between sessions with the same account, user and role.
+    # Re-checked against the table every 5 minutes; the vector index itself is persisted on disk
+    return load_local_retriever(_session, embedding_table, chunk_table, query_cache=get_query_cache(), kind=kind)
+
 st.title(":material/analytics: Day 23: LLM Evaluation & AI Observability")
 st.caption("30 Days of AI")
 st.write("Evaluate your RAG application quality using TruLens and Snowflake AI Observability.")
@@ -303,11 +319,19 @@ try:
         st.header(":material/settings: Configuration")
 
         with st.expander("Search Service", expanded=True):
-            search_service = st.text_input(
-                "Cortex Search Service:",
-                value="RAG_DB.RAG_SCHEMA.CUSTOMER_REVIEW_SEARCH",
-                help="Format: database.schema.service_name (created in Day 19)"
-            )
+            retriever = st.radio("Retriever:", RETRIEVERS, index=0,
+                                 help="Local options retrieve context for all questions in one batched search")
+            if retriever == RETRIEVERS[0]:
+                search_service = st.text_input(
+                    "Cortex Search Service:",
+                    value="RAG_DB.RAG_SCHEMA.CUSTOMER_REVIEW_SEARCH",
+                    help="Format: database.schema.service_name (created in Day 19)"
+                )
+            else:
+                search_service = None
+                embedding_table = st.text_input("Embeddings table:",
+                                                value=st.session_state.get("embeddings_table", DEFAULT_EMBEDDING_TABLE))
+                chunk_table = st.text_input("Chunks table:", value=DEFAULT_CHUNK_TABLE)
 
         with st.expander("Location", expanded=False):
             obs_database = st.text_input("Database:", value="RAG_DB")
@@ -378,6 +402,14 @@ CREATE STAGE {full_stage_name}
                 height=150
             )
 
+            use_precomputed = st.checkbox(
+                "Reuse precomputed answers", value=False,
+                help="Serve answers stored for this retriever, model and result count while the review data is "
+                     "unchanged; newly generated answers are always stored. Reused answers skip retrieval and "
+                     "generation, so their latency and cost are not real measurements: the run is recorded under "
+                     "a separate app version ending in _precomputed"
+            )
+
             run_evaluation = st.button(":material/science: Run TruLens Evaluation", type="primary")
 
         if run_evaluation:
@@ -399,24 +431,43 @@ CREATE STAGE {full_stage_name}
                     session.sql(f"DROP TABLE IF EXISTS {dataset_table}").collect()
                     session.create_dataframe(test_df).write.mode("overwrite").save_as_table(dataset_table)
 
+                    local_retriever = None
+                    if retriever != RETRIEVERS[0]:
+                        local_retriever = get_local_retriever(session, connection_scope(session),
+                                                              embedding_table, chunk_table, kind=LOCAL_RETRIEVERS[retriever])
+
                     class CustomerReviewRAG:
                         def __init__(self, snowpark_session):
                             self.session = snowpark_session
                             self.search_service = search_service
                             self.num_results = num_results
                             self.model = rag_model
+                            self.prefetched = {}
+                            self.precomputed = {}
+                            self.contexts = {}
+
+                        def prefetch(self, queries):
+                            # One embedding statement for the uncached questions, then one batched similarity search
+                            for query, results in zip(queries, local_retriever.search_many(queries, limit=self.num_results)):
+                                self.prefetched[query] = "\n\n".join([r["CHUNK_TEXT"] for r in results])
 
                         @instrument()
                         def retrieve_context(self, query: str) -> str:
-                            from snowflake.core import Root
-                            root = Root(self.session)
-                            parts = self.search_service.split(".")
-                            svc = root.databases[parts[0]].schemas[parts[1]].cortex_search_services[parts[2]]
-                            results = svc.search(query=query, columns=["CHUNK_TEXT"], limit=self.num_results)
-                            return "\n\n".join([r["CHUNK_TEXT"] for r in results.results])
+                            if query in self.precomputed:
+                                return self.precomputed[query]["details"]["context"]
+                            if query in self.prefetched:
+                                return self.prefetched[query]
+                            if local_retriever is not None:
+                                results = local_retriever.search(query, limit=self.num_results)
+                            else:
+                                results = cortex_search(self.session, self.search_service, query,
+                                                        ["CHUNK_TEXT"], self.num_results)
+                            return "\n\n".join([r["CHUNK_TEXT"] for r in results])
 
                         @instrument()
                         def generate_completion(self, query: str, context: str) -> str:
+                            if query in self.precomputed:
+                                return self.precomputed[query]["answer"]
                             prompt = f"""Based on this context from customer reviews:
 
 {context}
@@ -433,6 +484,7 @@ Provide a helpful answer based on the context above:"""
                         @instrument()
                         def query(self, query: str) -> str:
                             context = self.retrieve_context(query)
+                            self.contexts[query] = context
                             return self.generate_completion(query, context)
 
                     if hasattr(TruSession, "_singleton_instances"):
@@ -442,7 +494,41 @@ Provide a helpful answer based on the context above:"""
                     tru_session = TruSession(connector=tru_connector)
 
                     rag_app = CustomerReviewRAG(session)
+
+                    # Answers stored for the same retriever, model and result count, valid until the search service
+                    # refreshes (Cortex Search) or the chunks change (local retrievers)
+                    answer_store = shared_answer_store()
+                    answer_pipeline = f"day23/k{num_results}"
+                    answer_target = (search_service if local_retriever is None
+                                     else f"{LOCAL_RETRIEVERS[retriever]}:{embedding_table}")
+                    try:
+                        if local_retriever is None:
+                            data_version = answer_store.version(session, services=[search_service])
+                        else:
+                            data_version = answer_store.version(session, tables=[chunk_table])
+                        if use_precomputed:
+                            for question in test_questions:
+                                record = answer_store.lookup(session, answer_pipeline, answer_target, rag_model, question)
+                                if record and record["version"] == data_version:
+                                    rag_app.precomputed[question] = record
+                        if rag_app.precomputed:
+                            st.write(f":orange[:material/bolt:] Serving {len(rag_app.precomputed)} of "
+                                     f"{len(test_questions)} answers precomputed on the current review data")
+                    except Exception as e:
+                        answer_store = None
+                        st.warning(f"Precomputed answers unavailable: {str(e)}")
+
+                    to_answer = [q for q in test_questions if q not in rag_app.precomputed]
+                    if local_retriever is not None and to_answer:
+                        rag_app.prefetch(to_answer)
+                        timings = local_retriever.last_timings
+                        st.write(f":orange[:material/check:] Retrieved context for {len(test_questions)} questions "
+                                 f"in one batch ({local_retriever.status}): embed {timings['embed_ms']:.0f} ms, "
+                                 f"search {timings['search_ms'] + timings['keyword_ms']:.1f} ms")
                     unique_app_version = f"{app_version}_{st.session_state.run_counter}"
+                    if rag_app.precomputed:
+                        # Cached answers record near-zero latency and cost; keep them apart from measured runs
+                        unique_app_version += "_precomputed"
 
                     tru_rag = tru_session.App(
                         rag_app,
@@ -454,7 +540,8 @@ Provide a helpful answer based on the context above:"""
                     run_config = RunConfig(
                         run_name=f"{unique_app_version}",
                         dataset_name=dataset_table,
-                        description=f"Customer review RAG evaluation using {rag_model}",
+                        description=f"Customer review RAG evaluation using {rag_model}"
+                                    + (f" ({len(rag_app.precomputed)} precomputed answers reused)" if rag_app.precomputed else ""),
                         label="customer_review_eval",
                         source_type="TABLE",
                         dataset_spec={"input": "QUERY"},
@@ -471,6 +558,12 @@ Provide a helpful answer based on the context above:"""
                         )
                         generated_answers[question] = rag_app.query(question)
 
+                    if answer_store is not None:
+                        for question in to_answer:
+                            answer_store.put(session, answer_pipeline, answer_target, rag_model, question,
+                                             generated_answers[question], {"context": rag_app.contexts[question]},
+                                             data_version)
+
                     try:
                         run.compute_metrics(["answer_relevance", "context_relevance", "groundedness"])
                         st.write(":orange[:material/check:] Metrics computed successfully!")
@@ -501,6 +594,8 @@ AI & ML → Evaluations → {app_name}
                         for idx, question in enumerate(test_questions, 1):
                             st.markdown(f"**Question {idx}:** {question}")
                             st.info(generated_answers.get(question, "No answer generated"))
+                            if question in rag_app.precomputed:
+                                st.caption(f":material/bolt: Precomputed {rag_app.precomputed[question]['computed_at']}")
                             if idx < len(test_questions):
                                 st.markdown("---")
 
@@ -1,5 +1,6 @@
 import json
 import streamlit as st
+from rag_utils.precompute import ANSWER_TABLE, shared_answer_store
 
 st.set_page_config(page_title="Day 27 - Agent Orchestration", page_icon="2️⃣7️⃣")
 
@@ -30,6 +31,9 @@ DB_NAME = "CHANINN_SALES_INTELLIGENCE"
 SCHEMA_NAME = "DATA"
 AGENT_NAME = "SALES_CONVERSATION_AGENT"
 AGENT_ENDPOINT = f"/api/v2/databases/{DB_NAME}/schemas/{SCHEMA_NAME}/agents/{AGENT_NAME}:run"
+AGENT_TARGET = f"{DB_NAME}.{SCHEMA_NAME}.{AGENT_NAME}"
+# The agent's answers change when either of its tools' tables does
+AGENT_TABLES = [f"{DB_NAME}.{SCHEMA_NAME}.SALES_CONVERSATIONS", f"{DB_NAME}.{SCHEMA_NAME}.SALES_METRICS"]
 
 def run_sql(sql):
     """Execute SQL and return dataframe."""
@@ -202,6 +206,13 @@ def call_agent(query: str):
         result["events"].append({"error": str(e), "traceback": traceback.format_exc()})
         return result
 
+def agent_answer(query: str):
+    """Call the agent for the precompute job; returns (answer, details) without the API events."""
+    result = call_agent(query)
+    if result["text"].startswith(":material/error:"):
+        raise RuntimeError(result["text"])
+    return result["text"], {key: result[key] for key in ("thinking", "tool_name", "tool_type", "sql", "table_data")}
+
 # Example questions
 METRICS_QS = ["What was the total sales volume?", "What is the average deal value?",
               "How many deals were closed?", "Which sales rep has the most closed deals?",
@@ -232,6 +243,9 @@ with st.sidebar:
     
     st.divider()
     debug_mode = st.checkbox("🐛 Debug Mode (show API events)", value=False)
+    serve_precomputed = st.checkbox(":material/bolt: Instant answers for example questions", value=True,
+                                    help="Answer the example questions from answers computed ahead of time, "
+                                         "refreshed in the background when the sales tables change")
     
     if st.button(":material/refresh: Reset Chat"):
         st.session_state.messages = []
@@ -310,6 +324,21 @@ with st.container(border=True):
 
 st.session_state.setdefault("messages", [])
 
+# Precomputed answers to the example questions; missing or stale ones are recomputed in the background
+answer_store = shared_answer_store(f"{DB_NAME}.{SCHEMA_NAME}.{ANSWER_TABLE}")
+data_version = None
+if serve_precomputed:
+    try:
+        data_version, stale = answer_store.ensure_fresh(session, "agent", AGENT_TARGET, None,
+                                                        METRICS_QS + CONVO_QS, agent_answer, AGENT_TABLES)
+        if answer_store.is_refreshing(session, "agent", AGENT_TARGET, None):
+            st.caption(f":material/sync: Precomputing {len(stale)} example answer(s) in the background")
+        refresh_error = answer_store.error(session, "agent", AGENT_TARGET, None)
+        if refresh_error:
+            st.caption(f":material/warning: Last background precompute failed: {refresh_error}")
+    except Exception as e:
+        st.caption(f":material/warning: Precomputed answers unavailable: {str(e)}")
+
 # Example questions
 with st.container(border=True):
     st.markdown("### :material/help: Example Questions")
@@ -375,8 +404,16 @@ if user_input:
     
     # Get agent response
     with st.chat_message("assistant"):
-        with st.spinner("Processing..."):
-            result = call_agent(user_input)
+        record = None
+        if data_version is not None and user_input in METRICS_QS + CONVO_QS:
+            record = answer_store.lookup(session, "agent", AGENT_TARGET, None, user_input)
+        if record:
+            result = {"text": record["answer"], **record["details"], "events": []}
+            freshness = "" if record["version"] == data_version else " · sales data changed, refreshing in the background"
+            st.caption(f":material/bolt: Precomputed answer from {record['computed_at']}{freshness}")
+        else:
+            with st.spinner("Processing..."):
+                result = call_agent(user_input)
         
         # Build message dict
         msg = {
@@ -0,0 +1,5 @@
+"""Shared helpers for the RAG days (16-23).
+
+The pages stay self-contained Streamlit scripts; the heavier processing
+engines they share live here so every page uses the same code path.
+"""
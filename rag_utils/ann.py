@@ -0,0 +1,169 @@
+"""In-process approximate nearest neighbour index (IVF) over chunk embeddings.
+
+``IVFIndex`` clusters unit-normalised vectors into ``n_lists`` inverted
+lists with spherical k-means; a query scores the centroids, scans only the
+``n_probe`` closest lists and returns cosine top-k. Lists are plain NumPy
+arrays, so ``add`` and ``delete`` are incremental, and ``save``/``load``
+persist the index as ``.npy`` files that can be memory-mapped, published
+atomically as versions (``rag_utils.publish``).
+"""
+
+import json
+import os
+
+import numpy as np
+
+from rag_utils.exact import _top_k, _unit
+from rag_utils.publish import current_version, publish, writer_lock
+
+
+class IVFIndex:
+    """Inverted-file index with cosine scoring."""
+
+    def __init__(self, centroids, n_probe=8):
+        self.centroids = np.asarray(centroids, dtype=np.float32)
+        self.n_probe = n_probe
+        n_lists, dim = self.centroids.shape
+        self.dim = dim
+        self._ids = [np.empty(0, dtype=np.int64) for _ in range(n_lists)]
+        self._vectors = [np.empty((0, dim), dtype=np.float32) for _ in range(n_lists)]
+        self._where = {}
+        # Source version the lists were last synced to (see rag_utils.snapshot)
+        self.version = None
+
+    @property
+    def n_lists(self):
+        return len(self.centroids)
+
+    def __len__(self):
+        return len(self._where)
+
+    @classmethod
+    def train(cls, vectors, n_lists=None, n_probe=8, iterations=10, sample_size=20000, seed=0):
+        """Fit centroids with spherical k-means on a sample of ``vectors``.
+
+        ``n_lists`` defaults to about sqrt(n), which keeps both the centroid
+        scan and the probed lists small.
+        """
+        if not len(vectors):
+            raise ValueError("Cannot train an IVF index on an empty matrix")
+        rng = np.random.default_rng(seed)
+        n = len(vectors)
+        n_lists = min(n_lists or max(1, min(1024, int(np.sqrt(n)))), n)
+        sample = _unit(vectors[np.sort(rng.choice(n, size=min(n, sample_size), replace=False))])
+        centroids = sample[rng.choice(len(sample), size=n_lists, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = sample[assign == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+                else:
+                    # Re-seed empty lists from a random sample row
+                    centroids[c] = sample[rng.integers(len(sample))]
+            centroids = _unit(centroids)
+        return cls(centroids, n_probe=n_probe)
+
+    @classmethod
+    def build(cls, matrix, **train_params):
+        """Train on an ``EmbeddingMatrix`` and add all of its rows."""
+        index = cls.train(matrix.vectors, **train_params)
+        index.add(matrix.ids, matrix.vectors)
+        return index
+
+    def _assign(self, unit_vectors):
+        return np.argmax(unit_vectors @ self.centroids.T, axis=1)
+
+    def add(self, ids, vectors, block_rows=65536):
+        """Add (or replace) vectors for ``ids``."""
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        existing = [i for i in ids.tolist() if i in self._where]
+        if existing:
+            self.delete(existing)
+        for start in range(0, len(ids), block_rows):
+            block_ids = ids[start:start + block_rows]
+            unit = _unit(np.asarray(vectors[start:start + block_rows], dtype=np.float32).reshape(-1, self.dim))
+            assign = self._assign(unit)
+            for c in np.unique(assign).tolist():
+                members = assign == c
+                self._ids[c] = np.concatenate([self._ids[c], block_ids[members]])
+                self._vectors[c] = np.concatenate([self._vectors[c], unit[members]])
+                self._where.update(dict.fromkeys(block_ids[members].tolist(), c))
+
+    def delete(self, ids):
+        """Remove ``ids`` from the index; unknown IDs are ignored."""
+        by_list = {}
+        for i in np.asarray(ids, dtype=np.int64).reshape(-1).tolist():
+            c = self._where.pop(i, None)
+            if c is not None:
+                by_list.setdefault(c, []).append(i)
+        for c, removed in by_list.items():
+            keep = ~np.isin(self._ids[c], removed)
+            self._ids[c] = self._ids[c][keep]
+            self._vectors[c] = self._vectors[c][keep]
+
+    def sync(self, matrix):
+        """Bring the index in line with ``matrix``: add new IDs, drop missing or changed ones.
+
+        Returns ``(added, deleted)`` counts.
+        """
+        indexed = np.fromiter(self._where.keys(), dtype=np.int64, count=len(self._where))
+        deleted = np.setdiff1d(indexed, matrix.ids)
+        self.delete(deleted)
+
+        # Chunks re-embedded under the same ID show up as vectors that moved
+        changed = []
+        for c in range(self.n_lists):
+            if len(self._ids[c]):
+                rows = matrix.rows_of(self._ids[c])
+                drift = np.abs(_unit(matrix.vectors[rows]) - self._vectors[c]).max(axis=1)
+                changed.append(self._ids[c][drift > 1e-5])
+        indexed = np.fromiter(self._where.keys(), dtype=np.int64, count=len(self._where))
+        pending = np.union1d(np.setdiff1d(matrix.ids, indexed), np.concatenate(changed or [indexed[:0]]))
+        if len(pending):
+            self.add(pending, matrix.vectors[matrix.rows_of(pending)])
+        return len(pending), len(deleted)
+
+    def search(self, query, k=10, n_probe=None):
+        """Return ``(ids, scores)`` of the approximate cosine top-``k``."""
+        q = _unit(query)
+        probe = _top_k(self.centroids @ q, n_probe or self.n_probe)
+        ids = np.concatenate([self._ids[c] for c in probe])
+        if not len(ids):
+            return ids, np.empty(0, dtype=np.float32)
+        scores = np.concatenate([self._vectors[c] @ q for c in probe])
+        top = _top_k(scores, k)
+        return ids[top], scores[top]
+
+    def save(self, path):
+        """Publish the index as a new version under ``path`` (a directory)."""
+        offsets = np.cumsum([0] + [len(ids) for ids in self._ids]).astype(np.int64)
+        with writer_lock(path), publish(path) as staging:
+            np.save(os.path.join(staging, "centroids.npy"), self.centroids)
+            np.save(os.path.join(staging, "offsets.npy"), offsets)
+            np.save(os.path.join(staging, "ids.npy"), np.concatenate(self._ids))
+            np.save(os.path.join(staging, "vectors.npy"), np.concatenate(self._vectors))
+            with open(os.path.join(staging, "index.json"), "w") as f:
+                json.dump({"n_probe": self.n_probe, "n_lists": self.n_lists, "size": len(self),
+                           "version": self.version}, f)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load the current saved index; lists are views of memory-mapped arrays when ``mmap``."""
+        mode = "r" if mmap else None
+        version_dir = current_version(path)
+        if version_dir is None:
+            raise FileNotFoundError(f"No index saved in {path}")
+        path = version_dir
+        with open(os.path.join(path, "index.json")) as f:
+            meta = json.load(f)
+        index = cls(np.load(os.path.join(path, "centroids.npy")), n_probe=meta["n_probe"])
+        index.version = meta.get("version")
+        offsets = np.load(os.path.join(path, "offsets.npy"))
+        ids = np.load(os.path.join(path, "ids.npy"), mmap_mode=mode)
+        vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode=mode)
+        for c in range(index.n_lists):
+            index._ids[c] = ids[offsets[c]:offsets[c + 1]]
+            index._vectors[c] = vectors[offsets[c]:offsets[c + 1]]
+            index._where.update(dict.fromkeys(index._ids[c].tolist(), c))
+        return index
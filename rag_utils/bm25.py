@@ -0,0 +1,114 @@
+"""Local BM25 keyword index over chunk text.
+
+Embeddings are weak at exact tokens — product names, order numbers, SKUs —
+so ``BM25Index`` keeps a compact inverted index for keyword retrieval. Each
+term's postings are a sorted ``int32`` array of row numbers next to a
+``float32`` array of precomputed BM25 impacts, laid out CSR-style (one
+``offsets`` array for the whole vocabulary). A query adds the impacts of its
+terms' postings into a score array and takes the top-k with
+``argpartition``; nothing leaves the process.
+"""
+
+import re
+from collections import Counter
+
+import numpy as np
+
+from rag_utils.exact import _top_k
+
+# Words joined by - _ . / # stay together ("TG-1234") and are also indexed by part
+_TOKEN = re.compile(r"[a-z0-9]+(?:[-_./#][a-z0-9]+)*")
+_SEPARATORS = re.compile(r"[-_./#]")
+
+STOPWORDS = frozenset("""
+a an and are as at be but by for from had has have i in is it its of on or so that the their them they
+this to was were will with you your my me we our not no do does did than then there these those
+""".split())
+
+
+def tokenize(text):
+    """Lower-cased terms of ``text``; compound tokens yield themselves and their parts."""
+    terms = []
+    for token in _TOKEN.findall((text or "").lower()):
+        if token in STOPWORDS:
+            continue
+        terms.append(token)
+        if _SEPARATORS.search(token):
+            terms.extend(part for part in _SEPARATORS.split(token) if part and part not in STOPWORDS)
+    return terms
+
+
+class BM25Index:
+    """Inverted index with BM25 scoring over one text per chunk ID."""
+
+    def __init__(self, ids, vocabulary, offsets, rows, impacts, idf):
+        self.ids = ids
+        self.vocabulary = vocabulary
+        self.offsets = offsets
+        self.rows = rows
+        self.impacts = impacts
+        self.idf = idf
+
+    def __len__(self):
+        return len(self.ids)
+
+    @property
+    def nbytes(self):
+        """Bytes held by the posting arrays (the vocabulary dict is extra)."""
+        return self.ids.nbytes + self.offsets.nbytes + self.rows.nbytes + self.impacts.nbytes + self.idf.nbytes
+
+    @classmethod
+    def build(cls, chunk_ids, texts, k1=1.2, b=0.75):
+        """Tokenize ``texts`` and build the postings in one pass plus a sort."""
+        vocabulary = {}
+        term_ids, rows, tfs = [], [], []
+        lengths = np.zeros(len(texts), dtype=np.float32)
+        for row, text in enumerate(texts):
+            terms = tokenize(text)
+            lengths[row] = len(terms)
+            for term, tf in Counter(terms).items():
+                term_ids.append(vocabulary.setdefault(term, len(vocabulary)))
+                rows.append(row)
+                tfs.append(tf)
+
+        term_ids = np.asarray(term_ids, dtype=np.int32)
+        rows = np.asarray(rows, dtype=np.int32)
+        tfs = np.asarray(tfs, dtype=np.float32)
+        # Group postings by term; rows are already ascending within each term
+        order = np.argsort(term_ids, kind="stable")
+        term_ids, rows, tfs = term_ids[order], rows[order], tfs[order]
+        df = np.bincount(term_ids, minlength=len(vocabulary))
+        offsets = np.concatenate([[0], np.cumsum(df)]).astype(np.int64)
+
+        n = len(texts)
+        idf = np.log1p((n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        avg_length = float(lengths.mean()) if n and lengths.any() else 1.0
+        norm = k1 * (1 - b + b * lengths / avg_length)
+        impacts = (idf[term_ids] * tfs * (k1 + 1) / (tfs + norm[rows])).astype(np.float32)
+        return cls(np.asarray(chunk_ids, dtype=np.int64), vocabulary, offsets, rows, impacts, idf)
+
+    def postings(self, term):
+        """``(rows, impacts)`` for ``term``; empty arrays if unseen."""
+        term_id = self.vocabulary.get(term)
+        if term_id is None:
+            return self.rows[:0], self.impacts[:0]
+        start, end = self.offsets[term_id], self.offsets[term_id + 1]
+        return self.rows[start:end], self.impacts[start:end]
+
+    def search(self, query, k=10):
+        """Return ``(ids, scores)`` of the top-``k`` BM25 matches for ``query``."""
+        scores = np.zeros(len(self.ids), dtype=np.float32)
+        matched = []
+        for term in dict.fromkeys(tokenize(query)):
+            rows, impacts = self.postings(term)
+            # Rows are unique within a term's postings, so fancy-index add is safe
+            scores[rows] += impacts
+            matched.append(rows)
+        if sum(len(rows) for rows in matched) < len(scores) // 16:
+            candidates = np.unique(np.concatenate(matched)) if matched else np.empty(0, dtype=np.int32)
+        else:
+            # Long postings: scanning for the (always positive) scores beats sorting them
+            candidates = np.flatnonzero(scores)
+        top = _top_k(scores[candidates], k)
+        rows = candidates[top]
+        return self.ids[rows], scores[rows]
@@ -0,0 +1,475 @@
+"""Chunking engine and strategies for Day 17.
+
+``chunk_documents`` takes the EXTRACTED_DOCUMENTS frame and returns the
+REVIEW_CHUNKS frame directly. A block of documents is joined into a single
+UTF-8 buffer, word boundaries are found with NumPy over the whole buffer,
+and window offsets and chunk IDs are computed on whole columns. The only
+per-chunk Python work left is decoding one byte slice per split chunk.
+
+The ``Chunker`` strategies (``make_chunker``) add token-count targets on
+top: whole reviews, word windows, sentence/paragraph packing and recursive
+separators, all reporting a CHUNK_TOKENS column.
+"""
+
+import re
+from abc import ABC, abstractmethod
+
+import numpy as np
+import pandas as pd
+
+CHUNK_COLUMNS = ["CHUNK_ID", "DOC_ID", "FILE_NAME", "CHUNK_TEXT", "CHUNK_SIZE", "CHUNK_TYPE"]
+
+# Stable chunk IDs are DOC_ID * CHUNK_ID_STRIDE + position within the document
+CHUNK_ID_STRIDE = 10000
+
+_SEPARATOR = "\x00"
+
+
+def _word_offsets(texts):
+    """Locate every word in a list of texts with one pass over a joined buffer.
+
+    Words are runs of non-whitespace bytes (ASCII whitespace). Returns the
+    joined buffer, word start/end byte offsets and the words-per-text counts.
+    """
+    joined = _SEPARATOR.join(texts)
+    if joined.count(_SEPARATOR) != len(texts) - 1:
+        joined = _SEPARATOR.join(t.replace(_SEPARATOR, " ") for t in texts)
+    raw = joined.encode("utf-8")
+    buf = np.frombuffer(raw, dtype=np.uint8)
+    if not buf.size:
+        empty = np.empty(0, dtype=np.int64)
+        return raw, empty, empty, np.zeros(len(texts), dtype=np.int64)
+
+    is_space = (buf == 32) | ((buf >= 9) & (buf <= 13)) | (buf == 0)
+    is_word = ~is_space
+    starts = np.flatnonzero(is_word & np.concatenate(([True], is_space[:-1])))
+    ends = np.flatnonzero(is_word & np.concatenate((is_space[1:], [True]))) + 1
+
+    separators = np.flatnonzero(buf == 0)
+    word_doc = np.searchsorted(separators, starts)
+    counts = np.bincount(word_doc, minlength=len(texts)).astype(np.int64)
+    return raw, starts, ends, counts
+
+
+def _window_chunks(raw, starts, ends, counts, is_long, chunk_size, step):
+    """Cut long documents into word windows starting every ``step`` words.
+
+    Mirrors ``range(0, n_words, step)`` from the original loop. Returns the
+    chunk texts, their word counts and the number of windows per long doc.
+    """
+    doc_first_word = (np.cumsum(counts) - counts)[is_long]
+    n_words = counts[is_long]
+    n_windows = -(-n_words // step)
+
+    first_window = np.cumsum(n_windows) - n_windows
+    window_index = np.arange(n_windows.sum()) - np.repeat(first_window, n_windows)
+    lo = np.repeat(doc_first_word, n_windows) + window_index * step
+    hi = np.minimum(lo + chunk_size, np.repeat(doc_first_word + n_words, n_windows))
+
+    byte_lo = starts[lo].tolist()
+    byte_hi = ends[hi - 1].tolist()
+    texts = [raw[a:b].decode("utf-8") for a, b in zip(byte_lo, byte_hi)]
+    return texts, hi - lo, n_windows
+
+
+def _chunk_block(texts, chunk_size, overlap):
+    raw, starts, ends, n_words = _word_offsets(texts)
+
+    if chunk_size is None:
+        is_long = np.zeros(len(texts), dtype=bool)
+    else:
+        is_long = n_words > chunk_size
+
+    chunks_per_doc = np.ones(len(texts), dtype=np.int64)
+    if is_long.any():
+        long_texts, long_words, long_counts = _window_chunks(
+            raw, starts, ends, n_words, is_long, chunk_size, chunk_size - overlap
+        )
+        chunks_per_doc[is_long] = long_counts
+
+    total = int(chunks_per_doc.sum())
+    first_chunk = np.cumsum(chunks_per_doc) - chunks_per_doc
+    doc_index = np.repeat(np.arange(len(texts)), chunks_per_doc)
+
+    chunk_text = np.empty(total, dtype=object)
+    chunk_words = np.empty(total, dtype=np.int64)
+    chunk_type = np.full(total, "full_review", dtype=object)
+
+    short_pos = first_chunk[~is_long]
+    chunk_text[short_pos] = np.asarray(texts, dtype=object)[~is_long]
+    chunk_words[short_pos] = n_words[~is_long]
+
+    if is_long.any():
+        long_pos = np.flatnonzero(is_long[doc_index])
+        chunk_text[long_pos] = long_texts
+        chunk_words[long_pos] = long_words
+        chunk_type[long_pos] = "chunked_review"
+
+    return doc_index, chunk_text, chunk_words, chunk_type
+
+
+def chunk_documents(df, chunk_size=None, overlap=0, start_id=1, block_size=20000):
+    """Chunk a documents frame into a REVIEW_CHUNKS frame.
+
+    ``df`` needs DOC_ID, FILE_NAME and EXTRACTED_TEXT columns. With
+    ``chunk_size=None`` every document becomes one ``full_review`` chunk.
+    Otherwise documents longer than ``chunk_size`` words are split into
+    windows of ``chunk_size`` words overlapping by ``overlap`` words
+    (``chunked_review``); shorter ones are kept whole. Split chunks keep the
+    original whitespace between their words.
+
+    Documents are processed ``block_size`` at a time so memory stays bounded.
+    """
+    if chunk_size is not None and chunk_size - overlap <= 0:
+        raise ValueError("overlap must be smaller than chunk_size")
+
+    texts = df["EXTRACTED_TEXT"].fillna("").astype(str).tolist()
+    doc_ids = df["DOC_ID"].to_numpy()
+    file_names = df["FILE_NAME"].to_numpy()
+
+    doc_index, chunk_text, chunk_words, chunk_type = [], [], [], []
+    for block_start in range(0, len(texts), block_size):
+        block = _chunk_block(texts[block_start:block_start + block_size], chunk_size, overlap)
+        doc_index.append(block[0] + block_start)
+        chunk_text.append(block[1])
+        chunk_words.append(block[2])
+        chunk_type.append(block[3])
+
+    if not doc_index:
+        return pd.DataFrame(columns=CHUNK_COLUMNS)
+
+    doc_index = np.concatenate(doc_index)
+    # Object columns keep references to the source strings instead of copying them
+    return pd.DataFrame({
+        "CHUNK_ID": np.arange(start_id, start_id + len(doc_index), dtype=np.int64),
+        "DOC_ID": doc_ids[doc_index],
+        "FILE_NAME": pd.Series(file_names[doc_index], dtype=object),
+        "CHUNK_TEXT": pd.Series(np.concatenate(chunk_text), dtype=object),
+        "CHUNK_SIZE": np.concatenate(chunk_words),
+        "CHUNK_TYPE": pd.Series(np.concatenate(chunk_type), dtype=object),
+    }, columns=CHUNK_COLUMNS)
+
+
+# ---------------------------------------------------------------------------
+# Token-aware, pluggable chunking strategies
+# ---------------------------------------------------------------------------
+
+TOKEN_COLUMNS = CHUNK_COLUMNS + ["CHUNK_TOKENS"]
+
+# snowflake-arctic-embed-m truncates its input at 512 WordPiece tokens, [CLS] and [SEP] included
+EMBED_TOKEN_LIMIT = 512
+EMBED_TOKENIZER = "Snowflake/snowflake-arctic-embed-m"
+# Share of the limit held back when counting with a stand-in for the model's tokenizer.
+# Its 30k-entry uncased WordPiece vocabulary splits rare words, numbers and product codes
+# into more pieces than cl100k_base does, and the regex fallback counts every word as one.
+EMBED_SAFETY_MARGIN = 0.25
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_PARAGRAPH_BREAK = re.compile(r"\n\s*\n")
+_APPROX_TOKEN = re.compile(r"\w+|[^\w\s]")
+
+
+class TokenCounter:
+    """Counts tokens with WordPiece, tiktoken, or a regex approximation.
+
+    With ``wordpiece=True`` the embedding model's own tokenizer is tried
+    first (the ``tokenizers`` package with ``EMBED_TOKENIZER``, which must be
+    cached or downloadable); counts are then ``exact`` for the embedding
+    limit. Otherwise tiktoken's ``encoding_name`` stands in. tiktoken fetches
+    its encoding file on first use, so on offline hosts and in the warehouse
+    UDTF it can be missing too; the regex count is used and ``approximate``
+    is set so pages can say so.
+    """
+
+    def __init__(self, encoding_name="cl100k_base", wordpiece=False):
+        self.wordpiece = wordpiece
+        self.exact = False
+        self.approximate = False
+        self._tokenizer = None
+        self._encoding = None
+        if wordpiece:
+            try:
+                from tokenizers import Tokenizer
+                self._tokenizer = Tokenizer.from_pretrained(EMBED_TOKENIZER)
+                self.exact = True
+                self.name = f"WordPiece ({EMBED_TOKENIZER})"
+                return
+            except Exception:
+                pass
+        try:
+            import tiktoken
+            self._encoding = tiktoken.get_encoding(encoding_name)
+            self.name = f"tiktoken/{encoding_name}"
+        except Exception:
+            self.approximate = True
+            self.name = "approximate (words + punctuation)"
+
+    def count(self, text):
+        if self._tokenizer is not None:
+            return len(self._tokenizer.encode(text, add_special_tokens=False).ids)
+        if self._encoding is not None:
+            return len(self._encoding.encode_ordinary(text))
+        return len(_APPROX_TOKEN.findall(text))
+
+    def count_many(self, texts):
+        if self._tokenizer is not None:
+            encoded = self._tokenizer.encode_batch(list(texts), add_special_tokens=False)
+            return np.array([len(e.ids) for e in encoded], dtype=np.int64)
+        if self._encoding is not None:
+            return np.array([len(t) for t in self._encoding.encode_ordinary_batch(list(texts))], dtype=np.int64)
+        return np.array([len(_APPROX_TOKEN.findall(t)) for t in texts], dtype=np.int64)
+
+    def embed_budget(self, limit=EMBED_TOKEN_LIMIT):
+        """Most tokens, as this counter counts them, a chunk can have and still embed untruncated."""
+        usable = limit - 2  # [CLS] and [SEP]
+        return usable if self.exact else int(usable * (1 - EMBED_SAFETY_MARGIN))
+
+
+class Chunker(ABC):
+    """Base class for chunking strategies.
+
+    Subclasses implement ``split(text)`` for a single document. ``chunk_frame``
+    applies the strategy to a whole documents frame, keeping documents that
+    already fit in ``max_tokens`` whole without splitting them (fast path).
+    """
+
+    name = "base"
+    max_tokens = None
+
+    def __init__(self, counter=None):
+        self.counter = counter or TokenCounter()
+
+    @abstractmethod
+    def split(self, text):
+        """Split one document into chunk texts."""
+
+    def params(self):
+        """Constructor arguments that rebuild this strategy via ``make_chunker``."""
+        return {}
+
+    def split_document(self, text):
+        """Split one document as ``chunk_frame`` would; returns ``(pieces, whole)``."""
+        text = text or ""
+        if self.max_tokens is None:
+            pieces = self.split(text)
+            return pieces, pieces == [text]
+        if self.counter.count(text) <= self.max_tokens:
+            return [text], True
+        return self.split(text), False
+
+    def chunk_frame(self, df, start_id=1):
+        texts = df["EXTRACTED_TEXT"].fillna("").astype(str).tolist()
+        doc_tokens = self.counter.count_many(texts)
+        fits = doc_tokens <= self.max_tokens if self.max_tokens else np.ones(len(texts), dtype=bool)
+
+        pieces = [[text] if fit else self.split(text) for text, fit in zip(texts, fits.tolist())]
+        chunks_per_doc = np.array([len(p) for p in pieces], dtype=np.int64)
+        doc_index = np.repeat(np.arange(len(texts)), chunks_per_doc)
+        chunk_text = [piece for doc_pieces in pieces for piece in doc_pieces]
+
+        # Whole documents reuse their token count; only split chunks are recounted
+        is_whole = fits[doc_index]
+        chunk_tokens = doc_tokens[doc_index].copy()
+        split_pos = np.flatnonzero(~is_whole)
+        if len(split_pos):
+            chunk_tokens[split_pos] = self.counter.count_many([chunk_text[i] for i in split_pos])
+
+        return pd.DataFrame({
+            "CHUNK_ID": np.arange(start_id, start_id + len(chunk_text), dtype=np.int64),
+            "DOC_ID": df["DOC_ID"].to_numpy()[doc_index],
+            "FILE_NAME": pd.Series(df["FILE_NAME"].to_numpy()[doc_index], dtype=object),
+            "CHUNK_TEXT": pd.Series(chunk_text, dtype=object),
+            "CHUNK_SIZE": np.array([len(t.split()) for t in chunk_text], dtype=np.int64),
+            "CHUNK_TYPE": pd.Series(np.where(is_whole, "full_review", "chunked_review"), dtype=object),
+            "CHUNK_TOKENS": chunk_tokens,
+        }, columns=TOKEN_COLUMNS)
+
+
+class WholeReviewChunker(Chunker):
+    """One chunk per document."""
+
+    name = "whole"
+
+    def split(self, text):
+        return [text]
+
+    def chunk_frame(self, df, start_id=1):
+        chunks = chunk_documents(df, start_id=start_id)
+        chunks["CHUNK_TOKENS"] = self.counter.count_many(chunks["CHUNK_TEXT"].tolist())
+        return chunks
+
+
+class WordWindowChunker(Chunker):
+    """Fixed word windows with word overlap (the original Day 17 strategy)."""
+
+    name = "words"
+
+    def __init__(self, chunk_size=200, overlap=50, counter=None):
+        super().__init__(counter)
+        self.chunk_size = chunk_size
+        self.overlap = overlap
+
+    def params(self):
+        return {"chunk_size": self.chunk_size, "overlap": self.overlap}
+
+    def split(self, text):
+        words = text.split()
+        if len(words) <= self.chunk_size:
+            return [text]
+        step = self.chunk_size - self.overlap
+        return [" ".join(words[i:i + self.chunk_size]) for i in range(0, len(words), step)]
+
+    def chunk_frame(self, df, start_id=1):
+        chunks = chunk_documents(df, chunk_size=self.chunk_size, overlap=self.overlap, start_id=start_id)
+        chunks["CHUNK_TOKENS"] = self.counter.count_many(chunks["CHUNK_TEXT"].tolist())
+        return chunks
+
+
+def _pack(pieces, piece_tokens, max_tokens, overlap_tokens, joiner):
+    """Greedily pack pieces into chunks of at most ``max_tokens``.
+
+    Trailing pieces worth up to ``overlap_tokens`` are carried into the next
+    chunk. A piece larger than ``max_tokens`` becomes a chunk on its own.
+    """
+    chunks = []
+    current, current_tokens, total = [], [], 0
+    for piece, tokens in zip(pieces, piece_tokens):
+        if current and total + tokens > max_tokens:
+            chunks.append(joiner.join(current))
+            keep, carried = 0, 0
+            for prev_tokens in reversed(current_tokens):
+                if carried + prev_tokens > overlap_tokens or carried + prev_tokens + tokens > max_tokens:
+                    break
+                carried += prev_tokens
+                keep += 1
+            current = current[len(current) - keep:] if keep else []
+            current_tokens = current_tokens[len(current_tokens) - keep:] if keep else []
+            total = carried
+        current.append(piece)
+        current_tokens.append(tokens)
+        total += tokens
+    if current:
+        chunks.append(joiner.join(current))
+    return chunks
+
+
+class SentenceChunker(Chunker):
+    """Packs whole sentences (never crossing paragraphs) up to a token target."""
+
+    name = "sentences"
+
+    def __init__(self, max_tokens=256, overlap_tokens=0, counter=None):
+        super().__init__(counter)
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+
+    def params(self):
+        return {"max_tokens": self.max_tokens, "overlap_tokens": self.overlap_tokens}
+
+    def split(self, text):
+        chunks = []
+        for paragraph in _PARAGRAPH_BREAK.split(text):
+            sentences = [s for s in _SENTENCE_END.split(paragraph.strip()) if s]
+            if not sentences:
+                continue
+            sentence_tokens = self.counter.count_many(sentences).tolist()
+            packed = _pack(sentences, sentence_tokens, self.max_tokens, self.overlap_tokens, " ")
+            # A single run-on sentence can still exceed the target: cut it by words
+            for chunk in packed:
+                if self.counter.count(chunk) > self.max_tokens:
+                    chunks.extend(_split_words_by_tokens(chunk, self.max_tokens, self.counter))
+                else:
+                    chunks.append(chunk)
+        return chunks or [text]
+
+
+class RecursiveChunker(Chunker):
+    """Splits on the coarsest separator that yields pieces under the token target.
+
+    Tries paragraphs, then lines, then sentences, then words, merging adjacent
+    pieces back together up to ``max_tokens`` at every level.
+    """
+
+    name = "recursive"
+    separators = ("\n\n", "\n", ". ", " ")
+
+    def __init__(self, max_tokens=256, overlap_tokens=0, counter=None):
+        super().__init__(counter)
+        self.max_tokens = max_tokens
+        self.overlap_tokens = overlap_tokens
+
+    def params(self):
+        return {"max_tokens": self.max_tokens, "overlap_tokens": self.overlap_tokens}
+
+    def _split(self, text, level):
+        if level >= len(self.separators):
+            return _split_words_by_tokens(text, self.max_tokens, self.counter)
+        separator = self.separators[level]
+        pieces = [p.strip() for p in text.split(separator)]
+        pieces = [p + "." if separator == ". " and not p.endswith((".", "!", "?")) else p for p in pieces if p]
+        if not pieces:
+            return []
+        piece_tokens = self.counter.count_many(pieces).tolist()
+
+        merged = []
+        for chunk in _pack(pieces, piece_tokens, self.max_tokens, self.overlap_tokens,
+                           " " if separator == ". " else separator):
+            if self.counter.count(chunk) > self.max_tokens:
+                merged.extend(self._split(chunk, level + 1))
+            else:
+                merged.append(chunk)
+        return merged
+
+    def split(self, text):
+        return self._split(text, 0) or [text]
+
+
+def _split_words_by_tokens(text, max_tokens, counter):
+    """Last-resort split of a single long span into word runs under ``max_tokens``."""
+    words = text.split()
+    word_tokens = counter.count_many(words).tolist() if words else []
+    return _pack(words, word_tokens, max_tokens, 0, " ")
+
+
+CHUNKERS = {
+    WholeReviewChunker.name: WholeReviewChunker,
+    WordWindowChunker.name: WordWindowChunker,
+    SentenceChunker.name: SentenceChunker,
+    RecursiveChunker.name: RecursiveChunker,
+}
+
+
+def make_chunker(strategy, **params):
+    """Build a registered chunking strategy by name."""
+    if strategy not in CHUNKERS:
+        raise ValueError(f"Unknown chunking strategy: {strategy}")
+    return CHUNKERS[strategy](**params)
+
+
+def assign_stable_ids(chunks):
+    """Rewrite CHUNK_ID as ``DOC_ID * CHUNK_ID_STRIDE + position`` within each document.
+
+    IDs no longer depend on which run produced a chunk, so incremental appends
+    to REVIEW_CHUNKS never collide with earlier ones.
+    """
+    position = chunks.groupby("DOC_ID", sort=False).cumcount().to_numpy()
+    if len(position) and position.max() >= CHUNK_ID_STRIDE:
+        raise ValueError(f"A document produced more than {CHUNK_ID_STRIDE} chunks")
+    chunks["CHUNK_ID"] = chunks["DOC_ID"].to_numpy(dtype=np.int64) * CHUNK_ID_STRIDE + position
+    return chunks
+
+
+def token_stats(chunks, limit=EMBED_TOKEN_LIMIT):
+    """Summary of per-chunk token counts for a chunk frame."""
+    tokens = chunks["CHUNK_TOKENS"].to_numpy()
+    if not len(tokens):
+        return {"min": 0, "mean": 0.0, "p50": 0.0, "p95": 0.0, "max": 0, "over_limit": 0, "total": 0}
+    return {
+        "min": int(tokens.min()),
+        "mean": float(tokens.mean()),
+        "p50": float(np.percentile(tokens, 50)),
+        "p95": float(np.percentile(tokens, 95)),
+        "max": int(tokens.max()),
+        "over_limit": int((tokens > limit).sum()),
+        "total": int(tokens.sum()),
+    }
@@ -0,0 +1,206 @@
+"""Token-budgeted context packing for RAG prompts (Days 21-22).
+
+Retrieved chunks used to be joined whole, so a prompt carried every chunk
+regardless of length, near-duplicate reviews, or how much context the model
+can use. ``pack_context`` runs three steps in rank order:
+
+1. drop chunks whose word 3-gram Jaccard similarity to a higher-ranked chunk
+   is at least ``similarity`` (reposted or templated reviews);
+2. trim each chunk to windows of ``window`` sentences around the sentences
+   that contain a query term (chunks without one are kept whole);
+3. add passages until the model's token budget is spent; a passage that
+   doesn't fit loses its context sentences, then its last hit sentences,
+   and is skipped if nothing of it fits.
+"""
+
+import re
+
+from rag_utils.bm25 import tokenize
+from rag_utils.chunking import _PARAGRAPH_BREAK, _SENTENCE_END, TokenCounter
+
+# Context tokens per model, leaving room for instructions and the answer
+CONTEXT_BUDGETS = {
+    "claude-3-5-sonnet": 3000,
+    "mistral-large": 2500,
+    "mixtral-8x7b": 2000,
+    "llama3-70b": 1500,
+    "llama3.1-8b": 1500,
+}
+DEFAULT_CONTEXT_BUDGET = 2000
+
+CONTEXT_SEPARATOR = "\n\n---\n\n"
+_ELLIPSIS = " … "
+_WORD = re.compile(r"\w+")
+
+_counter = None
+
+
+def context_budget(model):
+    """Context token budget for ``model`` (``DEFAULT_CONTEXT_BUDGET`` if unknown)."""
+    return CONTEXT_BUDGETS.get(model, DEFAULT_CONTEXT_BUDGET)
+
+
+def _default_counter():
+    global _counter
+    if _counter is None:
+        _counter = TokenCounter()
+    return _counter
+
+
+def count_tokens(text):
+    """Tokens in ``text`` with the packer's shared ``TokenCounter``."""
+    return _default_counter().count(text)
+
+
+def _shingles(text, n=3):
+    words = _WORD.findall(text.lower())
+    if len(words) < n:
+        return {tuple(words)} if words else set()
+    return set(zip(*(words[i:] for i in range(n))))
+
+
+def _jaccard(a, b):
+    if not a or not b:
+        return 1.0 if a == b else 0.0
+    return len(a & b) / len(a | b)
+
+
+def _sentences(text):
+    return [s for paragraph in _PARAGRAPH_BREAK.split(text.strip())
+            for s in _SENTENCE_END.split(paragraph.strip()) if s]
+
+
+def sentence_windows(text, terms, window=1):
+    """``text`` cut to the sentences within ``window`` of a query-term hit.
+
+    Non-adjacent windows are joined with an ellipsis. Returns the sentences
+    kept (as runs) so the packer can trim further at sentence boundaries.
+    """
+    sentences = _sentences(text)
+    hits = [i for i, sentence in enumerate(sentences) if terms.intersection(tokenize(sentence))]
+    if not terms or not hits:
+        return [sentences]
+    keep = sorted({j for i in hits for j in range(max(0, i - window), min(len(sentences), i + window + 1))})
+    runs, run = [], [keep[0]]
+    for j in keep[1:]:
+        if j == run[-1] + 1:
+            run.append(j)
+        else:
+            runs.append(run)
+            run = [j]
+    runs.append(run)
+    return [[sentences[j] for j in run] for run in runs]
+
+
+def _join(runs):
+    return _ELLIPSIS.join(" ".join(run) for run in runs if run)
+
+
+def _fit_runs(runs, terms, counter, room):
+    """Drop sentences from ``runs`` until ``_join(runs)`` costs at most ``room`` tokens.
+
+    Context sentences go first, then hit sentences, last first in each
+    group. Hit flags and per-sentence token counts are computed once and
+    subtracted as sentences are dropped; the joined text is only re-counted
+    to confirm an estimate that fits. Returns ``(runs, text, tokens)``, with
+    no runs if nothing fits.
+    """
+    spots = [(r, j) for r, run in enumerate(runs) for j in range(len(run))]
+    sentences = [runs[r][j] for r, j in spots]
+    sizes = [int(n) for n in counter.count_many(sentences)]
+    hits = [bool(terms.intersection(tokenize(sentence))) for sentence in sentences]
+    order = ([i for i in reversed(range(len(spots))) if not hits[i]]
+             + [i for i in reversed(range(len(spots))) if hits[i]])
+    alive = [True] * len(spots)
+    remaining = sum(sizes)
+    run_sizes = [len(run) for run in runs]
+    live_runs = len(runs)
+    ellipsis_tokens = counter.count(_ELLIPSIS)
+    # Tokens the joins add (or merge away) beyond the sentences and ellipses
+    slack = counter.count(_join(runs)) - remaining - ellipsis_tokens * (live_runs - 1)
+
+    def current():
+        kept = [[] for _ in runs]
+        for i, (r, _) in enumerate(spots):
+            if alive[i]:
+                kept[r].append(sentences[i])
+        return [run for run in kept if run]
+
+    for i in order:
+        alive[i] = False
+        remaining -= sizes[i]
+        run_sizes[spots[i][0]] -= 1
+        if not run_sizes[spots[i][0]]:
+            live_runs -= 1
+        joins = ellipsis_tokens * max(live_runs - 1, 0)
+        if live_runs and remaining + joins + slack <= room:
+            trimmed = current()
+            text = _join(trimmed)
+            actual = counter.count(text)
+            if actual <= room:
+                return trimmed, text, actual
+            slack = actual - remaining - joins
+    return [], "", 0
+
+
+class PackedContext:
+    """Result of ``pack_context``: the prompt text and what went into it."""
+
+    def __init__(self, text, passages, tokens, budget, input_tokens, duplicates):
+        self.text = text
+        self.passages = passages
+        self.tokens = tokens
+        self.budget = budget
+        self.input_tokens = input_tokens
+        self.duplicates = duplicates
+
+    def summary(self):
+        return (f"{len(self.passages)} passages, {self.tokens:,}/{self.budget:,} tokens "
+                f"(from {self.input_tokens:,}; {self.duplicates} near-duplicates dropped)")
+
+
+def pack_context(query, chunks, budget=DEFAULT_CONTEXT_BUDGET, counter=None, window=1,
+                 similarity=0.8, separator=CONTEXT_SEPARATOR):
+    """Pack ranked ``chunks`` into at most ``budget`` tokens of context.
+
+    ``chunks`` are dicts with ``text`` and optionally ``source`` and
+    ``score``; they are ranked by ``score`` when every chunk has one and
+    taken in the given order otherwise. Returns a ``PackedContext`` whose
+    ``passages`` are the chunk dicts with ``text`` replaced by what was kept.
+    """
+    counter = counter or _default_counter()
+    chunks = [c for c in chunks if (c.get("text") or "").strip()]
+    if chunks and all(c.get("score") is not None for c in chunks):
+        chunks = sorted(chunks, key=lambda c: c["score"], reverse=True)
+    input_tokens = int(counter.count_many([c["text"] for c in chunks]).sum()) if chunks else 0
+
+    kept, kept_shingles = [], []
+    for chunk in chunks:
+        shingles = _shingles(chunk["text"])
+        if any(_jaccard(shingles, other) >= similarity for other in kept_shingles):
+            continue
+        kept.append(chunk)
+        kept_shingles.append(shingles)
+    duplicates = len(chunks) - len(kept)
+
+    terms = set(tokenize(query))
+    separator_tokens = counter.count(separator)
+    passages, tokens = [], 0
+    for chunk in kept:
+        runs = sentence_windows(chunk["text"], terms, window)
+        text = _join(runs)
+        cost = counter.count(text) + (separator_tokens if passages else 0)
+        if tokens + cost > budget:
+            # Drop context sentences (last first), then hit sentences, until it fits
+            joint = separator_tokens if passages else 0
+            runs, text, size = _fit_runs(runs, terms, counter, budget - tokens - joint)
+            if not runs:
+                continue
+            cost = size + joint
+        passages.append({**chunk, "text": text})
+        tokens += cost
+        if budget - tokens <= separator_tokens:
+            break
+
+    return PackedContext(separator.join(p["text"] for p in passages), passages, tokens, budget,
+                         input_tokens, duplicates)
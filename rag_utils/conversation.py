@@ -0,0 +1,161 @@
+"""Follow-up-aware retrieval for Day 22's chat.
+
+Each chat turn used to run a fresh search on the raw message, so follow-ups
+("what about the helmets?") searched without their subject and clarifying
+questions repeated almost the same search. ``ConversationMemory`` lives in
+session state and keeps the chunks retrieved so far (the evidence) together
+with the embedding of every question asked. Before searching, ``plan``
+makes a cheap check:
+
+* **reuse** — the question is nearly the same as an earlier one (cosine of
+  question embeddings), or its terms are already covered by the evidence
+  and it is still on the same topic; the evidence is reranked for the new
+  question and no search is made;
+* **rewrite** — a short or referring follow-up; the search query is the
+  follow-up plus the last question that was searched, so the subject
+  carries over;
+* **search** — anything else is searched as asked.
+
+Evidence only answers questions about the source it came from, so pages
+``bind`` the memory to their search service and retriever; changing either
+clears it. Comparing questions needs their embeddings: ``query_embedder``
+shares the local retrievers' query cache, so with a local retriever the
+search reuses the embedding, while Cortex Search turns add one
+``EMBED_TEXT_768`` call per new question.
+"""
+
+import re
+
+import numpy as np
+
+from rag_utils.bm25 import tokenize
+from rag_utils.embedding import EMBED_MODEL
+from rag_utils.embedding_cache import embed_with_cache
+from rag_utils.rerank import rerank
+
+# Question embeddings at least this close are treated as the same question
+REUSE_SIMILARITY = 0.9
+# A question whose terms the evidence covers is reused if at least this close
+RELATED_SIMILARITY = 0.75
+REUSE_COVERAGE = 0.8
+
+MAX_EVIDENCE = 24
+MAX_TURNS = 6
+
+_FOLLOW_UP = re.compile(r"^\s*(?:and|but|also|so|then|what about|how about|what of)\b|"
+                        r"\b(?:it|its|they|them|their|those|these|that one|this one|the same)\b", re.IGNORECASE)
+_QUESTION_WORDS = frozenset("""
+what how which why where when who whom whose about any can could would should tell more give much many
+please also else other others one ones like
+""".split())
+
+
+def content_terms(text):
+    """Query terms of ``text`` without stopwords or question words."""
+    return {term for term in tokenize(text) if term not in _QUESTION_WORDS}
+
+
+def query_embedder(session, cache, model=EMBED_MODEL):
+    """``embed(text)`` for questions, through an ``EmbeddingCache``."""
+    from snowflake.cortex import embed_text_768
+
+    def embed(text):
+        return embed_with_cache(None, cache, [text],
+                                lambda texts: [embed_text_768(model=model, text=t, session=session)
+                                               for t in texts])[0]
+    return embed
+
+
+def _cosine(a, b):
+    norm = np.linalg.norm(a) * np.linalg.norm(b)
+    return float(np.dot(a, b) / norm) if norm else 0.0
+
+
+class ConversationMemory:
+    """Evidence and question embeddings of one chat, with reuse counters."""
+
+    def __init__(self, max_evidence=MAX_EVIDENCE, max_turns=MAX_TURNS):
+        self.max_evidence = max_evidence
+        self.max_turns = max_turns
+        self.source = None
+        self.clear()
+
+    def bind(self, source):
+        """Tie the memory to ``source`` (e.g. service and retriever); returns ``True`` if that cleared it."""
+        if source == self.source:
+            return False
+        changed = self.source is not None
+        self.source = source
+        self.clear()
+        return changed
+
+    def clear(self):
+        self.turns = []
+        self.evidence = []
+        self.searches = 0
+        self.reuses = 0
+
+    def plan(self, question, vector=None):
+        """Decide how to retrieve for ``question``: ``{"action", "query", "similarity", "coverage"}``."""
+        terms = content_terms(question)
+        decision = {"action": "search", "query": question, "similarity": None, "coverage": 0.0}
+        if not self.evidence:
+            return decision
+
+        if vector is not None:
+            similarities = [_cosine(vector, turn["vector"]) for turn in self.turns if turn["vector"] is not None]
+            decision["similarity"] = max(similarities, default=None)
+        if terms:
+            covered = set()
+            for chunk in self.evidence:
+                covered.update(terms.intersection(tokenize(chunk["text"])))
+            decision["coverage"] = len(covered) / len(terms)
+
+        similarity = decision["similarity"]
+        if similarity is not None and similarity >= REUSE_SIMILARITY:
+            decision["action"] = "reuse"
+        elif decision["coverage"] >= REUSE_COVERAGE and (similarity is None or similarity >= RELATED_SIMILARITY):
+            decision["action"] = "reuse"
+        elif _FOLLOW_UP.search(question) or len(terms) <= 2:
+            # The last question that was searched for carries the subject
+            last = next((turn["question"] for turn in reversed(self.turns) if turn["searched"]), None)
+            if last:
+                decision["action"] = "rewrite"
+                decision["query"] = f"{question} {last}"
+        return decision
+
+    def retrieve(self, question, search, limit, embed=None):
+        """Chunks for ``question``: from the evidence, or ``search(query, limit)``.
+
+        ``search`` returns chunk dicts with ``text`` (and ``source``/``score``);
+        ``embed`` maps a question to its vector and may be ``None`` to decide
+        on term coverage alone. Returns ``(chunks, decision)``.
+        """
+        vector = None
+        if embed is not None:
+            try:
+                vector = np.asarray(embed(question), dtype=np.float32)
+            except Exception:
+                vector = None
+        decision = self.plan(question, vector)
+
+        if decision["action"] == "reuse":
+            results = rerank(question, [{**chunk, "SCORE": None} for chunk in self.evidence], limit,
+                             text_column="text")
+            chunks = [{"text": result["text"], "source": result.get("source"), "score": result["RERANK_SCORE"]}
+                      for result in results]
+            self.reuses += 1
+        else:
+            chunks = search(decision["query"], limit)
+            self._remember(chunks)
+            self.searches += 1
+
+        self.turns.append({"question": question, "vector": vector, "searched": decision["action"] != "reuse"})
+        del self.turns[:-self.max_turns]
+        return chunks, decision
+
+    def _remember(self, chunks):
+        # Newest evidence first; a chunk seen again moves to the front
+        texts = {chunk["text"] for chunk in chunks}
+        self.evidence = list(chunks) + [chunk for chunk in self.evidence if chunk["text"] not in texts]
+        del self.evidence[self.max_evidence:]
@@ -0,0 +1,227 @@
+"""Embedding generation and storage for Day 18.
+
+``embed_in_warehouse_sql`` embeds a whole chunk table with one set-based
+``INSERT ... SELECT SNOWFLAKE.CORTEX.EMBED_TEXT_768(...)``: the warehouse
+parallelises the calls and no vectors round-trip through the app.
+
+Every embedding row stores the TEXT_HASH of the chunk text it was computed
+from. Day 17's CHUNK_IDs are positional (``DOC_ID * stride + position``), so
+re-chunking with another strategy reuses IDs for different text;
+``stale_embeddings_sql`` deletes rows whose chunk is gone or whose text
+changed, and the "only missing" filter then picks those chunks up again.
+
+``save_embeddings`` persists vectors computed client-side in bulk: they are
+uploaded with ``write_pandas`` into a temporary staging table, one JSON array
+string per vector, and converted with ``PARSE_JSON(...)::VECTOR(FLOAT, 768)``
+in one ``INSERT ... SELECT``. A JSON array is the documented input for that
+cast; a Parquet LIST column may land as a nested object rather than a plain
+ARRAY, depending on the connector.
+
+``embed_concurrently`` is the client path for deployments without pushdown:
+a thread pool keeps a bounded number of embedding calls in flight and
+assembles results in input order.
+"""
+
+import hashlib
+import re
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+EMBED_MODEL = "snowflake-arctic-embed-m"
+EMBED_DIM = 768
+
+# Python and SQL normalisation must agree: collapse ASCII whitespace runs
+# ([[:space:]] in Snowflake) to one space and trim the ends
+_WHITESPACE = re.compile(r"[ \t\n\r\f\v]+")
+
+
+def normalize_text(text):
+    return _WHITESPACE.sub(" ", text or "").strip(" ")
+
+
+def text_hash(text):
+    return hashlib.sha256(normalize_text(text).encode("utf-8")).hexdigest()
+
+
+def normalized_hash_sql(column):
+    """SQL expression matching ``text_hash`` for a VARCHAR column."""
+    return f"SHA2(TRIM(REGEXP_REPLACE(COALESCE({column}, ''), '[[:space:]]+', ' '), ' '), 256)"
+
+
+def embeddings_table_sql(table, replace=False):
+    create = "CREATE OR REPLACE TABLE" if replace else "CREATE TABLE IF NOT EXISTS"
+    return f"""
+    {create} {table} (
+        CHUNK_ID NUMBER,
+        EMBEDDING VECTOR(FLOAT, {EMBED_DIM}),
+        TEXT_HASH VARCHAR,
+        CREATED_TIMESTAMP TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
+    )
+    """
+
+
+def prepare_embeddings_table(session, embedding_table, chunk_table, replace=False):
+    """Create (or replace) the embeddings table and drop stale rows; returns the rows deleted.
+
+    Tables created before TEXT_HASH was stored get the column; their rows
+    have no hash, count as stale and are re-embedded once.
+    """
+    session.sql(embeddings_table_sql(embedding_table, replace=replace)).collect()
+    if replace:
+        return 0
+    session.sql(f"ALTER TABLE {embedding_table} ADD COLUMN IF NOT EXISTS TEXT_HASH VARCHAR").collect()
+    rows = session.sql(stale_embeddings_sql(chunk_table, embedding_table)).collect()
+    return rows[0][0] if rows else 0
+
+
+def stale_embeddings_sql(chunk_table, embedding_table):
+    """Delete embeddings whose chunk no longer exists or now has different text."""
+    return f"""
+    DELETE FROM {embedding_table} e
+    WHERE NOT EXISTS (
+        SELECT 1 FROM {chunk_table} c
+        WHERE c.CHUNK_ID = e.CHUNK_ID AND {normalized_hash_sql("c.CHUNK_TEXT")} = e.TEXT_HASH
+    )
+    """
+
+
+def missing_chunks_filter(embedding_table):
+    """Predicate on chunk alias ``c`` for chunks without an embedding of their current text."""
+    return (f"NOT EXISTS (SELECT 1 FROM {embedding_table} e WHERE e.CHUNK_ID = c.CHUNK_ID "
+            f"AND e.TEXT_HASH = {normalized_hash_sql('c.CHUNK_TEXT')})")
+
+
+def embed_in_warehouse_sql(chunk_table, embedding_table, model=EMBED_MODEL, only_missing=True):
+    """Embed every chunk of ``chunk_table`` into ``embedding_table`` in one statement.
+
+    With ``only_missing`` the statement skips chunk IDs that already have an
+    embedding, so re-running it after an incremental Day 17 load only pays
+    for the new chunks.
+    """
+    missing = f"\n    WHERE {missing_chunks_filter(embedding_table)}" if only_missing else ""
+    return f"""
+    INSERT INTO {embedding_table} (CHUNK_ID, EMBEDDING, TEXT_HASH)
+    SELECT
+        c.CHUNK_ID,
+        SNOWFLAKE.CORTEX.EMBED_TEXT_768('{model}', c.CHUNK_TEXT),
+        {normalized_hash_sql("c.CHUNK_TEXT")}
+    FROM {chunk_table} c{missing}
+    """
+
+
+def vector_json(matrix):
+    """JSON array strings for the rows of ``matrix``.
+
+    Nine significant digits always read back to the same float32, so
+    ``PARSE_JSON(...)::VECTOR(FLOAT, ...)`` is lossless. Each row is
+    formatted by a single ``%`` operation, in C, rather than float by float.
+    """
+    matrix = np.atleast_2d(np.asarray(matrix, dtype=np.float32))
+    row_format = "[" + ",".join(["%.9g"] * matrix.shape[1]) + "]"
+    return [row_format % tuple(row) for row in matrix.tolist()]
+
+
+def staged_vector_sql(column):
+    """SQL converting a ``staged_vectors`` EMBEDDING column to ``VECTOR(FLOAT, 768)``."""
+    return f"PARSE_JSON({column})::VECTOR(FLOAT, {EMBED_DIM})"
+
+
+@contextmanager
+def staged_vectors(session, database, schema, name, keys, vectors, chunk_rows=50000):
+    """Upload ``vectors`` plus key columns to a temporary table; yields its name.
+
+    ``keys`` maps column name to ``(sql_type, values)``. EMBEDDING holds each
+    vector as a JSON array string (``vector_json``); the table is dropped on
+    exit, so callers convert it with ``staged_vector_sql`` into their target
+    inside the ``with`` block.
+    """
+    matrix = np.asarray(vectors, dtype=np.float32).reshape(-1, EMBED_DIM)
+    full_name = f"{database}.{schema}.{name}"
+    columns = ", ".join(f"{column} {sql_type}" for column, (sql_type, _) in keys.items())
+    session.sql(f"CREATE OR REPLACE TEMPORARY TABLE {full_name} ({columns}, EMBEDDING VARCHAR)").collect()
+    try:
+        frame = pd.DataFrame({column: values for column, (_, values) in keys.items()})
+        frame["EMBEDDING"] = vector_json(matrix)
+        session.write_pandas(frame, table_name=name, database=database, schema=schema,
+                             chunk_size=chunk_rows, overwrite=False)
+        yield full_name
+    finally:
+        session.sql(f"DROP TABLE IF EXISTS {full_name}").collect()
+
+
+def save_embeddings(session, chunk_ids, vectors, table, database, schema, text_hashes, chunk_rows=50000):
+    """Bulk-write ``vectors`` for ``chunk_ids`` into ``database.schema.table``.
+
+    ``text_hashes`` are the ``text_hash`` of each chunk's text. Returns the
+    number of rows inserted. The vectors travel as bound data in
+    ``chunk_rows``-row pieces; nothing is formatted into the SQL text.
+    """
+    keys = {"CHUNK_ID": ("NUMBER", np.asarray(chunk_ids, dtype=np.int64)),
+            "TEXT_HASH": ("VARCHAR", list(text_hashes))}
+    with staged_vectors(session, database, schema, f"{table}_STAGING", keys, vectors, chunk_rows) as staging:
+        result = session.sql(f"""
+        INSERT INTO {database}.{schema}.{table} (CHUNK_ID, EMBEDDING, TEXT_HASH)
+        SELECT CHUNK_ID, {staged_vector_sql("EMBEDDING")}, TEXT_HASH
+        FROM {staging}
+        """).collect()
+    return result[0][0] if result else 0
+
+
+class EmbeddingBatchError(RuntimeError):
+    """An embedding call failed; ``results`` holds every vector finished before it.
+
+    ``results`` is aligned with the input texts, with ``None`` for texts that
+    were not embedded.
+    """
+
+    def __init__(self, cause, results):
+        super().__init__(str(cause))
+        self.cause = cause
+        self.results = results
+
+    @property
+    def completed(self):
+        return sum(r is not None for r in self.results)
+
+
+def embed_concurrently(texts, embed_fn, max_in_flight=8, on_complete=None):
+    """Embed ``texts`` with at most ``max_in_flight`` concurrent ``embed_fn`` calls.
+
+    Results come back in input order. ``on_complete(done, total)`` is called
+    from the calling thread after every finished call, so it can drive
+    Streamlit progress widgets. On the first failure no new calls are
+    submitted, in-flight ones are drained, and ``EmbeddingBatchError`` is
+    raised carrying the partial results.
+    """
+    total = len(texts)
+    results = [None] * total
+    if not total:
+        return results
+
+    done = 0
+    error = None
+    pending = {}
+    next_index = 0
+    with ThreadPoolExecutor(max_workers=max(1, min(max_in_flight, total))) as pool:
+        while pending or (next_index < total and error is None):
+            while error is None and next_index < total and len(pending) < max_in_flight:
+                pending[pool.submit(embed_fn, texts[next_index])] = next_index
+                next_index += 1
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in finished:
+                index = pending.pop(future)
+                try:
+                    results[index] = future.result()
+                except Exception as exc:
+                    error = error or exc
+                    continue
+                done += 1
+                if on_complete is not None:
+                    on_complete(done, total)
+
+    if error is not None:
+        raise EmbeddingBatchError(error, results)
+    return results
@@ -0,0 +1,220 @@
+"""Content-addressed embedding cache for Day 18.
+
+Embeddings are keyed by ``(model, sha256(normalized text))``: identical
+chunk text (a replace-mode reload of the same reviews, duplicate reviews)
+is embedded once. The cache has two tiers, a process-local LRU and the
+EMBEDDING_CACHE table in Snowflake, and the in-warehouse path uses the same
+keys through ``normalized_hash_sql`` so both paths share one table.
+"""
+
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from rag_utils.embedding import (EMBED_DIM, EMBED_MODEL, EmbeddingBatchError, normalized_hash_sql, staged_vector_sql,
+                                 staged_vectors, text_hash)
+
+CACHE_TABLE = "EMBEDDING_CACHE"
+
+_LOOKUP_BATCH = 1000
+
+
+def cache_table_sql(table):
+    return f"""
+    CREATE TABLE IF NOT EXISTS {table} (
+        MODEL VARCHAR,
+        TEXT_HASH VARCHAR,
+        EMBEDDING VECTOR(FLOAT, {EMBED_DIM}),
+        CREATED_TIMESTAMP TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
+    )
+    """
+
+
+class CacheStats:
+    """Hit and miss counts for one caller's lookups (e.g. one Day 18 run)."""
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class EmbeddingCache:
+    """Two-tier ``(model, text hash) -> vector`` cache.
+
+    ``get_many`` and ``put_many`` work on whole batches: local hits are served
+    from memory, the rest are looked up in ``table`` with a few ``IN`` queries,
+    and new vectors are merged in by hash. Without a ``table`` only the local
+    tier is used. The instance is shared across sessions, so its ``hits`` and
+    ``misses`` are process-wide totals; pass a ``CacheStats`` to ``get_many``
+    (or ``embed_with_cache``) for the counts of one run.
+    """
+
+    def __init__(self, table=None, database=None, schema=None, model=EMBED_MODEL, max_entries=100000):
+        self.table = table
+        self.database = database
+        self.schema = schema
+        self.model = model
+        self.max_entries = max_entries
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def full_table(self):
+        return f"{self.database}.{self.schema}.{self.table}"
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = self.misses = 0
+
+    def _remember(self, key, vector):
+        with self._lock:
+            self._local[key] = vector
+            self._local.move_to_end(key)
+            while len(self._local) > self.max_entries:
+                self._local.popitem(last=False)
+
+    def get_many(self, session, hashes, stats=None):
+        """Return ``{hash: vector}`` for every cached hash in ``hashes``.
+
+        Hits and misses are also added to ``stats`` when given.
+        """
+        found = {}
+        remote = []
+        with self._lock:
+            for h in dict.fromkeys(hashes):
+                vector = self._local.get(h)
+                if vector is None:
+                    remote.append(h)
+                else:
+                    self._local.move_to_end(h)
+                    found[h] = vector
+
+        if remote and session is not None and self.table:
+            for start in range(0, len(remote), _LOOKUP_BATCH):
+                in_list = ", ".join(f"'{h}'" for h in remote[start:start + _LOOKUP_BATCH])
+                rows = session.sql(f"""
+                SELECT TEXT_HASH, EMBEDDING FROM {self.full_table}
+                WHERE MODEL = '{self.model}' AND TEXT_HASH IN ({in_list})
+                """).collect()
+                for row in rows:
+                    vector = np.asarray(row["EMBEDDING"], dtype=np.float32)
+                    found[row["TEXT_HASH"]] = vector
+                    self._remember(row["TEXT_HASH"], vector)
+
+        hits = sum(1 for h in hashes if h in found)
+        with self._lock:
+            self.hits += hits
+            self.misses += len(hashes) - hits
+        if stats is not None:
+            stats.hits += hits
+            stats.misses += len(hashes) - hits
+        return found
+
+    def put_many(self, session, hashes, vectors):
+        """Store newly computed vectors locally and in the cache table.
+
+        Two sessions can embed the same text at once, so rows are merged on
+        ``(MODEL, TEXT_HASH)`` rather than appended.
+        """
+        if not len(hashes):
+            return
+        for h, vector in zip(hashes, vectors):
+            self._remember(h, np.asarray(vector, dtype=np.float32))
+        if session is None or not self.table:
+            return
+        keys = {"TEXT_HASH": ("VARCHAR", list(hashes))}
+        with staged_vectors(session, self.database, self.schema, f"{self.table}_STAGING", keys, vectors) as staging:
+            session.sql(f"""
+            MERGE INTO {self.full_table} k
+            USING (
+                SELECT TEXT_HASH, EMBEDDING FROM {staging}
+                QUALIFY ROW_NUMBER() OVER (PARTITION BY TEXT_HASH ORDER BY TEXT_HASH) = 1
+            ) s
+            ON k.MODEL = '{self.model}' AND k.TEXT_HASH = s.TEXT_HASH
+            WHEN NOT MATCHED THEN INSERT (MODEL, TEXT_HASH, EMBEDDING)
+                VALUES ('{self.model}', s.TEXT_HASH, {staged_vector_sql("s.EMBEDDING")})
+            """).collect()
+
+
+def embed_with_cache(session, cache, texts, embed_many, stats=None):
+    """Embed ``texts``, sending only cache misses (deduplicated) to ``embed_many``.
+
+    ``embed_many`` takes a list of texts and returns their vectors in order
+    (e.g. ``embed_concurrently``). Returns one float32 vector per input text;
+    lookups are counted in ``stats`` (a ``CacheStats``) when given.
+    If it raises ``EmbeddingBatchError``, the vectors it did finish are cached
+    and the error is re-raised with partial results aligned to ``texts``.
+    """
+    hashes = [text_hash(t) for t in texts]
+    found = cache.get_many(session, hashes, stats)
+
+    misses = {}
+    for h, text in zip(hashes, texts):
+        if h not in found and h not in misses:
+            misses[h] = text
+    if misses:
+        try:
+            new_vectors = embed_many(list(misses.values()))
+        except EmbeddingBatchError as exc:
+            finished = [(h, v) for h, v in zip(misses, exc.results) if v is not None]
+            cache.put_many(session, [h for h, _ in finished], [v for _, v in finished])
+            found.update(finished)
+            raise EmbeddingBatchError(exc.cause, [found.get(h) for h in hashes]) from exc
+        new_vectors = [np.asarray(v, dtype=np.float32) for v in new_vectors]
+        cache.put_many(session, list(misses), new_vectors)
+        found.update(zip(misses, new_vectors))
+    return [found[h] for h in hashes]
+
+
+def fill_cache_sql(chunk_table, cache_table, model=EMBED_MODEL, chunk_filter=None):
+    """Embed, inside the warehouse, each distinct chunk text not yet in the cache.
+
+    The row count of the MERGE is the number of model calls made; like
+    ``put_many`` it merges on the hash so concurrent fills cannot duplicate it.
+    """
+    text_hash_expr = normalized_hash_sql("c.CHUNK_TEXT")
+    return f"""
+    MERGE INTO {cache_table} k
+    USING (
+        SELECT {text_hash_expr} AS TEXT_HASH, ANY_VALUE(c.CHUNK_TEXT) AS CHUNK_TEXT
+        FROM {chunk_table} c
+        {f"WHERE {chunk_filter}" if chunk_filter else ""}
+        GROUP BY 1
+    ) t
+    ON k.MODEL = '{model}' AND k.TEXT_HASH = t.TEXT_HASH
+    WHEN NOT MATCHED THEN INSERT (MODEL, TEXT_HASH, EMBEDDING)
+        VALUES ('{model}', t.TEXT_HASH, SNOWFLAKE.CORTEX.EMBED_TEXT_768('{model}', t.CHUNK_TEXT))
+    """
+
+
+def embed_from_cache_sql(chunk_table, embedding_table, cache_table, model=EMBED_MODEL, chunk_filter=None):
+    """Write chunk embeddings by joining chunks to the cache on their text hash.
+
+    The cache side keeps one row per hash, so duplicates left by older
+    inserts cannot multiply chunk rows.
+    """
+    return f"""
+    INSERT INTO {embedding_table} (CHUNK_ID, EMBEDDING, TEXT_HASH)
+    SELECT c.CHUNK_ID, k.EMBEDDING, k.TEXT_HASH
+    FROM {chunk_table} c
+    JOIN (
+        SELECT TEXT_HASH, EMBEDDING FROM {cache_table}
+        WHERE MODEL = '{model}'
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY TEXT_HASH ORDER BY CREATED_TIMESTAMP) = 1
+    ) k
+        ON k.TEXT_HASH = {normalized_hash_sql("c.CHUNK_TEXT")}
+    {f"WHERE {chunk_filter}" if chunk_filter else ""}
+    """
@@ -0,0 +1,41 @@
+"""Streaming answer generation for the RAG pages (Days 21-22).
+
+``SELECT SNOWFLAKE.CORTEX.COMPLETE(...)`` returns only once the whole answer
+exists. ``stream_complete`` calls ``snowflake.cortex.complete`` with
+``stream=True`` instead and wraps the token stream in a ``TimedStream``, which
+``st.write_stream`` renders as the tokens arrive while the wrapper records
+time to first token and total generation time.
+"""
+
+import time
+
+
+class TimedStream:
+    """Iterable over a token stream that times the first and last token."""
+
+    def __init__(self, chunks, start=None):
+        self._chunks = chunks
+        self.start = start if start is not None else time.perf_counter()
+        self.first_token_ms = None
+        self.total_ms = None
+
+    def __iter__(self):
+        for chunk in self._chunks:
+            if self.first_token_ms is None and chunk:
+                self.first_token_ms = (time.perf_counter() - self.start) * 1000
+            yield chunk
+        self.total_ms = (time.perf_counter() - self.start) * 1000
+
+    def summary(self):
+        if self.first_token_ms is None:
+            return "no tokens received"
+        total = f", {self.total_ms:,.0f} ms total" if self.total_ms is not None else ""
+        return f"first token {self.first_token_ms:,.0f} ms{total}"
+
+
+def stream_complete(session, model, prompt):
+    """Start a streaming COMPLETE call; returns a ``TimedStream`` of text chunks."""
+    from snowflake.cortex import complete
+
+    start = time.perf_counter()
+    return TimedStream(complete(model, prompt, session=session, stream=True), start)
@@ -0,0 +1,28 @@
+"""Bounded, batch-at-a-time reads from Snowflake tables.
+
+Days 17 and 18 stream their source tables through ``iter_batches`` instead
+of materialising the whole corpus with ``to_pandas()``; only a small
+preview sample and summary statistics are kept in session state.
+"""
+
+
+def iter_batches(session, query, batch_rows=5000):
+    """Yield pandas frames of at most ``batch_rows`` rows for ``query``.
+
+    Rows arrive as the connector's Arrow result batches and are re-sliced so
+    a single large result chunk never exceeds ``batch_rows`` downstream.
+    """
+    for batch in session.sql(query).to_pandas_batches():
+        for start in range(0, len(batch), batch_rows):
+            yield batch.iloc[start:start + batch_rows].reset_index(drop=True)
+
+
+def fetch_preview(session, query, limit=100):
+    """Return the first ``limit`` rows of ``query`` as a pandas frame."""
+    return session.sql(f"SELECT * FROM ({query}) LIMIT {int(limit)}").to_pandas()
+
+
+def fetch_one(session, query):
+    """Return the single row of an aggregate query as a dict."""
+    rows = session.sql(query).collect()
+    return rows[0].as_dict() if rows else {}
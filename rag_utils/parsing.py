@@ -0,0 +1,251 @@
+"""Document parsing backends for Day 16.
+
+Every backend follows the same flow: upload the raw files once, submit a
+single parse job for the whole batch, then poll the job until it is done.
+
+- ``SnowflakeParseBackend`` stages the files and parses them inside Snowflake
+  with ``SNOWFLAKE.CORTEX.PARSE_DOCUMENT`` over the stage's directory table,
+  in one set-based ``INSERT ... SELECT``. PARSE_DOCUMENT only reads
+  documents, so TXT and Markdown files are decoded client-side at upload
+  and bound into the same statement.
+- ``LocalParseBackend`` is an in-process stand-in (pypdf on a thread pool)
+  that runs through the same ``run_parse`` path without a warehouse.
+"""
+
+import io
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+FILE_TYPES = {".txt": "TXT", ".md": "Markdown", ".pdf": "PDF"}
+
+# Parsed server-side by PARSE_DOCUMENT; plain-text types are read client-side
+DOCUMENT_EXTENSIONS = (".pdf",)
+TEXT_EXTENSIONS = (".txt", ".md")
+
+
+def detect_file_type(file_name):
+    """Map a file name to the FILE_TYPE label stored by Day 16."""
+    for extension, file_type in FILE_TYPES.items():
+        if file_name.lower().endswith(extension):
+            return file_type
+    return "Unknown"
+
+
+def extract_text(file_name, data):
+    """Extract text from raw file bytes in-process (TXT, Markdown, PDF)."""
+    if file_name.lower().endswith(TEXT_EXTENSIONS):
+        return data.decode("utf-8")
+    if file_name.lower().endswith(".pdf"):
+        from pypdf import PdfReader
+
+        pdf_reader = PdfReader(io.BytesIO(data))
+        extracted_text = ""
+        for page in pdf_reader.pages:
+            page_text = page.extract_text()
+            if page_text:
+                extracted_text += page_text + "\n\n"
+        return extracted_text
+    return ""
+
+
+def _sql_string(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+class SnowflakeParseJob:
+    """Polling handle for the single server-side parse statement."""
+
+    def __init__(self, async_job, total):
+        self.async_job = async_job
+        self.total = total
+        self.started_at = time.time()
+
+    def is_done(self):
+        return self.async_job.is_done()
+
+    def progress(self):
+        # One statement parses every file, so there is no per-file progress
+        return 1.0 if self.is_done() else 0.0
+
+    def elapsed(self):
+        return time.time() - self.started_at
+
+    def result(self):
+        rows = self.async_job.result()
+        parsed = int(rows[0][0]) if rows else 0
+        return {"parsed": parsed, "failed": self.total - parsed}
+
+
+class SnowflakeParseBackend:
+    """Parse staged files inside Snowflake with Cortex PARSE_DOCUMENT."""
+
+    def __init__(self, session, stage, mode="OCR"):
+        self.session = session
+        self.stage = stage
+        self.mode = mode
+        # file name -> (text, size) for files PARSE_DOCUMENT cannot read
+        self.texts = {}
+
+    def prepare(self):
+        # PARSE_DOCUMENT needs a directory table and server-side encryption
+        self.session.sql(f"""
+            CREATE STAGE IF NOT EXISTS {self.stage}
+                DIRECTORY = ( ENABLE = true )
+                ENCRYPTION = ( TYPE = 'SNOWFLAKE_SSE' )
+        """).collect()
+
+    def upload(self, file_name, data):
+        self.session.file.put_stream(
+            io.BytesIO(data),
+            f"@{self.stage}/{file_name}",
+            auto_compress=False,
+            overwrite=True,
+        )
+        if file_name.lower().endswith(TEXT_EXTENSIONS):
+            self.texts[file_name] = (extract_text(file_name, data), len(data))
+
+    def build_parse_sql(self, file_names, target_table):
+        """The ``INSERT ... SELECT`` for ``file_names`` and its bind parameters.
+
+        Documents are parsed from the directory table; uploaded text files
+        are bound as a VALUES list. Other files are skipped.
+        """
+        documents = [name for name in file_names if name.lower().endswith(DOCUMENT_EXTENSIONS)]
+        in_list = ", ".join(_sql_string(name) for name in documents) or "NULL"
+        document_filter = " OR ".join(f"LOWER(RELATIVE_PATH) LIKE '%{extension}'"
+                                      for extension in DOCUMENT_EXTENSIONS)
+        texts = [name for name in file_names if name in self.texts]
+        params = []
+        text_source = ""
+        if texts:
+            text_source = f"""
+            UNION ALL
+            SELECT COLUMN1, COLUMN2, COLUMN3
+            FROM VALUES {", ".join("(?, ?, ?)" for _ in texts)}"""
+            for name in texts:
+                text, size = self.texts[name]
+                params += [name, size, text]
+        return f"""
+        INSERT INTO {target_table}
+            (FILE_NAME, FILE_TYPE, FILE_SIZE, EXTRACTED_TEXT, WORD_COUNT, CHAR_COUNT)
+        SELECT
+            FILE_NAME,
+            CASE
+                WHEN LOWER(FILE_NAME) LIKE '%.pdf' THEN 'PDF'
+                WHEN LOWER(FILE_NAME) LIKE '%.md' THEN 'Markdown'
+                WHEN LOWER(FILE_NAME) LIKE '%.txt' THEN 'TXT'
+                ELSE 'Unknown'
+            END,
+            FILE_SIZE,
+            EXTRACTED_TEXT,
+            REGEXP_COUNT(EXTRACTED_TEXT, '[^[:space:]]+'),
+            LENGTH(EXTRACTED_TEXT)
+        FROM (
+            SELECT
+                RELATIVE_PATH AS FILE_NAME,
+                SIZE AS FILE_SIZE,
+                SNOWFLAKE.CORTEX.PARSE_DOCUMENT(
+                    @{self.stage}, RELATIVE_PATH, {{'mode': '{self.mode}'}}
+                ):content::VARCHAR AS EXTRACTED_TEXT
+            FROM DIRECTORY(@{self.stage})
+            WHERE RELATIVE_PATH IN ({in_list})
+              AND ({document_filter}){text_source}
+        )
+        WHERE EXTRACTED_TEXT IS NOT NULL AND TRIM(EXTRACTED_TEXT) <> ''
+        """, params
+
+    def submit(self, file_names, target_table):
+        self.session.sql(f"ALTER STAGE {self.stage} REFRESH").collect()
+        query, params = self.build_parse_sql(file_names, target_table)
+        async_job = self.session.sql(query, params=params or None).collect_nowait()
+        return SnowflakeParseJob(async_job, len(file_names))
+
+
+class LocalParseJob:
+    """Polling handle for the in-process stand-in backend."""
+
+    def __init__(self, futures):
+        self.futures = futures
+        self.total = len(futures)
+        self.started_at = time.time()
+
+    def is_done(self):
+        return all(f.done() for f in self.futures)
+
+    def progress(self):
+        if not self.total:
+            return 1.0
+        return sum(f.done() for f in self.futures) / self.total
+
+    def elapsed(self):
+        return time.time() - self.started_at
+
+    def result(self):
+        parsed = sum(1 for f in self.futures if f.exception() is None and f.result())
+        return {"parsed": parsed, "failed": self.total - parsed}
+
+
+class LocalParseBackend:
+    """In-process stand-in for ``SnowflakeParseBackend``.
+
+    Files are "staged" in memory and parsed with pypdf on a thread pool;
+    parsed rows are appended to ``tables[target_table]`` with the same
+    columns the server-side statement writes.
+    """
+
+    def __init__(self, max_workers=4):
+        self.max_workers = max_workers
+        self.stage = {}
+        self.tables = {}
+
+    def prepare(self):
+        pass
+
+    def upload(self, file_name, data):
+        self.stage[file_name] = bytes(data)
+
+    def _parse_one(self, file_name, target_table):
+        data = self.stage[file_name]
+        extracted_text = extract_text(file_name, data)
+        if not extracted_text.strip():
+            return False
+        self.tables.setdefault(target_table, []).append({
+            "FILE_NAME": file_name,
+            "FILE_TYPE": detect_file_type(file_name),
+            "FILE_SIZE": len(data),
+            "EXTRACTED_TEXT": extracted_text,
+            "WORD_COUNT": len(extracted_text.split()),
+            "CHAR_COUNT": len(extracted_text),
+        })
+        return True
+
+    def submit(self, file_names, target_table):
+        executor = ThreadPoolExecutor(max_workers=self.max_workers)
+        futures = [executor.submit(self._parse_one, name, target_table) for name in file_names]
+        executor.shutdown(wait=False)
+        return LocalParseJob(futures)
+
+
+def run_parse(backend, files, target_table, on_upload=None):
+    """Upload ``(file_name, data)`` pairs once and submit one parse job.
+
+    ``on_upload(index, file_name)`` is called after each upload so the UI can
+    report staging progress. Returns the job handle to poll.
+    """
+    backend.prepare()
+    file_names = []
+    for idx, (file_name, data) in enumerate(files, 1):
+        backend.upload(file_name, data)
+        file_names.append(file_name)
+        if on_upload:
+            on_upload(idx, file_name)
+    return backend.submit(file_names, target_table)
+
+
+def wait_for_job(job, on_poll=None, poll_interval=1.0):
+    """Block until ``job`` finishes, calling ``on_poll(job)`` between polls."""
+    while not job.is_done():
+        if on_poll:
+            on_poll(job)
+        time.sleep(poll_interval)
+    return job.result()
@@ -0,0 +1,287 @@
+"""Precomputed answers for the questions users ask first (Days 21, 23, 27).
+
+Day 21's default question, Day 23's default evaluation questions and Day
+27's example questions are what most people click first, and each click ran
+retrieval and generation from scratch. ``AnswerStore`` keeps answers to a
+list of canonical questions in a ``PRECOMPUTED_ANSWERS`` table, keyed by
+scope (the account and role the answer was computed with), pipeline (which
+page's prompt and steps produced it), target (search service or agent),
+model and normalised question. Every row carries the answer, page-specific
+details (source chunks, agent tool output) and a freshness stamp: for a
+Cortex Search service, the data timestamp of its last refresh (``DESCRIBE
+CORTEX SEARCH SERVICE``), since the service serves that snapshot until its
+next refresh; for tables, their last commit time
+(``SYSTEM$LAST_CHANGE_COMMIT_TIME``).
+
+Pages serve a stored answer immediately. ``ensure_fresh`` compares the
+stamps with the current data (at most every ``VERSION_CHECK_INTERVAL``
+seconds) and recomputes missing or stale answers on a background thread
+with the visitor's session, so the next visitor with the same account and
+role gets the refreshed answer without waiting. A failed refresh is kept
+in ``errors`` for the page to show.
+"""
+
+import json
+import threading
+import time
+
+from rag_utils.context import context_budget, pack_context
+from rag_utils.embedding import normalize_text, text_hash
+from rag_utils.rerank import RERANK_OVERFETCH, rerank
+from rag_utils.retrieval import (concurrent_search, connection_scope, decompose_question, fuse_results,
+                                 parse_service_path)
+
+ANSWER_TABLE = "PRECOMPUTED_ANSWERS"
+DEFAULT_ANSWER_TABLE = f"RAG_DB.RAG_SCHEMA.{ANSWER_TABLE}"
+
+# How often the sources' freshness stamps are re-read
+VERSION_CHECK_INTERVAL = 60
+
+RAG_PROMPT = """You are a helpful assistant. Answer the user's question based ONLY on the provided context.
+If the context doesn't contain enough information to answer, say "I don't have enough information to answer that based on the available documents."
+
+CONTEXT FROM DOCUMENTS:
+{context}
+
+USER QUESTION: {question}
+
+Provide a clear, accurate answer based on the context. If you use information from the context, mention it naturally."""
+
+
+def answer_table_sql(table):
+    return f"""
+    CREATE TABLE IF NOT EXISTS {table} (
+        SCOPE VARCHAR,
+        PIPELINE VARCHAR,
+        TARGET VARCHAR,
+        MODEL VARCHAR,
+        QUESTION_HASH VARCHAR,
+        QUESTION VARCHAR,
+        ANSWER VARCHAR,
+        DETAILS VARIANT,
+        SOURCE_VERSION VARCHAR,
+        COMPUTED_AT TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
+    )
+    """
+
+
+def question_hash(question):
+    return text_hash(normalize_text(question).casefold())
+
+
+def answer_scope(session):
+    """Scope answers are stored under: the session's account and role."""
+    account, _, role = connection_scope(session)[:3]
+    return f"{account}/{role}"
+
+
+def service_version(session, service_path):
+    """Freshness stamp of a Cortex Search service: the data timestamp of its last refresh."""
+    database, schema, name = parse_service_path(service_path)
+    row = session.sql(f"DESCRIBE CORTEX SEARCH SERVICE {database}.{schema}.{name}").collect()[0].as_dict()
+    row = {key.lower(): value for key, value in row.items()}
+    return str(row.get("data_timestamp") or row.get("refreshed_on") or row.get("created_on"))
+
+
+def source_version(session, tables=(), services=()):
+    """Freshness stamp for ``tables`` (last change commit times) and ``services``, joined."""
+    stamps = []
+    if tables:
+        columns = ", ".join(f"SYSTEM$LAST_CHANGE_COMMIT_TIME('{table}') AS V{i}" for i, table in enumerate(tables))
+        row = session.sql(f"SELECT {columns}").collect()[0]
+        stamps += [str(row[f"V{i}"]) for i in range(len(tables))]
+    stamps += [service_version(session, service) for service in services]
+    return ";".join(stamps)
+
+
+def rag_answer(session, search, question, model, limit=3, prompt=RAG_PROMPT):
+    """Day 21's default pipeline without the UI.
+
+    Splits the question, over-fetches with ``search(query, limit)`` (result
+    dicts with CHUNK_TEXT and FILE_NAME), reranks, packs and calls COMPLETE.
+    Returns ``(answer, details)`` with the sources used.
+    """
+    from snowflake.cortex import complete
+
+    fetch = limit * RERANK_OVERFETCH
+    queries = decompose_question(question)
+    results = rerank(question, fuse_results(concurrent_search(search, queries, fetch), fetch), limit)
+    chunks = [{"text": r.get("CHUNK_TEXT", ""), "source": r.get("FILE_NAME", "Unknown"),
+               "score": r["RERANK_SCORE"]} for r in results]
+    packed = pack_context(question, chunks, context_budget(model))
+    answer = complete(model, prompt.format(context=packed.text, question=question), session=session)
+    sources = [{"text": p["text"], "source": p["source"]} for p in packed.passages]
+    return answer.strip(), {"sources": sources}
+
+
+class AnswerStore:
+    """Cached view of one PRECOMPUTED_ANSWERS table with background refresh."""
+
+    def __init__(self, table=DEFAULT_ANSWER_TABLE):
+        self.table = table
+        self._records = {}
+        self._loaded = set()
+        self._versions = {}
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self._table_ready = False
+        # Last refresh failure per (scope, pipeline, target, model)
+        self.errors = {}
+
+    def _ensure_table(self, session):
+        if self._table_ready:
+            return
+        session.sql(answer_table_sql(self.table)).collect()
+        # Tables created before answers were scoped
+        session.sql(f"ALTER TABLE {self.table} ADD COLUMN IF NOT EXISTS SCOPE VARCHAR").collect()
+        self._table_ready = True
+
+    def _load(self, session, scope, pipeline, target):
+        if (scope, pipeline, target) in self._loaded:
+            return
+        self._ensure_table(session)
+        rows = session.sql(f"""
+        SELECT MODEL, QUESTION_HASH, QUESTION, ANSWER, DETAILS, SOURCE_VERSION, COMPUTED_AT
+        FROM {self.table}
+        WHERE SCOPE = ? AND PIPELINE = ? AND TARGET = ?
+        """, params=[scope, pipeline, target]).collect()
+        with self._lock:
+            for row in rows:
+                details = row["DETAILS"]
+                self._records[(scope, pipeline, target, row["MODEL"], row["QUESTION_HASH"])] = {
+                    "question": row["QUESTION"],
+                    "answer": row["ANSWER"],
+                    "details": json.loads(details) if isinstance(details, str) else (details or {}),
+                    "version": row["SOURCE_VERSION"],
+                    "computed_at": str(row["COMPUTED_AT"]),
+                }
+            self._loaded.add((scope, pipeline, target))
+
+    def lookup(self, session, pipeline, target, model, question):
+        """The stored record for ``question`` under the session's scope, or ``None``."""
+        scope = answer_scope(session)
+        self._load(session, scope, pipeline, target)
+        return self._records.get((scope, pipeline, target, model or "", question_hash(question)))
+
+    def version(self, session, tables=(), services=()):
+        """``source_version`` of the sources, re-read every ``VERSION_CHECK_INTERVAL`` seconds."""
+        key = (answer_scope(session), tuple(tables), tuple(services))
+        now = time.monotonic()
+        with self._lock:
+            cached = self._versions.get(key)
+        if cached is None or cached[1] + VERSION_CHECK_INTERVAL <= now:
+            cached = (source_version(session, tables, services), now)
+            with self._lock:
+                self._versions[key] = cached
+        return cached[0]
+
+    def put(self, session, pipeline, target, model, question, answer, details, version):
+        """Store an answer (replacing any earlier one) in the table and in memory."""
+        scope = answer_scope(session)
+        model = model or ""
+        key = question_hash(question)
+        self._ensure_table(session)
+        session.sql(f"""
+        MERGE INTO {self.table} a
+        USING (SELECT ? AS SCOPE, ? AS PIPELINE, ? AS TARGET, ? AS MODEL, ? AS QUESTION_HASH, ? AS QUESTION,
+                      ? AS ANSWER, PARSE_JSON(?) AS DETAILS, ? AS SOURCE_VERSION) s
+        ON a.SCOPE = s.SCOPE AND a.PIPELINE = s.PIPELINE AND a.TARGET = s.TARGET AND a.MODEL = s.MODEL
+           AND a.QUESTION_HASH = s.QUESTION_HASH
+        WHEN MATCHED THEN UPDATE SET
+            QUESTION = s.QUESTION, ANSWER = s.ANSWER, DETAILS = s.DETAILS,
+            SOURCE_VERSION = s.SOURCE_VERSION, COMPUTED_AT = CURRENT_TIMESTAMP()
+        WHEN NOT MATCHED THEN INSERT (SCOPE, PIPELINE, TARGET, MODEL, QUESTION_HASH, QUESTION, ANSWER, DETAILS,
+                                      SOURCE_VERSION)
+            VALUES (s.SCOPE, s.PIPELINE, s.TARGET, s.MODEL, s.QUESTION_HASH, s.QUESTION, s.ANSWER, s.DETAILS,
+                    s.SOURCE_VERSION)
+        """, params=[scope, pipeline, target, model, key, question, answer, json.dumps(details, default=str),
+                     version]).collect()
+        with self._lock:
+            self._records[(scope, pipeline, target, model, key)] = {
+                "question": question, "answer": answer, "details": details, "version": version,
+                "computed_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+            }
+
+    def stale(self, session, pipeline, target, model, questions, version):
+        """Questions in ``questions`` with no answer, or one computed from older data."""
+        stale = []
+        for question in questions:
+            record = self.lookup(session, pipeline, target, model, question)
+            if record is None or record["version"] != version:
+                stale.append(question)
+        return stale
+
+    def refresh(self, session, pipeline, target, model, questions, answer_fn, version):
+        """Answer every stale question with ``answer_fn(question) -> (answer, details)``."""
+        refreshed = 0
+        for question in questions:
+            # Checked per question, so a repeat of one just answered is skipped
+            if not self.stale(session, pipeline, target, model, [question], version):
+                continue
+            answer, details = answer_fn(question)
+            self.put(session, pipeline, target, model, question, answer, details, version)
+            refreshed += 1
+        return refreshed
+
+    @staticmethod
+    def _job(session, pipeline, target, model):
+        # The refresh runs with the triggering session, so jobs are per scope
+        return (answer_scope(session), pipeline, target, model or "")
+
+    def is_refreshing(self, session, pipeline, target, model):
+        job = self._job(session, pipeline, target, model)
+        with self._lock:
+            return job in self._refreshing
+
+    def error(self, session, pipeline, target, model):
+        """Message of the last failed refresh for this target, or ``None``."""
+        job = self._job(session, pipeline, target, model)
+        with self._lock:
+            return self.errors.get(job)
+
+    def refresh_in_background(self, session, pipeline, target, model, questions, answer_fn, version):
+        """Run ``refresh`` on a daemon thread unless one is already running for this target."""
+        job = self._job(session, pipeline, target, model)
+        with self._lock:
+            if job in self._refreshing:
+                return False
+            self._refreshing.add(job)
+
+        def run():
+            try:
+                self.refresh(session, pipeline, target, model, questions, answer_fn, version)
+                with self._lock:
+                    self.errors.pop(job, None)
+            except Exception as e:
+                with self._lock:
+                    self.errors[job] = str(e)
+            finally:
+                with self._lock:
+                    self._refreshing.discard(job)
+
+        threading.Thread(target=run, name=f"precompute-{pipeline}", daemon=True).start()
+        return True
+
+    def ensure_fresh(self, session, pipeline, target, model, questions, answer_fn, tables=(), services=()):
+        """Start a background refresh if any of ``questions`` is missing or stale.
+
+        ``tables`` and ``services`` are the sources whose ``source_version``
+        stamps the answers. Returns ``(version, stale_questions)``.
+        """
+        version = self.version(session, tables, services)
+        stale = self.stale(session, pipeline, target, model, questions, version)
+        if stale:
+            self.refresh_in_background(session, pipeline, target, model, stale, answer_fn, version)
+        return version, stale
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def shared_answer_store(table=DEFAULT_ANSWER_TABLE):
+    """The process-wide ``AnswerStore`` for ``table``."""
+    with _stores_lock:
+        if table not in _stores:
+            _stores[table] = AnswerStore(table)
+        return _stores[table]
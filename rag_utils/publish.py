@@ -0,0 +1,89 @@
+"""Atomic publishing of on-disk artefacts (embedding snapshots, IVF indexes).
+
+An artefact at ``path`` is a directory of versions. ``publish`` hands out a
+fresh ``tempfile.mkdtemp`` directory inside it and, once the writer is done,
+makes it visible by atomically replacing ``path/CURRENT``, a one-line
+pointer naming the version. Readers resolve the pointer once with
+``current_version`` and read every file from that version, so they never
+see a half-written artefact or a moment with none at all. The previous
+version is kept for readers that resolved it just before the swap; older
+ones are removed.
+
+``writer_lock`` serialises writers of one path across threads and, where
+``fcntl`` is available, across processes on the host.
+"""
+
+import os
+import shutil
+import tempfile
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: writers are serialised within the process only
+    fcntl = None
+
+POINTER = "CURRENT"
+
+# Published versions kept on disk, including the current one
+KEEP_VERSIONS = 2
+
+_locks = {}
+_locks_lock = threading.Lock()
+
+
+def current_version(path):
+    """Directory of the version published at ``path``, or ``None``."""
+    try:
+        with open(os.path.join(path, POINTER)) as f:
+            name = f.read().strip()
+    except OSError:
+        return None
+    version = os.path.join(path, name)
+    return version if name and os.path.isdir(version) else None
+
+
+@contextmanager
+def writer_lock(path):
+    """Hold the exclusive writer lock of ``path``; not re-entrant."""
+    path = os.path.abspath(path)
+    with _locks_lock:
+        lock = _locks.setdefault(path, threading.Lock())
+    with lock:
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, ".lock"), "a") as handle:
+            if fcntl is not None:
+                # Released when the handle closes
+                fcntl.flock(handle, fcntl.LOCK_EX)
+            yield
+
+
+@contextmanager
+def publish(path):
+    """Yield a new version directory under ``path`` and publish it if the block succeeds.
+
+    Call with ``writer_lock(path)`` held. On an exception the directory is
+    removed and the current version stays as it was.
+    """
+    os.makedirs(path, exist_ok=True)
+    staging = tempfile.mkdtemp(prefix="v-", dir=path)
+    try:
+        yield staging
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+    fd, pointer = tempfile.mkstemp(prefix=".pointer-", dir=path)
+    with os.fdopen(fd, "w") as f:
+        f.write(os.path.basename(staging))
+    os.replace(pointer, os.path.join(path, POINTER))
+    _prune(path, os.path.basename(staging))
+
+
+def _prune(path, current):
+    versions = sorted((entry for entry in os.scandir(path) if entry.is_dir() and entry.name.startswith("v-")),
+                      key=lambda entry: entry.stat().st_mtime, reverse=True)
+    for entry in versions[KEEP_VERSIONS:]:
+        if entry.name != current:
+            # Files still memory-mapped elsewhere survive on POSIX; on Windows they stay until the next prune
+            shutil.rmtree(entry.path, ignore_errors=True)
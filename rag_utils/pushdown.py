@@ -0,0 +1,88 @@
+"""In-warehouse chunking for Day 17.
+
+``register_chunking_udtf`` registers a Python UDTF that runs a ``Chunker``
+strategy inside Snowflake, and ``pushdown_chunk_sql`` builds the
+``INSERT ... SELECT`` that feeds EXTRACTED_DOCUMENTS through it straight
+into REVIEW_CHUNKS. Reviews never leave the warehouse, so chunking
+throughput scales with the warehouse rather than the app host.
+"""
+
+import os
+
+from rag_utils.chunking import CHUNK_ID_STRIDE, TokenCounter, make_chunker
+
+UDTF_NAME = "RAG_CHUNK_REVIEW"
+UDTF_PACKAGES = ["numpy", "pandas", "tiktoken"]
+
+_PACKAGE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def chunk_rows(chunker, text):
+    """Yield ``(CHUNK_INDEX, CHUNK_TEXT, CHUNK_SIZE, CHUNK_TYPE, CHUNK_TOKENS)`` rows for one document."""
+    pieces, whole = chunker.split_document(text)
+    chunk_type = "full_review" if whole else "chunked_review"
+    for index, piece in enumerate(pieces):
+        yield index, piece, len(piece.split()), chunk_type, chunker.counter.count(piece)
+
+
+def register_chunking_udtf(session, chunker, name=UDTF_NAME):
+    """Register ``chunker`` as a temporary UDTF and return its name.
+
+    Only the strategy name and parameters are captured; the handler rebuilds
+    the chunker (and its tokenizer) on the warehouse from ``rag_utils``. The
+    warehouse has no WordPiece tokenizer and usually no tiktoken encoding
+    file, so a token target is capped at that counter's ``embed_budget``.
+    """
+    from snowflake.snowpark.types import IntegerType, StringType, StructField, StructType
+
+    strategy, params, wordpiece = chunker.name, chunker.params(), chunker.counter.wordpiece
+
+    class ChunkReview:
+        def __init__(self):
+            counter = TokenCounter(wordpiece=wordpiece)
+            self.chunker = make_chunker(strategy, counter=counter, **params)
+            if self.chunker.max_tokens and not counter.exact:
+                self.chunker.max_tokens = min(self.chunker.max_tokens, counter.embed_budget())
+
+        def process(self, text):
+            yield from chunk_rows(self.chunker, text)
+
+    session.udtf.register(
+        ChunkReview,
+        output_schema=StructType([
+            StructField("CHUNK_INDEX", IntegerType()),
+            StructField("CHUNK_TEXT", StringType()),
+            StructField("CHUNK_SIZE", IntegerType()),
+            StructField("CHUNK_TYPE", StringType()),
+            StructField("CHUNK_TOKENS", IntegerType()),
+        ]),
+        input_types=[StringType()],
+        name=name,
+        is_permanent=False,
+        replace=True,
+        packages=UDTF_PACKAGES,
+        imports=[(_PACKAGE_DIR, "rag_utils")],
+    )
+    return name
+
+
+def pushdown_chunk_sql(source_table, target_table, udtf_name=UDTF_NAME, where=None):
+    """``INSERT ... SELECT`` that chunks ``source_table`` into ``target_table`` in the warehouse.
+
+    Chunk IDs use the same stable scheme as ``assign_stable_ids``; ``where``
+    optionally restricts the source documents (e.g. a watermark range).
+    """
+    return f"""
+    INSERT INTO {target_table} (CHUNK_ID, DOC_ID, FILE_NAME, CHUNK_TEXT, CHUNK_SIZE, CHUNK_TYPE, CHUNK_TOKENS)
+    SELECT
+        d.DOC_ID * {CHUNK_ID_STRIDE} + c.CHUNK_INDEX,
+        d.DOC_ID,
+        d.FILE_NAME,
+        c.CHUNK_TEXT,
+        c.CHUNK_SIZE,
+        c.CHUNK_TYPE,
+        c.CHUNK_TOKENS
+    FROM {source_table} d,
+        TABLE({udtf_name}(COALESCE(d.EXTRACTED_TEXT, ''))) c
+    {f"WHERE {where}" if where else ""}
+    """
@@ -0,0 +1,61 @@
+"""Local reranking of over-fetched candidates (Day 21).
+
+Raising the number of context chunks gets better answers but makes the
+prompt, and therefore COMPLETE, slower. Instead the page retrieves a deeper
+candidate pool than it sends to COMPLETE (by default ``RERANK_OVERFETCH``
+times as many) — cheap for both Cortex Search and the local retrievers —
+and ``rerank`` keeps the best few. Each candidate is scored in-process from:
+
+* BM25 over the candidate pool alone (a throwaway ``BM25Index``, so IDF
+  reflects what distinguishes the candidates, not the whole corpus);
+* coverage: the share of the question's distinct terms the chunk contains,
+  which favours chunks that answer every part of a compound question;
+* the first-stage score — cosine similarity for the vector retrievers,
+  fused rank for hybrid — or the first-stage rank when there is none.
+
+Scores are min-max normalised per pool and blended with ``lexical_weight``.
+"""
+
+import numpy as np
+
+from rag_utils.bm25 import BM25Index, tokenize
+
+# Candidates fetched per chunk that reaches the prompt
+RERANK_OVERFETCH = 4
+
+
+def _minmax(values):
+    values = np.asarray(values, dtype=np.float32)
+    span = values.max() - values.min() if len(values) else 0.0
+    return (values - values.min()) / span if span > 0 else np.zeros_like(values)
+
+
+def rerank(query, results, top_n, text_column="CHUNK_TEXT", lexical_weight=0.6):
+    """The best ``top_n`` of ``results`` for ``query``, best first.
+
+    ``results`` are search result dicts in first-stage order; the returned
+    dicts are copies with a ``RERANK_SCORE`` key added.
+    """
+    if not results:
+        return []
+    texts = [result.get(text_column) or "" for result in results]
+    terms = set(tokenize(query))
+
+    pool = BM25Index.build(np.arange(len(texts)), texts)
+    rows, scores = pool.search(query, k=len(texts))
+    bm25 = np.zeros(len(texts), dtype=np.float32)
+    bm25[rows] = scores
+    coverage = np.array([len(terms.intersection(tokenize(text))) / len(terms) if terms else 0.0
+                         for text in texts], dtype=np.float32)
+    lexical = (_minmax(bm25) + coverage) / 2
+
+    first_stage = [result.get("SCORE") for result in results]
+    if all(isinstance(score, (int, float)) for score in first_stage):
+        prior = _minmax(first_stage)
+    else:
+        prior = 1 - np.arange(len(results), dtype=np.float32) / len(results)
+
+    combined = lexical_weight * lexical + (1 - lexical_weight) * prior
+    # Stable, so ties keep the first-stage order
+    order = np.argsort(-combined, kind="stable")[:top_n]
+    return [{**results[i], "RERANK_SCORE": float(combined[i])} for i in order]
@@ -0,0 +1,361 @@
+"""Retrievers for the RAG pages: a Cortex Search service or local indexes.
+
+``cortex_search`` wraps the ``snowflake.core`` search call the pages use,
+resolving service handles once through ``SERVICE_REGISTRY``.
+``LocalRetriever`` answers the same question in-process from the
+memory-mapped embeddings snapshot: an ``IVFIndex`` or brute-force
+``ExactIndex`` for vectors, a ``BM25Index`` for keywords, or both fused with
+reciprocal-rank fusion. Retrieval costs at most one query embedding (cached)
+plus a few milliseconds of NumPy instead of a service round trip;
+``search_many`` embeds a whole list of questions in one statement and
+searches them as one batch.
+Results are plain dicts keyed by column name.
+
+Compound questions can be split with ``decompose_question``, searched in
+parallel with ``concurrent_search`` and merged with ``fuse_results``.
+
+Process-wide caches keyed on a session use ``connection_scope`` so one
+visitor's connection and privileges are never reused for another.
+"""
+
+import re
+import threading
+import time
+import weakref
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from rag_utils.ann import IVFIndex
+from rag_utils.bm25 import BM25Index, tokenize
+from rag_utils.embedding import EMBED_MODEL, normalize_text
+from rag_utils.embedding_cache import EmbeddingCache, embed_with_cache
+from rag_utils.exact import ExactIndex
+from rag_utils.publish import current_version
+from rag_utils.snapshot import SNAPSHOT_DIR, export_snapshot, load_snapshot, open_snapshot, snapshot_path
+from rag_utils.vectors import as_vector
+
+RETRIEVERS = ("Cortex Search service", "Local vector index", "Exact vector search",
+              "Local keyword (BM25)", "Local hybrid (BM25 + vector)")
+
+# Local retriever kind behind each non-Cortex option in RETRIEVERS
+LOCAL_RETRIEVERS = dict(zip(RETRIEVERS[1:], ("ivf", "exact", "keyword", "hybrid")))
+
+# Hybrid search fetches this many times ``limit`` from each side before fusing
+HYBRID_OVERSAMPLE = 4
+
+DEFAULT_EMBEDDING_TABLE = "RAG_DB.RAG_SCHEMA.REVIEW_EMBEDDINGS"
+DEFAULT_CHUNK_TABLE = "RAG_DB.RAG_SCHEMA.REVIEW_CHUNKS"
+
+# Where a compound question splits into sub-queries
+_CLAUSE_BREAK = re.compile(r"[?;]|,?\s+(?:and|but|also|as well as|plus)\s+(?=(?:how|what|which|why|where|when|who|"
+                           r"is|are|was|were|do|does|did|can|should|any)\b)|,?\s+and\s+also\s+",
+                           re.IGNORECASE)
+
+
+def parse_service_path(service_path):
+    """``(database, schema, service)`` of a service path; raises ``ValueError`` if malformed."""
+    parts = [part.strip() for part in (service_path or "").split(".")]
+    if len(parts) != 3 or not all(parts):
+        raise ValueError("Service path must be in format: database.schema.service_name")
+    return tuple(parts)
+
+
+_scopes = weakref.WeakKeyDictionary()
+_scopes_lock = threading.Lock()
+
+
+def connection_scope(session, custom=False):
+    """Hashable cache scope for ``session``: the account, user and role it runs as.
+
+    Sessions opened from a login form (``custom``) also carry the session's
+    ``id``, so objects cached for one visitor's own connection are never
+    handed to another. Read once per session.
+    """
+    with _scopes_lock:
+        scope = _scopes.get(session)
+    if scope is None:
+        row = session.sql("SELECT CURRENT_ACCOUNT() AS ACCOUNT, CURRENT_USER() AS USER_NAME, "
+                          "CURRENT_ROLE() AS ROLE_NAME").collect()[0]
+        scope = (row["ACCOUNT"], row["USER_NAME"], row["ROLE_NAME"])
+        with _scopes_lock:
+            _scopes[session] = scope
+    return scope + (id(session),) if custom else scope
+
+
+class SearchServiceRegistry:
+    """Resolved Cortex Search service handles, reused across queries, reruns and users.
+
+    Each session gets one ``Root`` (and with it one REST client and its
+    connection pool); each service path is validated and walked to its
+    handle once. A ``Root`` holds its session, so the per-session state is
+    stored on the session object itself rather than in a dict keyed by it:
+    the registry keeps only a ``WeakSet`` of sessions, and a session that is
+    no longer used is collected together with its root and handles. A lock
+    makes concurrent first lookups from different threads resolve a handle
+    only once.
+    """
+
+    def __init__(self):
+        self._attribute = f"_rag_search_services_{id(self)}"
+        self._sessions = weakref.WeakSet()
+        self._lock = threading.Lock()
+
+    def get(self, session, service_path):
+        parts = parse_service_path(service_path)
+        with self._lock:
+            state = getattr(session, self._attribute, None)
+            if state is None:
+                from snowflake.core import Root
+
+                state = {"root": Root(session), "handles": {}}
+                setattr(session, self._attribute, state)
+                self._sessions.add(session)
+            handle = state["handles"].get(parts)
+            if handle is None:
+                handle = state["root"].databases[parts[0]].schemas[parts[1]].cortex_search_services[parts[2]]
+                state["handles"][parts] = handle
+            return handle
+
+    def invalidate(self, service_path=None):
+        """Forget resolved handles for one service path (or all)."""
+        parts = parse_service_path(service_path) if service_path is not None else None
+        with self._lock:
+            for session in list(self._sessions):
+                handles = getattr(session, self._attribute)["handles"]
+                if parts is None:
+                    handles.clear()
+                else:
+                    handles.pop(parts, None)
+
+
+SERVICE_REGISTRY = SearchServiceRegistry()
+
+
+def cortex_search(session, service_path, query, columns, limit, filter=None, registry=SERVICE_REGISTRY):
+    """Query a Cortex Search service; returns a list of result dicts."""
+    svc = registry.get(session, service_path)
+    options = {"filter": filter} if filter else {}
+    return list(svc.search(query=query, columns=columns, limit=limit, **options).results)
+
+
+def reciprocal_rank_fusion(rankings, limit, k=60):
+    """Fuse ranked ID lists: score = sum of 1 / (k + rank). Returns ``(ids, scores)``."""
+    fused = {}
+    for ranking in rankings:
+        for rank, chunk_id in enumerate(np.asarray(ranking).tolist(), 1):
+            fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (k + rank)
+    best = sorted(fused.items(), key=lambda item: -item[1])[:limit]
+    return (np.asarray([i for i, _ in best], dtype=np.int64),
+            np.asarray([score for _, score in best], dtype=np.float32))
+
+
+def decompose_question(question, max_queries=4):
+    """Sub-queries for a compound question: the question itself, then each clause.
+
+    "Which products have durability issues and how is shipping?" yields the
+    whole question, "Which products have durability issues" and "how is
+    shipping". Clauses split off at punctuation need two content terms; a
+    clause next to a conjunction ("... and also the helmets") is kept with
+    one, since it names something the question explicitly asks about.
+    """
+    clauses, start, joined = [], 0, False
+    for match in _CLAUSE_BREAK.finditer(question):
+        conjunction = any(ch.isalpha() for ch in match.group())
+        clauses.append((question[start:match.start()], joined or conjunction))
+        start, joined = match.end(), conjunction
+    clauses.append((question[start:], joined))
+
+    queries = [question.strip()]
+    seen = {normalize_text(question.strip(" ,?!.")).casefold()}
+    for clause, joined in clauses:
+        clause = clause.strip(" ,?!.")
+        key = normalize_text(clause).casefold()
+        if key in seen or len(tokenize(clause)) < (1 if joined else 2):
+            continue
+        seen.add(key)
+        queries.append(clause)
+    return queries[:max_queries]
+
+
+def concurrent_search(search, queries, limit, max_workers=None):
+    """``search(query, limit)`` for every query on a thread pool; results in query order."""
+    if len(queries) == 1:
+        return [search(queries[0], limit)]
+    with ThreadPoolExecutor(max_workers=max_workers or len(queries)) as pool:
+        return list(pool.map(lambda query: search(query, limit), queries))
+
+
+def fuse_results(result_lists, limit):
+    """Merge ranked result lists with ``reciprocal_rank_fusion``, one entry per chunk.
+
+    Results are matched on CHUNK_ID, or on CHUNK_TEXT when the search didn't
+    return IDs. A single list is returned as is (keeping its own scores).
+    """
+    if len(result_lists) == 1:
+        return result_lists[0][:limit]
+    keys, first_seen = {}, []
+    rankings = []
+    for results in result_lists:
+        ranking = []
+        for result in results:
+            key = result.get("CHUNK_ID", result.get("CHUNK_TEXT"))
+            if key not in keys:
+                keys[key] = len(first_seen)
+                first_seen.append(result)
+            ranking.append(keys[key])
+        rankings.append(ranking)
+    ids, scores = reciprocal_rank_fusion(rankings, limit)
+    return [{**first_seen[i], "SCORE": score} for i, score in zip(ids.tolist(), scores.tolist())]
+
+
+def index_path(table, root=SNAPSHOT_DIR):
+    # Kept beside, not inside, the snapshot so a snapshot refresh doesn't discard it
+    return f"{snapshot_path(table, root)}.ivf"
+
+
+def load_index(matrix, manifest, table, root=SNAPSHOT_DIR):
+    """Load the persisted index of ``table`` and sync it to ``matrix``, or build one.
+
+    Returns ``(index, status)`` with status ``"loaded"``, ``"synced"`` or ``"built"``.
+    """
+    path = index_path(table, root)
+    if current_version(path) is not None:
+        index = IVFIndex.load(path)
+        if index.version == manifest["version"]:
+            return index, "loaded"
+        index.sync(matrix)
+        status = "synced"
+    else:
+        index = IVFIndex.build(matrix)
+        status = "built"
+    index.version = manifest["version"]
+    index.save(path)
+    return index, status
+
+
+class LocalRetriever:
+    """In-process retrieval with chunk text and file names attached.
+
+    ``index`` is an ``IVFIndex`` or ``ExactIndex`` (or ``None`` for keyword
+    only); ``keyword_index`` is an optional ``BM25Index``. With both, each side
+    returns ``limit * HYBRID_OVERSAMPLE`` candidates and the rankings are fused
+    with ``reciprocal_rank_fusion``. ``embed_queries`` (a list of texts to a
+    list of vectors) embeds all uncached queries of a ``search_many`` call at
+    once; without it ``embed_query`` is called per text.
+    """
+
+    def __init__(self, index, chunks, embed_query, query_cache=None, manifest=None, status=None,
+                 keyword_index=None, embed_queries=None):
+        self.index = index
+        self.keyword_index = keyword_index
+        self.chunks = chunks.set_index("CHUNK_ID")
+        self.embed_query = embed_query
+        self.embed_queries = embed_queries
+        self.query_cache = query_cache or EmbeddingCache()
+        self.manifest = manifest
+        self.status = status
+        self.last_timings = {}
+
+    def __len__(self):
+        return len(self.index if self.index is not None else self.keyword_index)
+
+    def _embed(self, queries):
+        if self.embed_queries is not None:
+            return embed_with_cache(None, self.query_cache, queries, self.embed_queries)
+        return embed_with_cache(None, self.query_cache, queries,
+                                lambda texts: [self.embed_query(t) for t in texts])
+
+    def _results(self, ids, scores, columns):
+        # Chunks deleted since the snapshot was exported are dropped rather than returned empty
+        known = np.isin(ids, self.chunks.index)
+        ids, scores = ids[known], scores[known]
+        results = []
+        for chunk_id, score, (_, row) in zip(ids.tolist(), scores.tolist(), self.chunks.loc[ids].iterrows()):
+            result = {column: row.get(column) for column in columns}
+            result["CHUNK_ID"] = chunk_id
+            result["SCORE"] = score
+            results.append(result)
+        return results
+
+    def search(self, query, limit=5, columns=("CHUNK_TEXT", "FILE_NAME"), n_probe=None):
+        """Top ``limit`` chunks for ``query`` as dicts with ``columns``, CHUNK_ID and SCORE."""
+        return self.search_many([query], limit, columns, n_probe)[0]
+
+    def search_many(self, queries, limit=5, columns=("CHUNK_TEXT", "FILE_NAME"), n_probe=None):
+        """``search`` for every query in ``queries``, embedding and scoring them as one batch."""
+        if not queries:
+            return []
+        hybrid = self.index is not None and self.keyword_index is not None
+        fetch = limit * HYBRID_OVERSAMPLE if hybrid else limit
+        timings = {"embed_ms": 0.0, "search_ms": 0.0, "keyword_ms": 0.0}
+
+        vector_hits = keyword_hits = None
+        if self.index is not None:
+            start = time.perf_counter()
+            vectors = np.stack(self._embed(list(queries)))
+            embedded = time.perf_counter()
+            if len(queries) > 1 and hasattr(self.index, "search_batch"):
+                vector_hits = list(zip(*self.index.search_batch(vectors, k=fetch)))
+            else:
+                vector_hits = [self.index.search(v, k=fetch, n_probe=n_probe) for v in vectors]
+            timings["embed_ms"] = (embedded - start) * 1000
+            timings["search_ms"] = (time.perf_counter() - embedded) * 1000
+        if self.keyword_index is not None:
+            start = time.perf_counter()
+            keyword_hits = [self.keyword_index.search(q, k=fetch) for q in queries]
+            timings["keyword_ms"] = (time.perf_counter() - start) * 1000
+
+        if hybrid:
+            hits = [reciprocal_rank_fusion([v_ids, k_ids], limit)
+                    for (v_ids, _), (k_ids, _) in zip(vector_hits, keyword_hits)]
+        else:
+            hits = vector_hits if vector_hits is not None else keyword_hits
+        self.last_timings = timings
+        return [self._results(np.asarray(ids), np.asarray(scores), columns) for ids, scores in hits]
+
+
+def load_local_retriever(session, embedding_table=DEFAULT_EMBEDDING_TABLE, chunk_table=DEFAULT_CHUNK_TABLE,
+                         root=SNAPSHOT_DIR, model=EMBED_MODEL, query_cache=None, kind="ivf"):
+    """Snapshot ``embedding_table`` (refreshing if stale) and open a ``LocalRetriever`` on it.
+
+    ``kind`` is one of ``LOCAL_RETRIEVERS`` values: ``"ivf"`` (approximate
+    vector index), ``"exact"`` (brute force), ``"keyword"`` (BM25 over the
+    snapshot's chunk text) or ``"hybrid"`` (IVF and BM25 fused).
+    """
+    from snowflake.cortex import embed_text_768
+
+    if kind not in LOCAL_RETRIEVERS.values():
+        raise ValueError(f"Unknown local retriever: {kind}")
+    matrix, manifest, chunks, _ = load_snapshot(session, embedding_table, root, chunk_table=chunk_table)
+    if chunks is None or manifest.get("chunk_table") != chunk_table:
+        # Snapshot was exported without (or with other) chunk metadata
+        export_snapshot(session, embedding_table, root, chunk_table=chunk_table)
+        matrix, manifest, chunks = open_snapshot(embedding_table, root)
+    if not len(matrix):
+        raise ValueError(f"{embedding_table} has no embeddings; generate them on Day 18 first")
+
+    index = keyword_index = None
+    status = kind
+    if kind == "exact":
+        index = ExactIndex(matrix)
+    elif kind in ("ivf", "hybrid"):
+        index, status = load_index(matrix, manifest, embedding_table, root)
+    if kind in ("keyword", "hybrid"):
+        keyword_index = BM25Index.build(chunks["CHUNK_ID"].to_numpy(), chunks["CHUNK_TEXT"].tolist())
+        status = "BM25" if kind == "keyword" else f"{status} + BM25"
+
+    def embed_query(text):
+        return embed_text_768(model=model, text=text, session=session)
+
+    def embed_queries(texts):
+        # One statement for the whole list instead of a round trip per question
+        rows = session.sql(f"""
+        SELECT COLUMN1 AS POSITION, SNOWFLAKE.CORTEX.EMBED_TEXT_768('{model}', COLUMN2) AS EMBEDDING
+        FROM VALUES {", ".join("(?, ?)" for _ in texts)}
+        """, params=[value for position, text in enumerate(texts) for value in (position, text)]).collect()
+        vectors = {row["POSITION"]: as_vector(row["EMBEDDING"]) for row in rows}
+        return [vectors[position] for position in range(len(texts))]
+
+    return LocalRetriever(index, chunks, embed_query, query_cache=query_cache, manifest=manifest, status=status,
+                          keyword_index=keyword_index, embed_queries=embed_queries)
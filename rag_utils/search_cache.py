@@ -0,0 +1,179 @@
+"""Process-wide cache of Cortex Search results.
+
+A service only re-indexes once per ``TARGET_LAG`` (``'1 hour'`` on Day 19),
+so repeating a search inside that window returns the same rows. Entries are
+keyed by service, normalised query, columns, filter, limit and the scope
+of the connection that ran the search (``connection_scope``: account, user
+and role), so results are only shared between sessions with the same
+privileges, and expire after the service's target lag. The lag and the service's ``created_on`` are read with
+``SHOW CORTEX SEARCH SERVICES`` and re-checked every few minutes: a service
+that was recreated drops its entries, and Day 19 also calls ``invalidate``
+right after ``CREATE OR REPLACE``.
+
+One instance is shared by every page in the process (``shared_search_cache``)
+so Day 19's invalidation reaches the caches Days 20-22 read.
+"""
+
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from rag_utils.embedding import normalize_text
+from rag_utils.retrieval import connection_scope, cortex_search, parse_service_path
+
+# Used when the service's target lag can't be read
+DEFAULT_TTL = 300
+
+# How often a service's target lag / created_on are re-read
+SERVICE_CHECK_INTERVAL = 300
+
+_LAG = re.compile(r"(\d+)\s*(second|minute|hour|day)s?", re.IGNORECASE)
+_UNIT_SECONDS = {"second": 1, "minute": 60, "hour": 3600, "day": 86400}
+
+
+def parse_target_lag(target_lag):
+    """Seconds in a TARGET_LAG such as ``'1 hour'``; ``None`` if unrecognised."""
+    match = _LAG.search(target_lag or "")
+    if not match:
+        return None
+    return int(match.group(1)) * _UNIT_SECONDS[match.group(2).lower()]
+
+
+def _service_key(service_path):
+    return service_path.strip().upper()
+
+
+class SearchResultCache:
+    """LRU of search results with per-service TTLs and hit/miss counters."""
+
+    def __init__(self, max_entries=2048):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._services = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def reset_stats(self):
+        with self._lock:
+            self.hits = self.misses = 0
+
+    @staticmethod
+    def key(service_path, query, columns, limit, filter=None, scope=None):
+        return (_service_key(service_path), normalize_text(query).casefold(), tuple(columns),
+                json.dumps(filter, sort_keys=True) if filter else None, int(limit), scope)
+
+    def get(self, key):
+        """Cached results for ``key``, or ``None`` if absent or expired."""
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return list(entry[1])
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, key, results, ttl):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, list(results))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, service_path=None):
+        """Drop entries for one service (or all); returns how many were removed."""
+        with self._lock:
+            if service_path is None:
+                removed = len(self._entries)
+                self._entries.clear()
+                self._services.clear()
+                return removed
+            service = _service_key(service_path)
+            self._services.pop(service, None)
+            return self._drop_service_entries(service)
+
+    def _drop_service_entries(self, service):
+        # Caller holds self._lock
+        stale = [key for key in self._entries if key[0] == service]
+        for key in stale:
+            del self._entries[key]
+        return len(stale)
+
+    def ttl_for(self, session, service_path):
+        """Seconds a result from ``service_path`` may be reused (its target lag).
+
+        Re-reads the service at most every ``SERVICE_CHECK_INTERVAL`` seconds
+        and invalidates its entries if it was recreated since the last check.
+        """
+        service = _service_key(service_path)
+        now = time.monotonic()
+        with self._lock:
+            info = self._services.get(service)
+        if info is not None and info["checked"] + SERVICE_CHECK_INTERVAL > now:
+            return info["ttl"]
+
+        ttl, created_on = DEFAULT_TTL, None
+        try:
+            parts = parse_service_path(service)
+            rows = session.sql(
+                f"SHOW CORTEX SEARCH SERVICES LIKE '{parts[2]}' IN SCHEMA {parts[0]}.{parts[1]}"
+            ).collect()
+            if rows:
+                row = rows[0].as_dict()
+                ttl = parse_target_lag(str(row.get("target_lag"))) or DEFAULT_TTL
+                created_on = str(row.get("created_on"))
+        except Exception:
+            pass
+        with self._lock:
+            # Compared with the latest info, which another thread may have stored meanwhile
+            known = self._services.get(service)
+            if known is not None and created_on is not None and known["created_on"] not in (None, created_on):
+                self._drop_service_entries(service)
+            self._services[service] = {"ttl": ttl, "created_on": created_on, "checked": now}
+        return ttl
+
+
+_shared = None
+_shared_lock = threading.Lock()
+
+
+def shared_search_cache():
+    """The process-wide ``SearchResultCache`` used by Days 19-22."""
+    global _shared
+    with _shared_lock:
+        if _shared is None:
+            _shared = SearchResultCache()
+        return _shared
+
+
+def cached_search(cache, session, service_path, query, columns, limit, filter=None, scope=None):
+    """``cortex_search`` through ``cache``; returns ``(results, hit)``.
+
+    ``scope`` defaults to ``connection_scope(session)``; pages pass
+    ``connection_scope(session, custom=True)`` for a visitor's own login.
+    """
+    if scope is None:
+        scope = connection_scope(session)
+    # Checked first so a recreated service never serves its old entries
+    ttl = cache.ttl_for(session, service_path)
+    key = cache.key(service_path, query, columns, limit, filter, scope)
+    results = cache.get(key)
+    if results is not None:
+        return results, True
+    results = cortex_search(session, service_path, query, columns, limit, filter=filter)
+    cache.put(key, results, ttl)
+    return results, False
@@ -0,0 +1,151 @@
+"""On-disk, memory-mapped snapshots of an embeddings table.
+
+``export_snapshot`` streams REVIEW_EMBEDDINGS (CHUNK_ID, EMBEDDING) into
+``ids.npy`` / ``vectors.npy`` plus optional chunk metadata, and
+``open_snapshot`` maps them read-only: every session and every Streamlit
+process on the host shares one physical copy through the OS page cache,
+and nothing has to be re-read from Snowflake after a restart.
+
+A snapshot records the source table's row count and MAX(CREATED_TIMESTAMP);
+``source_version`` re-reads both so callers can tell when to refresh.
+Exports are published as versions (``rag_utils.publish``): each one is
+written to its own directory under a writer lock and made current with an
+atomic pointer swap, so readers never see a half-written snapshot or none.
+"""
+
+import json
+import os
+import re
+import time
+
+import numpy as np
+import pandas as pd
+
+from rag_utils.embedding import EMBED_DIM
+from rag_utils.loading import iter_batches
+from rag_utils.publish import current_version, publish, writer_lock
+from rag_utils.vectors import EmbeddingMatrix, as_vector
+
+SNAPSHOT_DIR = ".rag_snapshots"
+
+
+def source_version(session, table):
+    """Row count and newest CREATED_TIMESTAMP of an embeddings table."""
+    row = session.sql(f"""
+    SELECT COUNT(*) AS ROWS, MAX(CREATED_TIMESTAMP) AS MAX_CREATED
+    FROM {table}
+    """).collect()[0]
+    max_created = row["MAX_CREATED"]
+    return {"rows": int(row["ROWS"]), "max_created": str(max_created) if max_created is not None else None}
+
+
+def snapshot_path(table, root=SNAPSHOT_DIR):
+    return os.path.join(root, re.sub(r"[^A-Za-z0-9_.-]", "_", table.upper()))
+
+
+def _manifest_at(version_dir):
+    if version_dir is None:
+        return None
+    try:
+        with open(os.path.join(version_dir, "manifest.json")) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def read_manifest(table, root=SNAPSHOT_DIR):
+    return _manifest_at(current_version(snapshot_path(table, root)))
+
+
+def is_current(manifest, version):
+    return manifest is not None and manifest.get("version") == version
+
+
+def export_snapshot(session, table, root=SNAPSHOT_DIR, chunk_table=None, batch_rows=10000):
+    """Write a fresh snapshot of ``table``; returns its manifest.
+
+    Vectors are streamed straight into a memory-mapped ``.npy`` so the
+    export never holds the whole table in memory. With ``chunk_table`` the
+    chunk metadata (FILE_NAME, CHUNK_TEXT, ...) is saved alongside. If
+    another writer published a current snapshot (with the requested
+    metadata) while this one waited for the lock, that one is returned.
+    """
+    version = source_version(session, table)
+    target = snapshot_path(table, root)
+    with writer_lock(target):
+        manifest = read_manifest(table, root)
+        if is_current(manifest, version) and chunk_table in (None, manifest.get("chunk_table")):
+            return manifest
+        with publish(target) as staging:
+            return _write_snapshot(session, table, staging, version, chunk_table, batch_rows)
+
+
+def _write_snapshot(session, table, staging, version, chunk_table, batch_rows):
+    capacity = version["rows"]
+    ids = np.lib.format.open_memmap(os.path.join(staging, "ids.npy"), mode="w+", dtype=np.int64, shape=(capacity,))
+    vectors = np.lib.format.open_memmap(os.path.join(staging, "vectors.npy"), mode="w+",
+                                        dtype=np.float32, shape=(capacity, EMBED_DIM))
+    filled = 0
+    query = f"SELECT CHUNK_ID, EMBEDDING FROM {table} ORDER BY CHUNK_ID"
+    for batch in iter_batches(session, query, batch_rows=batch_rows):
+        # Rows inserted after the version was read are left for the next refresh
+        take = min(len(batch), capacity - filled)
+        if take <= 0:
+            break
+        ids[filled:filled + take] = batch["CHUNK_ID"].to_numpy()[:take]
+        vectors[filled:filled + take] = np.stack([as_vector(v) for v in batch["EMBEDDING"].iloc[:take]])
+        filled += take
+    ids.flush()
+    vectors.flush()
+    del ids, vectors
+
+    if chunk_table:
+        metadata = session.sql(f"""
+        SELECT CHUNK_ID, DOC_ID, FILE_NAME, CHUNK_TEXT, CHUNK_TYPE
+        FROM {chunk_table}
+        ORDER BY CHUNK_ID
+        """).to_pandas()
+        metadata.to_parquet(os.path.join(staging, "chunks.parquet"), index=False)
+
+    manifest = {
+        "table": table,
+        "chunk_table": chunk_table,
+        "version": version,
+        "rows": filled,
+        "dim": EMBED_DIM,
+        "exported_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+    with open(os.path.join(staging, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+def open_snapshot(table, root=SNAPSHOT_DIR):
+    """Map a snapshot read-only; returns ``(matrix, manifest, chunks)``.
+
+    ``chunks`` is the metadata frame, or ``None`` if it was not exported.
+    """
+    # Resolve the published version once so every file comes from the same export
+    path = current_version(snapshot_path(table, root))
+    manifest = _manifest_at(path)
+    if manifest is None:
+        raise FileNotFoundError(f"No snapshot of {table} in {root}")
+    rows = manifest["rows"]
+    ids = np.load(os.path.join(path, "ids.npy"), mmap_mode="r")[:rows]
+    vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode="r")[:rows]
+    chunks_file = os.path.join(path, "chunks.parquet")
+    chunks = pd.read_parquet(chunks_file) if os.path.exists(chunks_file) else None
+    return EmbeddingMatrix.wrap(ids, vectors), manifest, chunks
+
+
+def load_snapshot(session, table, root=SNAPSHOT_DIR, chunk_table=None):
+    """Open the snapshot of ``table``, exporting it first if missing or stale.
+
+    Returns ``(matrix, manifest, chunks, refreshed)``.
+    """
+    refreshed = False
+    if not is_current(read_manifest(table, root), source_version(session, table)):
+        export_snapshot(session, table, root, chunk_table=chunk_table)
+        refreshed = True
+    matrix, manifest, chunks = open_snapshot(table, root)
+    return matrix, manifest, chunks, refreshed
@@ -0,0 +1,209 @@
+"""Per-request tracing for the RAG pipeline (Day 21).
+
+A ``Trace`` collects one span per stage — retrieve, rerank, pack, generate —
+with wall time and whatever the stage knows (chunk and token counts, cache
+hits, time to first token)::
+
+    trace = Trace("rag", model=model)
+    with trace.span("retrieve", retriever=retriever) as span:
+        results = search(question)
+        span.set(chunks=len(results))
+    span = trace.start("generate")  # or open and close a span by hand
+    ...
+    span.end()
+    append_trace(trace, trace_log(connection_scope(session)))
+
+Finished traces are appended as JSON lines to a log per connection
+(``trace_log(scope)``), so a visitor only sees traces recorded under their
+own account, user and role. Pages record a hash of the question rather than
+its text. Logs rotate at ``MAX_LOG_BYTES`` and ``load_traces`` reads only
+the tail, so neither grows without bound. ``stage_percentiles`` turns a log
+into p50/p95 per stage. ``to_otlp``
+gives a trace as OTLP/JSON (``resourceSpans``), which an OpenTelemetry
+collector's file or HTTP receiver accepts without the OpenTelemetry SDK
+being installed.
+"""
+
+import hashlib
+import json
+import os
+import secrets
+import time
+from contextlib import contextmanager
+
+import numpy as np
+
+TRACE_DIR = ".rag_traces"
+TRACE_LOG = os.path.join(TRACE_DIR, "traces.jsonl")
+SERVICE_NAME = "streamlit-30-days-rag"
+
+# A log is moved to "<log>.1" (replacing the previous one) when it grows past this
+MAX_LOG_BYTES = 5 * 1024 * 1024
+DEFAULT_TRACE_LIMIT = 1000
+_TAIL_BLOCK = 64 * 1024
+
+
+def trace_log(scope):
+    """Log file for traces recorded under ``scope`` (e.g. ``connection_scope(session)``)."""
+    digest = hashlib.sha256(repr(scope).encode("utf-8")).hexdigest()[:16]
+    return os.path.join(TRACE_DIR, f"traces-{digest}.jsonl")
+
+
+class Span:
+    """One timed stage of a trace."""
+
+    def __init__(self, name, attributes=None):
+        self.name = name
+        self.span_id = secrets.token_hex(8)
+        self.attributes = dict(attributes or {})
+        self.start_ns = time.time_ns()
+        self.end_ns = None
+        self.error = None
+        self._start = time.perf_counter()
+        self.duration_ms = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def end(self):
+        if self.end_ns is None:
+            self.duration_ms = (time.perf_counter() - self._start) * 1000
+            self.end_ns = self.start_ns + int(self.duration_ms * 1e6)
+
+    def to_dict(self):
+        return {"name": self.name, "span_id": self.span_id, "start_ns": self.start_ns, "end_ns": self.end_ns,
+                "duration_ms": self.duration_ms, "error": self.error, "attributes": self.attributes}
+
+
+class Trace:
+    """Spans recorded for one request, plus request-level attributes."""
+
+    def __init__(self, name, **attributes):
+        self.name = name
+        self.trace_id = secrets.token_hex(16)
+        self.attributes = attributes
+        self.spans = []
+        self.start_ns = time.time_ns()
+
+    def start(self, name, **attributes):
+        """Open a span that the caller closes with ``span.end()``."""
+        span = Span(name, attributes)
+        self.spans.append(span)
+        return span
+
+    @contextmanager
+    def span(self, name, **attributes):
+        """Time the ``with`` block as a span; exceptions are recorded and re-raised."""
+        span = self.start(name, **attributes)
+        try:
+            yield span
+        except Exception as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            span.end()
+
+    def durations(self):
+        """``{stage: ms}`` for every finished span."""
+        return {span.name: span.duration_ms for span in self.spans if span.duration_ms is not None}
+
+    def summary(self):
+        return " · ".join(f"{name} {ms:,.1f} ms" for name, ms in self.durations().items())
+
+    def to_dict(self):
+        return {"trace_id": self.trace_id, "name": self.name, "start_ns": self.start_ns,
+                "attributes": self.attributes, "spans": [span.to_dict() for span in self.spans]}
+
+    def to_otlp(self):
+        return to_otlp(self.to_dict())
+
+
+def _otlp_value(value):
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, (int, np.integer)):
+        return {"intValue": str(int(value))}
+    if isinstance(value, (float, np.floating)):
+        return {"doubleValue": float(value)}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes):
+    return [{"key": key, "value": _otlp_value(value)} for key, value in attributes.items() if value is not None]
+
+
+def _otlp_span(trace_id, span_id, parent_id, name, start_ns, end_ns, attributes, error):
+    span = {"traceId": trace_id, "spanId": span_id, "name": name, "kind": 1,
+            "startTimeUnixNano": str(start_ns), "endTimeUnixNano": str(end_ns or start_ns),
+            "attributes": _otlp_attributes(attributes),
+            "status": {"code": 2, "message": error} if error else {"code": 1}}
+    if parent_id:
+        span["parentSpanId"] = parent_id
+    return span
+
+
+def to_otlp(trace):
+    """A logged trace dict as an OTLP/JSON ``ExportTraceServiceRequest``.
+
+    The trace becomes a root span with one child span per stage.
+    """
+    root_id = trace["trace_id"][:16]
+    spans = trace["spans"]
+    end_ns = max((span["end_ns"] for span in spans if span["end_ns"]), default=trace["start_ns"])
+    otlp_spans = [_otlp_span(trace["trace_id"], root_id, None, trace["name"], trace["start_ns"], end_ns,
+                             trace["attributes"], None)]
+    otlp_spans += [_otlp_span(trace["trace_id"], span["span_id"], root_id, span["name"], span["start_ns"],
+                              span["end_ns"], span["attributes"], span["error"]) for span in spans]
+    return {"resourceSpans": [{
+        "resource": {"attributes": _otlp_attributes({"service.name": SERVICE_NAME})},
+        "scopeSpans": [{"scope": {"name": "rag_utils.tracing"}, "spans": otlp_spans}],
+    }]}
+
+
+def append_trace(trace, path=TRACE_LOG):
+    """Append ``trace`` to the JSONL log at ``path``, rotating it past ``MAX_LOG_BYTES``."""
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    try:
+        if os.path.getsize(path) > MAX_LOG_BYTES:
+            os.replace(path, f"{path}.1")
+    except OSError:
+        pass
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(json.dumps(trace.to_dict(), default=str) + "\n")
+
+
+def _tail_lines(path, limit):
+    # Read backwards in blocks until ``limit`` complete lines are in hand
+    with open(path, "rb") as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        data = b""
+        while position > 0 and data.count(b"\n") <= limit:
+            step = min(_TAIL_BLOCK, position)
+            position -= step
+            f.seek(position)
+            data = f.read(step) + data
+    lines = data.splitlines()
+    if position > 0:
+        lines = lines[1:]  # the first line may be cut off
+    return lines[-limit:]
+
+
+def load_traces(path=TRACE_LOG, limit=DEFAULT_TRACE_LIMIT):
+    """The last ``limit`` traces from the JSONL log, oldest first."""
+    if not os.path.exists(path):
+        return []
+    return [json.loads(line) for line in _tail_lines(path, limit) if line.strip()]
+
+
+def stage_percentiles(traces):
+    """``{stage: {"count", "p50_ms", "p95_ms"}}`` over logged trace dicts."""
+    durations = {}
+    for trace in traces:
+        for span in trace["spans"]:
+            if span.get("duration_ms") is not None:
+                durations.setdefault(span["name"], []).append(span["duration_ms"])
+    return {name: {"count": len(values),
+                   "p50_ms": float(np.percentile(values, 50)),
+                   "p95_ms": float(np.percentile(values, 95))}
+            for name, values in durations.items()}
@@ -0,0 +1,119 @@
+"""Compact in-memory embedding storage.
+
+``EmbeddingMatrix`` keeps vectors in one contiguous float32 array next to an
+int64 chunk ID array: 3 KB per 768-dim vector instead of a list of boxed
+Python floats, with zero-copy slicing and chunk ID lookup by binary search.
+"""
+
+import json
+
+import numpy as np
+
+from rag_utils.embedding import EMBED_DIM
+from rag_utils.loading import iter_batches
+
+
+class EmbeddingMatrix:
+    """Growable ``(n, dim)`` float32 matrix with one int64 chunk ID per row.
+
+    ``append`` writes into a capacity-doubling buffer, so building the matrix
+    batch by batch is amortised O(n). ``ids`` and ``vectors`` are views of the
+    filled rows, and slicing returns a view rather than a copy.
+    """
+
+    def __init__(self, ids=None, vectors=None, dim=EMBED_DIM):
+        self.dim = dim
+        self._ids = np.empty(0, dtype=np.int64)
+        self._vectors = np.empty((0, dim), dtype=np.float32)
+        self._size = 0
+        self._order = None
+        if ids is not None:
+            self.append(ids, vectors)
+
+    @classmethod
+    def wrap(cls, ids, vectors):
+        """Use existing arrays as-is (no copy), e.g. a memory-mapped snapshot."""
+        matrix = cls(dim=vectors.shape[1])
+        matrix._ids = ids
+        matrix._vectors = vectors
+        matrix._size = len(ids)
+        return matrix
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def ids(self):
+        return self._ids[:self._size]
+
+    @property
+    def vectors(self):
+        return self._vectors[:self._size]
+
+    @property
+    def nbytes(self):
+        return self.ids.nbytes + self.vectors.nbytes
+
+    def append(self, ids, vectors):
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, self.dim)
+        if len(ids) != len(vectors):
+            raise ValueError(f"{len(ids)} chunk IDs for {len(vectors)} vectors")
+        needed = self._size + len(ids)
+        if needed > len(self._ids):
+            capacity = max(needed, 2 * len(self._ids), 1024)
+            grown_ids = np.empty(capacity, dtype=np.int64)
+            grown_vectors = np.empty((capacity, self.dim), dtype=np.float32)
+            grown_ids[:self._size] = self.ids
+            grown_vectors[:self._size] = self.vectors
+            self._ids, self._vectors = grown_ids, grown_vectors
+        self._ids[self._size:needed] = ids
+        self._vectors[self._size:needed] = vectors
+        self._size = needed
+        self._order = None
+
+    def trim(self):
+        """Release unused buffer capacity once the matrix is fully built."""
+        if len(self._ids) > self._size:
+            self._ids = self.ids.copy()
+            self._vectors = self.vectors.copy()
+        return self
+
+    def __getitem__(self, index):
+        """Row slice as a view-backed ``EmbeddingMatrix``."""
+        if not isinstance(index, slice):
+            raise TypeError("EmbeddingMatrix supports slicing; use get() for a single vector")
+        return EmbeddingMatrix.wrap(self.ids[index], self.vectors[index])
+
+    def rows_of(self, chunk_ids):
+        """Row positions of ``chunk_ids`` (-1 where absent)."""
+        chunk_ids = np.asarray(chunk_ids, dtype=np.int64).reshape(-1)
+        if not self._size:
+            return np.full(len(chunk_ids), -1, dtype=np.int64)
+        if self._order is None:
+            self._order = np.argsort(self.ids, kind="stable")
+        sorted_ids = self.ids[self._order]
+        pos = np.minimum(np.searchsorted(sorted_ids, chunk_ids), self._size - 1)
+        return np.where(sorted_ids[pos] == chunk_ids, self._order[pos], -1)
+
+    def get(self, chunk_id):
+        """Vector (a view) for one chunk ID, or ``None``."""
+        row = int(self.rows_of([chunk_id])[0])
+        return self.vectors[row] if row >= 0 else None
+
+
+def as_vector(value):
+    # VECTOR columns arrive as lists, arrays or JSON text depending on the connector
+    if isinstance(value, str):
+        value = json.loads(value)
+    return np.asarray(value, dtype=np.float32)
+
+
+def load_embedding_matrix(session, table, batch_rows=10000):
+    """Stream ``table`` (CHUNK_ID, EMBEDDING) into an ``EmbeddingMatrix``."""
+    matrix = EmbeddingMatrix()
+    query = f"SELECT CHUNK_ID, EMBEDDING FROM {table} ORDER BY CHUNK_ID"
+    for batch in iter_batches(session, query, batch_rows=batch_rows):
+        if len(batch):
+            matrix.append(batch["CHUNK_ID"].to_numpy(), np.stack([as_vector(v) for v in batch["EMBEDDING"]]))
+    return matrix.trim()
@@ -0,0 +1,78 @@
+"""Per-source watermarks for incremental chunking in Day 17.
+
+Day 16 gives every document an autoincrement DOC_ID, so the highest DOC_ID
+already chunked into a target table is enough to find new uploads. The
+watermark is stored per (source, target) pair in CHUNK_WATERMARKS and only
+advanced after a run has written its chunks.
+
+A run first deletes whatever the target already holds for its document
+range (``clear_document_range``), so retrying a run that failed part-way,
+or re-chunking in append mode, rewrites those chunks instead of adding a
+second copy with the same stable CHUNK_IDs.
+"""
+
+WATERMARK_TABLE = "CHUNK_WATERMARKS"
+
+
+def ensure_watermark_table(session, watermark_table):
+    session.sql(f"""
+    CREATE TABLE IF NOT EXISTS {watermark_table} (
+        SOURCE_TABLE VARCHAR,
+        TARGET_TABLE VARCHAR,
+        LAST_DOC_ID NUMBER,
+        LAST_UPLOAD_TIMESTAMP TIMESTAMP_NTZ,
+        UPDATED_AT TIMESTAMP_NTZ DEFAULT CURRENT_TIMESTAMP()
+    )
+    """).collect()
+
+
+def read_watermark(session, watermark_table, source_table, target_table):
+    """Return the last chunked DOC_ID for the pair, or 0 if it has never run."""
+    rows = session.sql(f"""
+    SELECT LAST_DOC_ID FROM {watermark_table}
+    WHERE SOURCE_TABLE = ? AND TARGET_TABLE = ?
+    """, params=[source_table, target_table]).collect()
+    return int(rows[0]["LAST_DOC_ID"]) if rows else 0
+
+
+def pending_documents(session, source_table, after_doc_id):
+    """Count documents above the watermark and the high mark to process up to.
+
+    Pinning ``HIGH_DOC_ID`` before chunking means uploads that land during a
+    run are picked up by the next one rather than skipped.
+    """
+    rows = session.sql(f"""
+    SELECT
+        COUNT(*) AS DOCS,
+        MAX(DOC_ID) AS HIGH_DOC_ID,
+        MAX(UPLOAD_TIMESTAMP) AS LAST_UPLOAD_TIMESTAMP
+    FROM {source_table}
+    WHERE DOC_ID > {int(after_doc_id)}
+    """).collect()
+    return rows[0].as_dict()
+
+
+def doc_range_filter(after_doc_id, high_doc_id):
+    return f"DOC_ID > {int(after_doc_id)} AND DOC_ID <= {int(high_doc_id)}"
+
+
+def clear_document_range(session, target_table, after_doc_id, high_doc_id):
+    """Delete the target's chunks for documents in the range; returns the rows deleted."""
+    rows = session.sql(f"DELETE FROM {target_table} WHERE {doc_range_filter(after_doc_id, high_doc_id)}").collect()
+    return rows[0][0] if rows else 0
+
+
+def save_watermark(session, watermark_table, source_table, target_table, last_doc_id, last_upload_timestamp=None):
+    session.sql(f"""
+    MERGE INTO {watermark_table} w
+    USING (SELECT ? AS SOURCE_TABLE, ? AS TARGET_TABLE, ? AS LAST_DOC_ID,
+                  ?::TIMESTAMP_NTZ AS LAST_UPLOAD_TIMESTAMP) s
+    ON w.SOURCE_TABLE = s.SOURCE_TABLE AND w.TARGET_TABLE = s.TARGET_TABLE
+    WHEN MATCHED THEN UPDATE SET
+        LAST_DOC_ID = s.LAST_DOC_ID,
+        LAST_UPLOAD_TIMESTAMP = s.LAST_UPLOAD_TIMESTAMP,
+        UPDATED_AT = CURRENT_TIMESTAMP()
+    WHEN NOT MATCHED THEN INSERT (SOURCE_TABLE, TARGET_TABLE, LAST_DOC_ID, LAST_UPLOAD_TIMESTAMP)
+        VALUES (s.SOURCE_TABLE, s.TARGET_TABLE, s.LAST_DOC_ID, s.LAST_UPLOAD_TIMESTAMP)
+    """, params=[source_table, target_table, int(last_doc_id),
+                 str(last_upload_timestamp) if last_upload_timestamp is not None else None]).collect()
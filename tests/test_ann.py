@@ -0,0 +1,58 @@
+"""IVF recall against exact search, and incremental updates."""
+
+import numpy as np
+
+from rag_utils.ann import IVFIndex
+from rag_utils.exact import ExactIndex
+from rag_utils.vectors import EmbeddingMatrix
+
+DIM = 32
+
+
+def clustered_matrix(n=2000, n_clusters=20, seed=0):
+    rng = np.random.default_rng(seed)
+    centres = rng.standard_normal((n_clusters, DIM))
+    vectors = centres[rng.integers(n_clusters, size=n)] + 0.3 * rng.standard_normal((n, DIM))
+    return EmbeddingMatrix(np.arange(1000, 1000 + n), vectors.astype(np.float32), dim=DIM)
+
+
+def recall(index, exact, queries, k=10, n_probe=None):
+    found = 0
+    for query in queries:
+        expected = set(exact.search(query, k)[0].tolist())
+        found += len(expected.intersection(index.search(query, k, n_probe=n_probe)[0].tolist()))
+    return found / (k * len(queries))
+
+
+def test_recall_against_exact_index():
+    matrix = clustered_matrix()
+    index = IVFIndex.build(matrix, n_lists=16, n_probe=4)
+    exact = ExactIndex(matrix)
+    queries = np.random.default_rng(1).standard_normal((50, DIM)).astype(np.float32)
+
+    assert len(index) == len(matrix)
+    assert recall(index, exact, queries) >= 0.9
+    # Probing every list is exhaustive
+    assert recall(index, exact, queries, n_probe=index.n_lists) == 1.0
+
+
+def test_scores_are_cosine_similarities():
+    matrix = clustered_matrix(200)
+    index = IVFIndex.build(matrix, n_lists=4, n_probe=4)
+    ids, scores = index.search(matrix.vectors[7], k=1)
+    assert ids.tolist() == [matrix.ids[7]]
+    assert np.isclose(scores[0], 1.0, atol=1e-5)
+
+
+def test_sync_adds_deletes_and_reindexes_changed_vectors():
+    matrix = clustered_matrix(300)
+    index = IVFIndex.build(matrix[:200], n_lists=4, n_probe=4)
+    changed = matrix.vectors.copy()
+    changed[10] = -changed[10]
+    updated = EmbeddingMatrix(matrix.ids[10:], changed[10:], dim=DIM)
+
+    added, deleted = index.sync(updated)
+    assert (added, deleted) == (101, 10)
+    assert len(index) == 290
+    ids, _ = index.search(changed[10], k=1, n_probe=4)
+    assert ids.tolist() == [matrix.ids[10]]
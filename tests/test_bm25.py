@@ -0,0 +1,35 @@
+"""BM25 scores against a hand-computed example."""
+
+import math
+
+import numpy as np
+import pytest
+
+from rag_utils.bm25 import BM25Index, tokenize
+
+
+def test_tokenize_drops_stopwords_and_splits_compounds():
+    assert tokenize("The TG-1234 gloves are warm") == ["tg-1234", "tg", "1234", "gloves", "warm"]
+
+
+def test_scores_match_hand_computed_bm25():
+    # Lengths 2, 3 and 1 terms: average 2; k1 = 1.2, b = 0.75
+    index = BM25Index.build([10, 20, 30], ["warm gloves", "warm jacket, warm", "helmet"])
+    idf_warm = math.log(1 + (3 - 2 + 0.5) / (2 + 0.5))
+    idf_gloves = math.log(1 + (3 - 1 + 0.5) / (1 + 0.5))
+    # norm = k1 * (1 - b + b * length / avg_length)
+    doc10 = idf_warm * 1 * 2.2 / (1 + 1.2) + idf_gloves * 1 * 2.2 / (1 + 1.2)
+    doc20 = idf_warm * 2 * 2.2 / (2 + 1.2 * (0.25 + 0.75 * 3 / 2))
+
+    ids, scores = index.search("warm gloves", k=3)
+    assert ids.tolist() == [10, 20]
+    assert scores == pytest.approx([doc10, doc20], rel=1e-6)
+
+
+def test_unknown_terms_and_empty_queries_match_nothing():
+    index = BM25Index.build([1, 2], ["warm gloves", "helmet"])
+    for query in ["snowboard", "the and of", ""]:
+        ids, scores = index.search(query)
+        assert len(ids) == 0 and len(scores) == 0
+    rows, impacts = index.postings("helmet")
+    assert rows.tolist() == [1] and impacts.dtype == np.float32
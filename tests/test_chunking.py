@@ -0,0 +1,65 @@
+"""The columnar Day 17 chunker against the row loop it replaced."""
+
+import random
+
+import pandas as pd
+import pytest
+
+from rag_utils.chunking import CHUNK_COLUMNS, chunk_documents
+
+WORDS = "gloves warm thermal jacket helmet skis boots zipper naïve café 雪 TG-1234 great".split()
+
+
+def baseline_chunk(df, chunk_size, overlap):
+    """Day 17's original ``iterrows`` loop."""
+    chunks = []
+    chunk_id = 1
+    for idx, row in df.iterrows():
+        text = row['EXTRACTED_TEXT']
+        words = text.split()
+        if len(words) <= chunk_size:
+            chunks.append({'chunk_id': chunk_id, 'doc_id': row['DOC_ID'], 'file_name': row['FILE_NAME'],
+                           'chunk_text': text, 'chunk_size': len(words), 'chunk_type': 'full_review'})
+            chunk_id += 1
+        else:
+            for i in range(0, len(words), chunk_size - overlap):
+                chunk_words = words[i:i + chunk_size]
+                chunks.append({'chunk_id': chunk_id, 'doc_id': row['DOC_ID'], 'file_name': row['FILE_NAME'],
+                               'chunk_text': ' '.join(chunk_words), 'chunk_size': len(chunk_words),
+                               'chunk_type': 'chunked_review'})
+                chunk_id += 1
+    chunks_df = pd.DataFrame(chunks)
+    chunks_df.columns = CHUNK_COLUMNS
+    return chunks_df
+
+
+def make_documents(n_docs, seed=0):
+    rng = random.Random(seed)
+    # Single spaces between words: the baseline re-joins split chunks with one space
+    texts = [" ".join(rng.choices(WORDS, k=rng.choice([0, 1, 5, 19, 20, 21, 47, 120]))) for _ in range(n_docs)]
+    return pd.DataFrame({
+        "DOC_ID": range(1, n_docs + 1),
+        "FILE_NAME": [f"review-{i:03d}.txt" for i in range(1, n_docs + 1)],
+        "EXTRACTED_TEXT": texts,
+    })
+
+
+@pytest.mark.parametrize("chunk_size, overlap", [(20, 5), (7, 0), (50, 49)])
+def test_matches_baseline_loop(chunk_size, overlap):
+    df = make_documents(60)
+    # Small blocks also exercise the block boundaries
+    chunks = chunk_documents(df, chunk_size, overlap, block_size=16)
+    expected = baseline_chunk(df, chunk_size, overlap)
+    pd.testing.assert_frame_equal(chunks.astype(object), expected.astype(object))
+
+
+def test_split_chunks_keep_original_whitespace():
+    df = pd.DataFrame({"DOC_ID": [1], "FILE_NAME": ["a.txt"], "EXTRACTED_TEXT": ["one  two\nthree\tfour five"]})
+    chunks = chunk_documents(df, chunk_size=3, overlap=1)
+    assert chunks["CHUNK_TEXT"].tolist() == ["one  two\nthree", "three\tfour five", "five"]
+    assert chunks["CHUNK_SIZE"].tolist() == [3, 3, 1]
+
+
+def test_rejects_overlap_not_smaller_than_chunk_size():
+    with pytest.raises(ValueError):
+        chunk_documents(make_documents(1), chunk_size=5, overlap=5)
@@ -0,0 +1,58 @@
+"""Token-budgeted context packing (Days 21-22)."""
+
+from rag_utils.chunking import TokenCounter
+from rag_utils.context import count_tokens, pack_context
+
+
+def review(n):
+    filler = "The box arrived on a Tuesday and the colour matched the photos."
+    return " ".join("These gloves kept my hands warm on the ski lift." if i % 10 == 0 else filler for i in range(n))
+
+
+def test_trims_to_budget_keeping_hit_sentences():
+    packed = pack_context("warm gloves", [{"text": review(40), "source": "a.txt"}], budget=60)
+    assert 0 < packed.tokens <= 60
+    assert count_tokens(packed.text) == packed.tokens
+    assert "gloves kept my hands warm" in packed.text
+    assert count_tokens(review(40)) > 60
+
+
+def test_drops_near_duplicates():
+    chunks = [{"text": review(5), "score": 0.9}, {"text": review(5) + " Great.", "score": 0.8}]
+    packed = pack_context("warm gloves", chunks, budget=500)
+    assert packed.duplicates == 1
+    assert len(packed.passages) == 1
+
+
+class CountingCounter(TokenCounter):
+    """``TokenCounter`` that records how much text it was asked to tokenize."""
+
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+        self.chars = 0
+
+    def count(self, text):
+        self.calls += 1
+        self.chars += len(text)
+        return super().count(text)
+
+    def count_many(self, texts):
+        texts = list(texts)
+        self.calls += 1
+        self.chars += sum(len(text) for text in texts)
+        return super().count_many(texts)
+
+
+def tokenizer_work(n_sentences):
+    counter = CountingCounter()
+    packed = pack_context("warm gloves", [{"text": review(n_sentences)}], budget=200, counter=counter)
+    assert packed.tokens <= 200
+    return counter
+
+
+def test_trimming_long_chunks_is_not_quadratic():
+    small, large = tokenizer_work(500), tokenizer_work(2000)
+    # Four times the text: linear trimming tokenizes about four times as much, quadratic sixteen
+    assert large.chars <= 5 * small.chars
+    assert large.calls <= 2 * small.calls
@@ -0,0 +1,70 @@
+"""Reuse, rewrite and search decisions of Day 22's ConversationMemory."""
+
+import numpy as np
+
+from rag_utils.conversation import ConversationMemory
+
+CHUNKS = [
+    {"text": "The thermal gloves kept my hands warm on the slopes.", "source": "r1.txt", "score": 0.9},
+    {"text": "Gloves run small; order a size up.", "source": "r2.txt", "score": 0.8},
+]
+
+VECTORS = {
+    "How warm are the thermal gloves?": [1.0, 0.0, 0.0],
+    "How warm are those thermal gloves?": [0.99, 0.1, 0.0],
+    "What about the helmets?": [0.0, 1.0, 0.0],
+    "Is shipping to Canada fast and reliable for heavy winter boots?": [0.0, 0.0, 1.0],
+}
+
+
+class Searcher:
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, query, limit):
+        self.queries.append(query)
+        return CHUNKS[:limit]
+
+
+def embed(question):
+    return np.asarray(VECTORS[question], dtype=np.float32)
+
+
+def test_first_question_is_searched_as_asked():
+    memory, search = ConversationMemory(), Searcher()
+    chunks, decision = memory.retrieve("How warm are the thermal gloves?", search, 2, embed)
+    assert decision["action"] == "search"
+    assert search.queries == ["How warm are the thermal gloves?"]
+    assert chunks == CHUNKS and memory.evidence == CHUNKS
+
+
+def test_near_duplicate_question_reuses_evidence():
+    memory, search = ConversationMemory(), Searcher()
+    memory.retrieve("How warm are the thermal gloves?", search, 2, embed)
+    chunks, decision = memory.retrieve("How warm are those thermal gloves?", search, 2, embed)
+    assert decision["action"] == "reuse" and decision["similarity"] > 0.9
+    assert len(search.queries) == 1
+    assert {chunk["text"] for chunk in chunks} == {chunk["text"] for chunk in CHUNKS}
+    assert (memory.searches, memory.reuses) == (1, 1)
+
+
+def test_follow_up_is_rewritten_with_last_searched_question():
+    memory, search = ConversationMemory(), Searcher()
+    memory.retrieve("How warm are the thermal gloves?", search, 2, embed)
+    _, decision = memory.retrieve("What about the helmets?", search, 2, embed)
+    assert decision["action"] == "rewrite"
+    assert search.queries[-1] == "What about the helmets? How warm are the thermal gloves?"
+
+
+def test_new_topic_is_searched_and_bind_clears_evidence():
+    memory, search = ConversationMemory(), Searcher()
+    assert memory.bind(("svc", "Cortex Search")) is False
+    memory.retrieve("How warm are the thermal gloves?", search, 2, embed)
+    question = "Is shipping to Canada fast and reliable for heavy winter boots?"
+    _, decision = memory.retrieve(question, search, 2, embed)
+    assert decision["action"] == "search" and search.queries[-1] == question
+
+    assert memory.bind(("svc", "Cortex Search")) is False
+    assert memory.evidence
+    assert memory.bind(("other", "Cortex Search")) is True
+    assert memory.evidence == [] and memory.turns == []
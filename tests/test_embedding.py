@@ -0,0 +1,77 @@
+"""Staging format and content-addressed cache for Day 18 embeddings."""
+
+import json
+
+import numpy as np
+import pytest
+
+from rag_utils.embedding import EMBED_DIM, EmbeddingBatchError, normalize_text, text_hash, vector_json
+from rag_utils.embedding_cache import CacheStats, EmbeddingCache, embed_with_cache
+
+
+def test_vector_json_round_trips_float32():
+    rng = np.random.default_rng(0)
+    matrix = rng.standard_normal((4, EMBED_DIM)).astype(np.float32) * np.float32(1e-2)
+    matrix[0, :3] = [np.float32(1e-30), np.float32(-3.4e38), 0.0]
+    rows = vector_json(matrix)
+    assert len(rows) == 4
+    back = np.array([json.loads(row) for row in rows], dtype=np.float32)
+    assert np.array_equal(back, matrix)
+    # At most "-1.23456789e-38," per value, whatever the magnitudes
+    assert max(len(row) for row in rows) <= 2 + 16 * EMBED_DIM
+
+
+def test_text_hash_ignores_whitespace_runs():
+    assert normalize_text("  warm \t gloves\n") == "warm gloves"
+    assert text_hash("warm gloves") == text_hash(" warm\n\ngloves ")
+    assert text_hash("warm gloves") != text_hash("warm glove")
+
+
+def test_embed_with_cache_counts_per_call_stats():
+    cache = EmbeddingCache()
+    calls = []
+
+    def embed_many(texts):
+        calls.append(list(texts))
+        return [np.full(EMBED_DIM, len(t), dtype=np.float32) for t in texts]
+
+    first = CacheStats()
+    embed_with_cache(None, cache, ["warm gloves", "warm  gloves", "helmet"], embed_many, stats=first)
+    assert calls == [["warm gloves", "helmet"]]
+    assert (first.hits, first.misses) == (0, 3)
+
+    second = CacheStats()
+    vectors = embed_with_cache(None, cache, ["helmet", "boots"], embed_many, stats=second)
+    assert calls[-1] == ["boots"]
+    assert (second.hits, second.misses) == (1, 1)
+    assert vectors[0][0] == len("helmet")
+    assert (cache.hits, cache.misses) == (1, 4)
+
+
+def test_cache_get_many_and_put_many_local_tier():
+    cache = EmbeddingCache(max_entries=2)
+    vectors = [np.full(EMBED_DIM, n, dtype=np.float32) for n in range(3)]
+    cache.put_many(None, ["a", "b"], vectors[:2])
+
+    found = cache.get_many(None, ["a", "b", "c", "a"])
+    assert set(found) == {"a", "b"}
+    assert (cache.hits, cache.misses) == (3, 1)
+
+    # "a" was used last, so adding "c" evicts "b"
+    cache.get_many(None, ["a"])
+    cache.put_many(None, ["c"], vectors[2:])
+    assert set(cache.get_many(None, ["a", "b", "c"])) == {"a", "c"}
+    cache.reset_stats()
+    assert cache.hit_rate == 0.0
+
+
+def test_embed_with_cache_keeps_vectors_finished_before_a_failure():
+    cache = EmbeddingCache()
+
+    def embed_many(texts):
+        raise EmbeddingBatchError(RuntimeError("quota"), [np.ones(EMBED_DIM, dtype=np.float32), None])
+
+    with pytest.raises(EmbeddingBatchError) as error:
+        embed_with_cache(None, cache, ["gloves", "helmet", "gloves"], embed_many)
+    assert [v is not None for v in error.value.results] == [True, False, True]
+    assert set(cache.get_many(None, [text_hash("gloves"), text_hash("helmet")])) == {text_hash("gloves")}
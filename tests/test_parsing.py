@@ -0,0 +1,103 @@
+"""LocalParseBackend runs Day 16's upload/submit/poll flow without a warehouse."""
+
+import pytest
+
+from rag_utils.parsing import (LocalParseBackend, SnowflakeParseBackend, detect_file_type, extract_text, run_parse,
+                               wait_for_job)
+
+
+def make_pdf(text):
+    """A one-page PDF showing ``text`` in Helvetica."""
+    stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET".encode("latin-1")
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+        b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+        b"/Resources << /Font << /F1 5 0 R >> >> >>",
+        b"<< /Length " + str(len(stream)).encode() + b" >>\nstream\n" + stream + b"\nendstream",
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    pdf = b"%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(pdf))
+        pdf += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref = len(pdf)
+    pdf += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    pdf += b"".join(f"{offset:010d} 00000 n \n".encode() for offset in offsets)
+    pdf += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode()
+    return pdf
+
+
+def parse(files):
+    backend = LocalParseBackend(max_workers=2)
+    job = run_parse(backend, files, "DOCS")
+    result = wait_for_job(job, poll_interval=0.01)
+    return result, {row["FILE_NAME"]: row for row in backend.tables.get("DOCS", [])}
+
+
+def test_detect_file_type():
+    assert detect_file_type("notes.TXT") == "TXT"
+    assert detect_file_type("readme.md") == "Markdown"
+    assert detect_file_type("review.pdf") == "PDF"
+    assert detect_file_type("image.png") == "Unknown"
+
+
+def test_parses_text_and_markdown():
+    result, rows = parse([("review.txt", b"Warm gloves, great for winter."),
+                          ("notes.md", "# Helmets\n\nSturdy and light.".encode("utf-8"))])
+    assert result == {"parsed": 2, "failed": 0}
+    assert rows["review.txt"]["FILE_TYPE"] == "TXT"
+    assert rows["review.txt"]["WORD_COUNT"] == 5
+    assert rows["notes.md"]["FILE_TYPE"] == "Markdown"
+    assert rows["notes.md"]["EXTRACTED_TEXT"].startswith("# Helmets")
+    assert rows["notes.md"]["CHAR_COUNT"] == len(rows["notes.md"]["EXTRACTED_TEXT"])
+
+
+def test_parses_pdf():
+    pytest.importorskip("pypdf")
+    data = make_pdf("Thermal gloves kept my hands warm")
+    assert "Thermal gloves" in extract_text("review.pdf", data)
+
+    result, rows = parse([("review.pdf", data)])
+    assert result == {"parsed": 1, "failed": 0}
+    assert rows["review.pdf"]["FILE_TYPE"] == "PDF"
+    assert rows["review.pdf"]["FILE_SIZE"] == len(data)
+
+
+def test_empty_and_unsupported_files_fail():
+    result, rows = parse([("blank.txt", b"   \n"), ("image.png", b"\x89PNG"), ("ok.txt", b"fine")])
+    assert result == {"parsed": 1, "failed": 2}
+    assert list(rows) == ["ok.txt"]
+
+
+class FakeFiles:
+    def put_stream(self, stream, location, **kwargs):
+        pass
+
+
+class FakeSession:
+    file = FakeFiles()
+
+
+def test_parse_sql_sends_only_documents_to_parse_document():
+    backend = SnowflakeParseBackend(FakeSession(), "DB.SCHEMA.STAGE")
+    files = [("review.pdf", b"%PDF"), ("notes.md", b"# Helmets"), ("o'neil.txt", b"Warm gloves"),
+             ("image.png", b"\x89PNG")]
+    for name, data in files:
+        backend.upload(name, data)
+    query, params = backend.build_parse_sql([name for name, _ in files], "DOCS")
+
+    assert "WHERE RELATIVE_PATH IN ('review.pdf')" in query
+    assert "LOWER(RELATIVE_PATH) LIKE '%.pdf'" in query
+    assert "notes.md" not in query and "image.png" not in query
+    assert query.count("(?, ?, ?)") == 2
+    assert params == ["notes.md", 9, "# Helmets", "o'neil.txt", 11, "Warm gloves"]
+
+
+def test_parse_sql_without_documents_scans_nothing():
+    backend = SnowflakeParseBackend(FakeSession(), "DB.SCHEMA.STAGE")
+    backend.upload("notes.txt", b"Sturdy and light")
+    query, params = backend.build_parse_sql(["notes.txt"], "DOCS")
+    assert "WHERE RELATIVE_PATH IN (NULL)" in query
+    assert params == ["notes.txt", 16, "Sturdy and light"]
@@ -0,0 +1,100 @@
+"""Version checks and refreshes of the precomputed answer store."""
+
+import time
+
+import pytest
+
+from rag_utils import precompute
+from rag_utils.precompute import AnswerStore, question_hash
+
+
+class Result:
+    def __init__(self, rows):
+        self.rows = rows
+
+    def collect(self):
+        return self.rows
+
+
+class FakeSession:
+    """Answers the statements ``AnswerStore`` runs; the chunk table's commit time is ``data_version``."""
+
+    def __init__(self, role="ANALYST"):
+        self.role = role
+        self.data_version = "v1"
+        self.merges = []
+
+    def sql(self, query, params=None):
+        if "CURRENT_ACCOUNT()" in query:
+            return Result([{"ACCOUNT": "ACME", "USER_NAME": "ME", "ROLE_NAME": self.role}])
+        if "SYSTEM$LAST_CHANGE_COMMIT_TIME" in query:
+            return Result([{"V0": self.data_version}])
+        if query.lstrip().startswith("MERGE"):
+            self.merges.append(params)
+        return Result([])
+
+
+@pytest.fixture(autouse=True)
+def check_versions_every_call(monkeypatch):
+    monkeypatch.setattr(precompute, "VERSION_CHECK_INTERVAL", 0)
+
+
+def answer(question):
+    return f"answer to {question}", {"sources": []}
+
+
+def test_question_hash_ignores_case_and_spacing():
+    assert question_hash("Which gloves are warm?") == question_hash("  which GLOVES are   warm? ")
+
+
+def test_version_change_marks_answers_stale_and_refresh_recomputes():
+    store, session = AnswerStore("DB.S.ANSWERS"), FakeSession()
+    questions = ["Which gloves are warm?", "How is shipping?"]
+    args = (session, "day21", "DB.S.SVC", "model")
+
+    assert store.stale(*args, questions, store.version(session, ["DB.S.CHUNKS"])) == questions
+    assert store.refresh(*args, questions, answer, "v1") == 2
+    assert store.stale(*args, questions, "v1") == []
+    assert store.lookup(*args, "which gloves are warm?")["answer"] == "answer to Which gloves are warm?"
+    assert len(session.merges) == 2
+
+    session.data_version = "v2"
+    version = store.version(session, ["DB.S.CHUNKS"])
+    assert version == "v2"
+    assert store.stale(*args, questions, version) == questions
+    assert store.refresh(*args, questions[:1] * 2, answer, version) == 1
+
+
+def test_answers_are_scoped_by_role():
+    store = AnswerStore("DB.S.ANSWERS")
+    analyst, admin = FakeSession("ANALYST"), FakeSession("ADMIN")
+    store.put(analyst, "agent", "AGENT", None, "Top product?", "Gloves", {}, "v1")
+    assert store.lookup(analyst, "agent", "AGENT", None, "Top product?")["answer"] == "Gloves"
+    assert store.lookup(admin, "agent", "AGENT", None, "Top product?") is None
+
+
+def wait_for_refresh(store, session, *job):
+    deadline = time.monotonic() + 5
+    while store.is_refreshing(session, *job) and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_ensure_fresh_refreshes_in_background_and_records_errors():
+    store, session = AnswerStore("DB.S.ANSWERS"), FakeSession()
+    job = ("agent", "AGENT", None)
+
+    version, stale = store.ensure_fresh(session, *job, ["Top product?"], answer, ["DB.S.SALES"])
+    assert (version, stale) == ("v1", ["Top product?"])
+    wait_for_refresh(store, session, *job)
+    assert store.lookup(session, *job, "Top product?")["version"] == "v1"
+    assert store.ensure_fresh(session, *job, ["Top product?"], answer, ["DB.S.SALES"])[1] == []
+
+    def failing(question):
+        raise RuntimeError("warehouse suspended")
+
+    session.data_version = "v2"
+    store.ensure_fresh(session, *job, ["Top product?"], failing, ["DB.S.SALES"])
+    wait_for_refresh(store, session, *job)
+    assert store.error(session, *job) == "warehouse suspended"
+    # The stale answer is still served until a refresh succeeds
+    assert store.lookup(session, *job, "Top product?")["version"] == "v1"
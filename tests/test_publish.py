@@ -0,0 +1,68 @@
+"""Versioned publishing used by snapshots and IVF indexes."""
+
+import os
+import threading
+
+import numpy as np
+import pytest
+
+from rag_utils.ann import IVFIndex
+from rag_utils.publish import KEEP_VERSIONS, current_version, publish, writer_lock
+
+
+def write_version(path, text):
+    with writer_lock(path), publish(path) as staging:
+        with open(os.path.join(staging, "data.txt"), "w") as f:
+            f.write(text)
+
+
+def read_current(path):
+    with open(os.path.join(current_version(path), "data.txt")) as f:
+        return f.read()
+
+
+def test_publish_swaps_versions_and_prunes(tmp_path):
+    path = str(tmp_path / "artefact")
+    assert current_version(path) is None
+    for n in range(4):
+        write_version(path, f"v{n}")
+        assert read_current(path) == f"v{n}"
+    versions = [name for name in os.listdir(path) if name.startswith("v-")]
+    assert len(versions) == KEEP_VERSIONS
+
+
+def test_failed_write_keeps_current_version(tmp_path):
+    path = str(tmp_path / "artefact")
+    write_version(path, "good")
+    with pytest.raises(RuntimeError):
+        with writer_lock(path), publish(path) as staging:
+            open(os.path.join(staging, "data.txt"), "w").close()
+            raise RuntimeError("export failed")
+    assert read_current(path) == "good"
+    assert len([name for name in os.listdir(path) if name.startswith("v-")]) == 1
+
+
+def test_concurrent_index_saves_leave_a_loadable_index(tmp_path):
+    path = str(tmp_path / "index.ivf")
+    rng = np.random.default_rng(0)
+    vectors = rng.standard_normal((200, 16)).astype(np.float32)
+    errors = []
+
+    def save(version):
+        try:
+            index = IVFIndex(vectors[:4], n_probe=4)
+            index.add(np.arange(200), vectors)
+            index.version = version
+            index.save(path)
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    threads = [threading.Thread(target=save, args=(v,)) for v in range(6)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+    loaded = IVFIndex.load(path)
+    assert len(loaded) == 200
+    assert loaded.version in range(6)
@@ -0,0 +1,32 @@
+"""Blocked quantization of (memory-mapped) embedding matrices."""
+
+import numpy as np
+import pytest
+
+from rag_utils import quantization
+from rag_utils.quantization import QuantizedStore, build_codes, evaluate_recall
+from rag_utils.vectors import EmbeddingMatrix
+
+
+@pytest.mark.parametrize("mode", ["int8", "binary"])
+def test_codes_do_not_depend_on_block_size(mode, tmp_path, monkeypatch):
+    vectors = np.random.default_rng(0).standard_normal((1000, 48)).astype(np.float32)
+    np.save(tmp_path / "vectors.npy", vectors)
+    whole = build_codes(vectors, mode)
+
+    monkeypatch.setattr(quantization, "_BLOCK_ROWS", 96)
+    blocked = build_codes(np.load(tmp_path / "vectors.npy", mmap_mode="r"), mode)
+    if mode == "int8":
+        assert np.array_equal(blocked.codes, whole.codes)
+        assert np.allclose(blocked.scale, whole.scale)
+    else:
+        assert np.array_equal(blocked.bits, whole.bits)
+    assert np.array_equal(blocked.scores(vectors[3]), whole.scores(vectors[3]))
+
+
+# 48 sign bits separate isotropic noise poorly; real embeddings do far better
+@pytest.mark.parametrize("mode, min_recall", [("int8", 0.95), ("binary", 0.5)])
+def test_rescored_search_recall(mode, min_recall):
+    vectors = np.random.default_rng(1).standard_normal((2000, 48)).astype(np.float32)
+    store = QuantizedStore(EmbeddingMatrix(np.arange(2000), vectors, dim=48), mode=mode, oversample=8)
+    assert evaluate_recall(store, k=10, n_queries=20) >= min_recall
@@ -0,0 +1,20 @@
+"""Compound-question splitting for the RAG pages."""
+
+from rag_utils.retrieval import decompose_question
+
+
+def test_splits_on_conjunction_before_question_word():
+    assert decompose_question("Which products have durability issues and how is shipping?") == [
+        "Which products have durability issues and how is shipping?",
+        "Which products have durability issues",
+        "how is shipping",
+    ]
+
+
+def test_keeps_one_term_clause_after_conjunction():
+    queries = decompose_question("How warm are the gloves and also the helmets?")
+    assert queries[1:] == ["How warm are the gloves", "the helmets"]
+
+
+def test_drops_one_term_clause_split_at_punctuation():
+    assert decompose_question("gloves; helmets") == ["gloves; helmets"]
@@ -0,0 +1,33 @@
+"""Per-connection trace logs (Day 21)."""
+
+from rag_utils import tracing
+from rag_utils.tracing import Trace, append_trace, load_traces, stage_percentiles, trace_log
+
+
+def record(path, n):
+    for i in range(n):
+        trace = Trace("rag_answer", n=i)
+        with trace.span("retrieve") as span:
+            span.set(chunks=3)
+        append_trace(trace, path)
+
+
+def test_load_traces_reads_only_the_tail(tmp_path):
+    path = str(tmp_path / "traces.jsonl")
+    record(path, 300)
+    traces = load_traces(path, limit=50)
+    assert [t["attributes"]["n"] for t in traces] == list(range(250, 300))
+    assert stage_percentiles(traces)["retrieve"]["count"] == 50
+
+
+def test_log_rotates_past_max_bytes(tmp_path, monkeypatch):
+    monkeypatch.setattr(tracing, "MAX_LOG_BYTES", 2000)
+    path = str(tmp_path / "traces.jsonl")
+    record(path, 40)
+    assert (tmp_path / "traces.jsonl.1").exists()
+    assert (tmp_path / "traces.jsonl").stat().st_size <= 2000 + 1000
+
+
+def test_trace_log_is_per_scope():
+    assert trace_log(("ACC", "ALICE", "ANALYST")) != trace_log(("ACC", "BOB", "ANALYST"))
+    assert trace_log(("ACC", "ALICE", "ANALYST")) == trace_log(("ACC", "ALICE", "ANALYST"))